@@ -12,7 +12,9 @@ def create_app():
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
-    socketio.init_app(app)   # ← wichtig
+    from .live import bus as live_bus
+    socketio.init_app(app, async_mode=app.config["SOCKETIO_ASYNC_MODE"],
+                      **live_bus.socketio_options(app))   # ← wichtig (mit LIVE_BUS: mehrere Worker)
 
     # Blueprints
     from .auth.routes import bp as auth_bp
@@ -29,6 +31,9 @@ def create_app():
     app.register_blueprint(live_bp, url_prefix="/live")
     app.register_blueprint(courses_bp, url_prefix="/courses")
 
+    from .cli import register_cli
+    register_cli(app)
+
     @app.route("/")
     def index():
         return render_template("index.html")
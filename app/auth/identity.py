@@ -0,0 +1,90 @@
+"""
+Leichtgewichtige Identität für Flask-Login.
+
+``user_loader`` läuft bei jedem Request und jedem Socket.IO-Event, das
+``current_user`` anfasst – bei Zeichen-Events tausendfach pro Minute. Statt
+jedes Mal ``User`` aus der DB zu laden, hält ein begrenzter TTL-Cache
+``Identity``-Objekte (id, username, role, email). Alles andere (z. B.
+``password_hash``) lädt ``Identity.user`` erst bei Bedarf als ORM-Objekt.
+
+Ändern sich Rolle oder Passwort, ruft der Schreiber ``invalidate(user_id)``;
+über den Live-Bus verwerfen auch die anderen Worker ihren Eintrag.
+Schreibende Routen arbeiten immer auf ``current_user.user``, nie auf der
+gecachten Identität.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+from ..extensions import db
+from ..live import bus
+from ..models import User
+
+TTL = 60.0        # s
+MAX_ENTRIES = 4096
+
+
+class Identity(UserMixin):
+    __slots__ = ("id", "username", "role", "email")
+
+    def __init__(self, id: str, username: str, role: str, email: str | None = None):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.email = email
+
+    @property
+    def user(self) -> User | None:
+        """Volles ORM-Objekt (pro Request über die Identity-Map nur einmal geladen)."""
+        return db.session.get(User, self.id)
+
+    def __getattr__(self, name):
+        # nur für Attribute, die nicht im Cache stehen (password_hash, created_at …)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __repr__(self):
+        return f"<Identity {self.username} ({self.role})>"
+
+
+_cache = OrderedDict()  # user_id -> (expires, Identity)
+_lock = threading.Lock()
+
+
+def load(user_id: str) -> Identity | None:
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(user_id)
+        if hit is not None and hit[0] > now:
+            _cache.move_to_end(user_id)
+            return hit[1]
+    row = (db.session.query(User.id, User.username, User.role, User.email)
+           .filter(User.id == user_id).first())
+    if row is None:
+        return None
+    ident = Identity(*row)
+    with _lock:
+        _cache[user_id] = (now + TTL, ident)
+        _cache.move_to_end(user_id)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return ident
+
+
+def _drop(user_id: str) -> None:
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def invalidate(user_id: str) -> None:
+    """Nach Rollen-/Passwortänderung (auch auf allen anderen Workern)."""
+    _drop(user_id)
+    bus.publish("identity_invalidate", user_id=user_id)
+
+
+@bus.handler("identity_invalidate")
+def _remote_invalidate(user_id):
+    _drop(user_id)
@@ -1,14 +1,16 @@
-from flask import render_template, request, redirect, url_for, flash, abort
+from flask import render_template, request, redirect, url_for, flash, abort, jsonify
 from flask_login import login_user, logout_user, current_user, login_required
-from passlib.hash import bcrypt
-from . import bp
+from . import bp, identity
 from ..extensions import db, login_manager
 from ..models import User
+from ..utils import passwords
+from ..utils.roles import roles_required
 
+BUSY_MSG = "Gerade melden sich sehr viele an – bitte in ein paar Sekunden erneut versuchen."
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, user_id)
+    return identity.load(user_id)
 
 
 @bp.route("/login", methods=["GET", "POST"])
@@ -17,9 +19,18 @@ def login():
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
         user = User.query.filter_by(username=username).first()
-        if not user or not bcrypt.verify(password, user.password_hash):
+        try:
+            ok, new_hash = passwords.verify(password, user.password_hash if user else None)
+        except passwords.Busy:
+            flash(BUSY_MSG, "warning")
+            return render_template("auth/login.html"), 503
+        if not ok:
             flash("Ungültige Zugangsdaten", "danger")
             return redirect(url_for("auth.login"))
+        if new_hash:
+            user.password_hash = new_hash
+            db.session.commit()
+            identity.invalidate(user.id)
         login_user(user)
         flash("Willkommen zurück!", "success")
         return redirect(url_for("students.dashboard") if user.role == "student" else url_for("teachers.dashboard"))
@@ -57,7 +68,12 @@ def register():
         if User.query.filter_by(username=username).first():
             flash("Benutzername bereits vergeben", "warning")
             return redirect(url_for("auth.register"))
-        user = User(username=username, role=role, password_hash=bcrypt.hash(password))
+        try:
+            password_hash = passwords.hash(password)
+        except passwords.Busy:
+            flash(BUSY_MSG, "warning")
+            return render_template("auth/register.html", allowed_roles=allowed), 503
+        user = User(username=username, role=role, password_hash=password_hash)
         db.session.add(user)
         db.session.commit()
         flash(f"{role.capitalize()} angelegt.", "success")
@@ -76,19 +92,35 @@ def change_password():
     if request.method == "POST":
         old = request.form.get("old_password", "")
         new = request.form.get("new_password", "")
-        if not bcrypt.verify(old, current_user.password_hash):
-            flash("Altes Passwort falsch.", "danger")
-            return redirect(url_for("auth.change_password"))
+        user = current_user.user
+        # erst prüfen, was nichts kostet – ungültige Eingaben belegen keinen Platz im Hash-Pool
         if len(new) < 6:
             flash("Neues Passwort ist zu kurz.", "warning")
             return redirect(url_for("auth.change_password"))
-        current_user.password_hash = bcrypt.hash(new)
+        try:
+            ok, _ = passwords.verify(old, user.password_hash)
+            new_hash = passwords.hash(new) if ok else None
+        except passwords.Busy:
+            flash(BUSY_MSG, "warning")
+            return render_template("auth/password.html"), 503
+        if not ok:
+            flash("Altes Passwort falsch.", "danger")
+            return redirect(url_for("auth.change_password"))
+        user.password_hash = new_hash
         db.session.commit()
+        identity.invalidate(user.id)
         flash("Passwort aktualisiert.", "success")
         return redirect(url_for("students.dashboard") if current_user.role == "student" else url_for("teachers.dashboard"))
     return render_template("auth/password.html")
 
 
+@bp.route("/password/stats")
+@roles_required("admin")
+def password_stats():
+    """Kennzahlen des Hash-Dienstes (dieser Worker)."""
+    return jsonify(passwords.stats())
+
+
 @bp.route("/logout")
 def logout():
     logout_user()
@@ -1,7 +1,7 @@
 import click
 from app.extensions import db
 from app.models import User
-from passlib.hash import bcrypt
+from app.utils import passwords
 
 def register_cli(app):
     @app.cli.command("create-admin")
@@ -10,6 +10,163 @@ def register_cli(app):
     def create_admin(username, password):
         if User.query.filter_by(username=username).first():
             click.echo("User existiert bereits"); return
-        u = User(username=username, role="admin", password_hash=bcrypt.hash(password))
+        u = User(username=username, role="admin", password_hash=passwords.hash(password))
         db.session.add(u); db.session.commit()
-        click.echo("Admin angelegt")
\ No newline at end of file
+        click.echo("Admin angelegt")
+
+    @app.cli.command("rebuild-progress")
+    @click.option("--course", "course_id", default=None, help="nur diesen Kurs (SubjectYear-ID)")
+    def rebuild_progress(course_id):
+        """Fortschrittstabelle aus den Abgaben neu aufbauen (Backfill)."""
+        from app.courses import progress
+        n = progress.rebuild(course_id)
+        click.echo(f"{n} Fortschritts-Einträge geschrieben")
+
+    @app.cli.command("check-points")
+    @click.option("--fix", is_flag=True, help="abweichende Summen korrigieren")
+    def check_points(fix):
+        """Exercise.points_total gegen die Summe der Items prüfen."""
+        from app.models import Exercise, ExerciseItem
+        sums = dict(db.session.query(ExerciseItem.exercise_id, db.func.sum(ExerciseItem.points))
+                    .filter(ExerciseItem.type.in_(("text", "mc")))
+                    .group_by(ExerciseItem.exercise_id))
+        bad = 0
+        for ex_id, stored in db.session.query(Exercise.id, Exercise.points_total):
+            actual = int(sums.get(ex_id) or 0)
+            if stored != actual:
+                bad += 1
+                click.echo(f"{ex_id}: gespeichert {stored}, Items {actual}")
+                if fix:
+                    Exercise.query.filter_by(id=ex_id).update({"points_total": actual}, synchronize_session=False)
+        if fix:
+            db.session.commit()
+        click.echo(f"{bad} Abweichung(en){' korrigiert' if fix and bad else ''}")
+
+    @app.cli.command("regrade")
+    @click.option("--exercise", "node_id", default=None, help="nur diese Übung (ContentNode-ID)")
+    def regrade(node_id):
+        """Abgaben mit dem aktuellen Lösungsschlüssel neu bewerten."""
+        from app.courses import grading
+        from app.models import Exercise
+        q = Exercise.query
+        if node_id:
+            q = q.filter_by(content_node_id=node_id)
+        total = 0
+        for ex in q.all():
+            total += grading.regrade(ex)
+        click.echo(f"{total} Abgabe(n) neu bewertet")
+
+    @app.cli.command("reconcile-stars")
+    @click.option("--fix", is_flag=True, help="Salden auf die Ledger-Summe setzen")
+    def reconcile_stars(fix):
+        """Sterne-Salden gegen das Ledger (StarTransaction) abgleichen."""
+        from app.utils import stars
+        diffs = stars.reconcile(fix=fix)
+        for uid, have, want in diffs:
+            click.echo(f"{uid}: Saldo {have}, Ledger {want}")
+        click.echo(f"{len(diffs)} Abweichung(en){' korrigiert' if fix and diffs else ''}")
+
+    @app.cli.command("assets-gc")
+    @click.option("--recount", is_flag=True, help="Referenzen vorher aus allen Abschnitten neu aufbauen")
+    @click.option("--grace-hours", default=24.0, show_default=True, help="jüngere Blobs nicht anfassen")
+    @click.option("--dry-run", is_flag=True, help="nur anzeigen, nichts löschen")
+    def assets_gc(recount, grace_hours, dry_run):
+        """Nicht mehr referenzierte Editor-Bilder (Blobs) löschen."""
+        from app.courses import assets
+        if recount:
+            click.echo(f"{assets.recount()} Referenz(en) neu aufgebaut")
+        res = assets.gc(grace_hours, dry_run)
+        click.echo(f"{res['blobs']} Blob(s), {res['orphans']} verwaiste Datei(en), "
+                   f"{res['bytes'] / 1024:.0f} KB{' (dry run)' if dry_run else ' freigegeben'}")
+
+    @app.cli.command("pdf-cache-prune")
+    @click.option("--max-age-days", default=30.0, show_default=True, help="länger nicht benutzte PDFs löschen")
+    @click.option("--dry-run", is_flag=True, help="nur anzeigen, nichts löschen")
+    def pdf_cache_prune(max_age_days, dry_run):
+        """Zwischengespeicherte Abschnitts-PDFs aufräumen."""
+        from app.courses import pdfs
+        n, size = pdfs.prune(max_age_days, dry_run)
+        click.echo(f"{n} PDF(s), {size / 1024:.0f} KB{' (dry run)' if dry_run else ' freigegeben'}")
+
+    @app.cli.command("uploads-gc")
+    @click.option("--stale-hours", default=24.0, show_default=True, help="Uploads ohne Fortschritt seit so vielen Stunden")
+    @click.option("--dry-run", is_flag=True, help="nur anzeigen, nichts löschen")
+    def uploads_gc(stale_hours, dry_run):
+        """Abgebrochene Dokument-Uploads (Teildateien) löschen."""
+        from app.courses import uploads
+        res = uploads.gc(stale_hours, dry_run)
+        click.echo(f"{res['uploads']} Upload(s), {res['orphans']} verwaiste Datei(en), "
+                   f"{res['bytes'] / 1024:.0f} KB{' (dry run)' if dry_run else ' freigegeben'}")
+
+    @app.cli.command("assets-variants")
+    @click.option("--course", "course_id", default=None, help="nur diesen Kurs (SubjectYear-ID)")
+    def assets_variants(course_id):
+        """Alte Editor-Bilder übernehmen, srcset setzen und fehlende Bildvarianten erzeugen."""
+        from app.courses import assets, images, render
+        from app.models import ContentNode, Exercise
+        q = ContentNode.query.filter(ContentNode.body_html.like("%<img%"))
+        if course_id:
+            q = q.filter_by(subject_year_id=course_id)
+        shas = set()
+        for n in q.all():
+            html = images.add_srcset(assets.process_html(n.subject_year_id, n.body_html, adopt_legacy=True))
+            if html != n.body_html:
+                n.body_html = html
+                render.section(n)
+            assets.sync_refs(n.id, html)
+            shas |= assets.refs_in(html)
+        q = (db.session.query(Exercise, ContentNode.subject_year_id)
+             .join(ContentNode, ContentNode.id == Exercise.content_node_id)
+             .filter(Exercise.prompt_html.like("%<img%") | Exercise.solution_html.like("%<img%")))
+        if course_id:
+            q = q.filter(ContentNode.subject_year_id == course_id)
+        for ex, cid in q.all():
+            prompt = images.add_srcset(assets.process_html(cid, ex.prompt_html or "", adopt_legacy=True))
+            solution = images.add_srcset(assets.process_html(cid, ex.solution_html or "", adopt_legacy=True))
+            if (prompt, solution) != (ex.prompt_html or "", ex.solution_html or ""):
+                ex.prompt_html, ex.solution_html = prompt, solution
+                render.exercise(ex.content_node_id, ex)
+            assets.sync_refs(ex.content_node_id, prompt + solution)
+            shas |= assets.refs_in(prompt + solution)
+        db.session.commit()
+        todo = images.pending(shas)
+        with click.progressbar(todo, label="Varianten") as bar:
+            for sha in bar:
+                images.generate(sha)
+                db.session.commit()
+        click.echo(f"{len(shas)} Bild(er), {len(todo)} neu skaliert")
+
+    @app.cli.command("rerender")
+    @click.option("--course", "course_id", default=None, help="nur diesen Kurs (SubjectYear-ID)")
+    def rerender(course_id):
+        """Vorgerenderte HTML-Fragmente neu erzeugen (nach Renderer-Update oder Umzug von UPLOAD_FOLDER)."""
+        from app.courses import render
+        n = render.rerender(course_id)
+        db.session.commit()
+        click.echo(f"{n} Knoten neu gerendert")
+
+    @app.cli.command("import-students")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--class", "class_ref", default=None, help="Standard-Klasse (Beitrittscode oder ID)")
+    @click.option("--report", "report_path", default=None, help="Zeilenbericht als CSV schreiben")
+    def import_students(path, class_ref, report_path):
+        """Schüler aus CSV/JSON anlegen und einschreiben (idempotent)."""
+        from app.models import Class
+        from app.utils import provisioning
+        default_class_id = None
+        if class_ref:
+            k = Class.query.filter(db.or_(Class.join_code == class_ref, Class.id == class_ref)).first()
+            if not k:
+                raise click.ClickException(f"Klasse '{class_ref}' nicht gefunden")
+            default_class_id = k.id
+        with open(path, "rb") as f:
+            rows = provisioning.parse(f.read(), path)
+        res = provisioning.import_rows(rows, default_class_id)
+        for r in res["rows"]:
+            if r.get("status") == "error":
+                click.echo(f"Zeile {r['row']} ({r['username'] or '-'}): {r['error']}")
+        if report_path:
+            with open(report_path, "w", encoding="utf-8", newline="") as f:
+                f.write(provisioning.report_csv(res["rows"]))
+        click.echo(f"{res['created']} angelegt, {res['existing']} vorhanden, "
+                   f"{res['enrolled']} eingeschrieben, {res['errors']} Fehler")
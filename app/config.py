@@ -13,6 +13,14 @@ def _env_bool(name: str, default: bool = False) -> bool:
         return default
     return str(val).strip().lower() in ("1", "true", "yes", "y", "on")
 
+def _engine_options() -> dict:
+    # Pool-Größe optional per .env; im Gateway teilen sich viele Greenlets wenige Verbindungen
+    opts = {"pool_pre_ping": True}
+    for key, env in (("pool_size", "DB_POOL_SIZE"), ("max_overflow", "DB_MAX_OVERFLOW"), ("pool_timeout", "DB_POOL_TIMEOUT")):
+        if os.getenv(env):
+            opts[key] = int(os.getenv(env))
+    return opts
+
 class Config:
     #Übung Schwellwert für bestanden
     EXERCISE_PASS_THRESHOLD = float(os.getenv("EXERCISE_PASS_THRESHOLD", "0.9"))
@@ -20,6 +28,7 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", DEFAULT_DB)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options()
     WTF_CSRF_TIME_LIMIT = None
 
     # DSGVO / Retention
@@ -27,8 +36,34 @@ class Config:
     EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", 180))
 
 
+    # Socket.IO: "threading" (DEV, manage.py) oder "eventlet" (Produktion, live_gateway.py)
+    SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+    # Live: Bus für mehrere Worker ("" = ein Prozess, "inprocess", "ipc:///pfad.sock", "redis://…")
+    LIVE_BUS = os.getenv("LIVE_BUS", "")
+    # Live: Schlüssel für ipc:// (leer = SECRET_KEY; "dev" wird abgelehnt)
+    LIVE_BUS_KEY = os.getenv("LIVE_BUS_KEY", "")
+    # Live: Obergrenze für das serverseitige Strich-Log pro Session
+    LIVE_STROKE_LOG_MAX_KB = int(os.getenv("LIVE_STROKE_LOG_MAX_KB", 4096))
+
+    # Hintergrund-Jobs (Exporte, Bildvarianten, PDF-Vorrendern)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+
+    # Dateiauslieferung: "" (Flask streamt), "x-accel" (nginx, internal location unter
+    # FILE_ACCEL_PREFIX → UPLOAD_FOLDER) oder "x-sendfile" (Apache/lighttpd)
+    FILE_SENDFILE = os.getenv("FILE_SENDFILE", "")
+    FILE_ACCEL_PREFIX = os.getenv("FILE_ACCEL_PREFIX", "/_uploads/")
+
+    # Passwörter: bcrypt-Kosten, Hash-Pool und maximale Warteschlange (sonst 503)
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 2))
+    PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", 32))
+
     # Uploads (für Editor-Bilder & Exporte)
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", str((BASE_DIR / "app" / "uploads").resolve()))
+    # Dokument-Uploads in Teilen: Teilgröße, max. Dateigröße, Speicherkontingent je Kurs (MB)
+    UPLOAD_CHUNK_MAX_MB = int(os.getenv("UPLOAD_CHUNK_MAX_MB", 8))
+    UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", 2048))
+    COURSE_QUOTA_MB = int(os.getenv("COURSE_QUOTA_MB", 5120))
 
     # --- DB Reset-Schalter (.env) ---
     DB_RESET_ON_START = _env_bool("DB_RESET", False)          # "1"/"true" → Reset beim Start
@@ -0,0 +1,287 @@
+"""
+Inhaltsadressierter Speicher für Editor-Bilder.
+
+Eingefügte ``data:image/...`` werden blockweise dekodiert und dabei
+SHA-256-gehasht; die Datei liegt genau einmal unter
+``UPLOAD_FOLDER/_blobs/ab/cd/<sha256>.<ext>``. Im HTML steht
+``/courses/files/<kurs>/blobs/<sha256>.<ext>`` – die Berechtigung hängt
+weiter am Kurs, ``serve_file`` bildet auf den gemeinsamen Speicher ab. Der
+Name ändert sich mit dem Inhalt, die Dateien sind also unveränderlich und
+dürfen beliebig lange gecacht werden.
+
+``AssetRef`` hält je Abschnitt die referenzierten Blobs, ``AssetBlob.refcount``
+deren Anzahl (beides in derselben Transaktion wie das Speichern).
+Aufräumen: ``flask assets-gc [--recount] [--dry-run]``.
+"""
+import base64
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import time
+from datetime import datetime as dt, timedelta
+
+from bs4 import BeautifulSoup
+from flask import current_app
+from sqlalchemy import insert, update
+
+from ..extensions import db
+from ..models import AssetBlob, AssetRef, ContentNode, Exercise, gen_id
+from ..utils import authz
+
+BLOB_DIR = "_blobs"
+CHUNK = 64 * 1024 * 4  # Base64-Zeichen pro Block (Vielfaches von 4)
+GC_GRACE_HOURS = 24    # frisch eingefügte, noch nicht gespeicherte Bilder nicht löschen
+
+MIME_EXT = {"image/png": "png", "image/jpeg": "jpg", "image/jpg": "jpg", "image/gif": "gif",
+            "image/webp": "webp", "image/svg+xml": "svg"}
+BLOB_URL = re.compile(r"^/courses/files/(?P<course>[^/]+)/blobs/(?P<sha>[0-9a-f]{64})\.(?P<ext>\w+)$")
+LEGACY_URL = re.compile(r"^/courses/files/(?P<course>[^/]+)/assets/(?P<name>[\w.-]+)$")
+BLOB_REF = re.compile(r"/courses/files/[^/\"']+/blobs/([0-9a-f]{64})\.\w+")
+
+
+def _root() -> str:
+    return current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
+
+
+def blob_rel(sha: str, ext: str) -> str:
+    return f"{BLOB_DIR}/{sha[:2]}/{sha[2:4]}/{sha}.{ext}"
+
+
+def url(course_id: str, sha: str, ext: str) -> str:
+    return f"/courses/files/{course_id}/blobs/{sha}.{ext}"
+
+
+def _sniff(head: bytes, default: str) -> str:
+    """Endung aus den Magic Bytes – gleiche Bytes ergeben immer denselben Dateinamen."""
+    if head.startswith(b"\x89PNG"):
+        return "png"
+    if head.startswith(b"\xff\xd8"):
+        return "jpg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return default
+
+
+def _store(chunks, default_ext: str) -> tuple[str, str, int] | None:
+    """Bytes aus ``chunks`` hashen und als Blob ablegen; liefert (sha256, ext, size)."""
+    tmp_dir = os.path.join(_root(), BLOB_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    h, size, head = hashlib.sha256(), 0, b""
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                if not head:
+                    head = chunk[:16]
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        if not size:
+            return None
+        sha, ext = h.hexdigest(), _sniff(head, default_ext)
+        final = os.path.join(_root(), blob_rel(sha, ext))
+        if os.path.exists(final):
+            return sha, ext, size
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp, final)
+        tmp = None
+        return sha, ext, size
+    finally:
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _b64_chunks(payload: str):
+    if re.search(r"\s", payload):
+        payload = re.sub(r"\s+", "", payload)
+    for i in range(0, len(payload), CHUNK):
+        yield base64.b64decode(payload[i:i + CHUNK])
+
+
+def _file_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _ensure_blob(sha: str, ext: str, size: int) -> None:
+    if db.session.get(AssetBlob, sha) is not None:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        db.session.execute(dialect_insert(AssetBlob).values(sha256=sha, ext=ext, size=size, refcount=0)
+                           .on_conflict_do_nothing(index_elements=["sha256"]))
+    else:
+        db.session.add(AssetBlob(sha256=sha, ext=ext, size=size, refcount=0))
+        db.session.flush()
+
+
+def store_data_url(data_url: str) -> tuple[str, str] | None:
+    """``data:image/...;base64,…`` → (sha256, ext) oder None."""
+    head, sep, payload = data_url.partition(",")
+    m = re.match(r"data:(image/[\w.+-]+);base64$", head)
+    if not sep or not m:
+        return None
+    try:
+        res = _store(_b64_chunks(payload), MIME_EXT.get(m.group(1), "png"))
+    except ValueError:  # kaputtes Base64
+        return None
+    if res is None:
+        return None
+    _ensure_blob(*res)
+    return res[0], res[1]
+
+
+def store_file(path: str) -> tuple[str, str] | None:
+    """Vorhandene Datei (z. B. altes ``<kurs>/assets/<uuid>.png``) in den Speicher übernehmen."""
+    res = _store(_file_chunks(path), os.path.splitext(path)[1].lstrip(".").lower() or "bin")
+    if res is None:
+        return None
+    _ensure_blob(*res)
+    return res[0], res[1]
+
+
+def _may_adopt(src_course: str, name: str, user) -> bool:
+    """Alte Asset-Datei eines anderen Kurses nur übernehmen, wenn ``user`` dort Mitglied ist."""
+    if src_course in (".", "..") or name in (".", ".."):
+        return False
+    if user is None:  # CLI/Wartung
+        return True
+    class_id = authz.course_class(src_course)
+    return class_id is not None and authz.is_member(class_id, user)
+
+
+def process_html(course_id: str, html: str, adopt_legacy: bool = False, user=None) -> str:
+    """
+    data:-Bilder speichern, Blob-URLs anderer Kurse (kopierter Inhalt) auf
+    diesen Kurs umschreiben, alte Asset-Dateien anderer Kurse (mit
+    ``adopt_legacy`` auch die eigenen) übernehmen – aus fremden Kursen nur,
+    wenn ``user`` dort Mitglied ist (``user=None``: CLI, keine Prüfung).
+    """
+    soup = BeautifulSoup(html or "", "html.parser")
+    changed = False
+    for img in soup.find_all("img"):
+        src = img.get("src", "")
+        new = None
+        if src.startswith("data:image/"):
+            res = store_data_url(src)
+            new = url(course_id, *res) if res else None
+        elif (m := BLOB_URL.match(src)) and m.group("course") != course_id:
+            new = url(course_id, m.group("sha"), m.group("ext"))
+        elif (m := LEGACY_URL.match(src)) and (adopt_legacy or m.group("course") != course_id):
+            ok = m.group("course") == course_id or _may_adopt(m.group("course"), m.group("name"), user)
+            path = os.path.join(_root(), m.group("course"), "assets", m.group("name"))
+            res = store_file(path) if ok and os.path.isfile(path) else None
+            new = url(course_id, *res) if res else None
+        if new:
+            img["src"] = new
+            changed = True
+    return str(soup) if changed else html
+
+
+def refs_in(html: str) -> set:
+    return set(BLOB_REF.findall(html or ""))
+
+
+def sync_refs(node_id: str, html: str) -> None:
+    """Referenzen des Abschnitts an ``html`` anpassen (Commit macht der Aufrufer)."""
+    want = refs_in(html)
+    if want:
+        want = {sha for (sha,) in db.session.query(AssetBlob.sha256).filter(AssetBlob.sha256.in_(want))}
+    have = {sha for (sha,) in db.session.query(AssetRef.sha256).filter_by(node_id=node_id)}
+    added, removed = want - have, have - want
+    if added:
+        db.session.execute(insert(AssetRef), [{"id": gen_id(), "sha256": sha, "node_id": node_id} for sha in added])
+        db.session.execute(update(AssetBlob).where(AssetBlob.sha256.in_(added))
+                           .values(refcount=AssetBlob.refcount + 1).execution_options(synchronize_session=False))
+    if removed:
+        AssetRef.query.filter(AssetRef.node_id == node_id, AssetRef.sha256.in_(removed)) \
+            .delete(synchronize_session=False)
+        db.session.execute(update(AssetBlob).where(AssetBlob.sha256.in_(removed))
+                           .values(refcount=AssetBlob.refcount - 1).execution_options(synchronize_session=False))
+
+
+# ---------- Wartung ----------
+def recount() -> int:
+    """Referenzen aus allen Abschnitten und Übungen neu aufbauen; liefert die Zahl der Referenzen."""
+    AssetRef.query.delete(synchronize_session=False)
+    known = {sha for (sha,) in db.session.query(AssetBlob.sha256)}
+    by_node = {}
+    for node_id, html in db.session.query(ContentNode.id, ContentNode.body_html).filter(
+            ContentNode.body_html.like("%/blobs/%")):
+        by_node.setdefault(node_id, set()).update(refs_in(html))
+    # Übungen: Referenzen hängen wie in exercise_save am Knoten
+    for node_id, prompt, solution in db.session.query(Exercise.content_node_id, Exercise.prompt_html,
+                                                      Exercise.solution_html).filter(
+            Exercise.prompt_html.like("%/blobs/%") | Exercise.solution_html.like("%/blobs/%")):
+        by_node.setdefault(node_id, set()).update(refs_in((prompt or "") + (solution or "")))
+    rows, counts = [], {}
+    for node_id, shas in by_node.items():
+        for sha in shas & known:
+            rows.append({"id": gen_id(), "sha256": sha, "node_id": node_id})
+            counts[sha] = counts.get(sha, 0) + 1
+    for i in range(0, len(rows), 1000):
+        db.session.execute(insert(AssetRef), rows[i:i + 1000])
+    db.session.execute(update(AssetBlob).values(refcount=0))
+    if counts:
+        db.session.execute(update(AssetBlob), [{"sha256": sha, "refcount": n} for sha, n in counts.items()])
+    db.session.commit()
+    return len(rows)
+
+
+def gc(grace_hours: float = GC_GRACE_HOURS, dry_run: bool = False) -> dict:
+    """
+    Blobs ohne Referenz (älter als ``grace_hours``) löschen – Zeile und Datei –
+    sowie Dateien ohne Zeile (abgebrochene Speichervorgänge).
+    """
+    cutoff = dt.utcnow() - timedelta(hours=grace_hours)
+    root = os.path.join(_root(), BLOB_DIR)
+    dead = (db.session.query(AssetBlob.sha256, AssetBlob.ext, AssetBlob.size)
+            .filter(AssetBlob.refcount <= 0, AssetBlob.created_at < cutoff).all())
+    freed = 0
+    for sha, ext, size in dead:
+        freed += size or 0
+        if not dry_run:
+            path = os.path.join(_root(), blob_rel(sha, ext))
+            for p in [path] + glob.glob(os.path.join(os.path.dirname(path), f"{sha}-w*")):  # + Bildvarianten
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+    if dead and not dry_run:
+        shas = [sha for sha, _, _ in dead]
+        for i in range(0, len(shas), 1000):
+            AssetBlob.query.filter(AssetBlob.sha256.in_(shas[i:i + 1000])).delete(synchronize_session=False)
+        db.session.commit()
+
+    # Dateien ohne Zeile
+    known = {sha for (sha,) in db.session.query(AssetBlob.sha256)}
+    orphans = 0
+    cutoff_ts = time.time() - grace_hours * 3600
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if name[:64] in known:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_mtime >= cutoff_ts:
+                continue
+            orphans += 1
+            freed += st.st_size
+            if not dry_run:
+                os.remove(path)
+    return {"blobs": len(dead), "orphans": orphans, "bytes": freed}
@@ -0,0 +1,261 @@
+"""
+Live-Export als Hintergrund-Job.
+
+* ``build_vector_pdf``: Standard. Der Server kennt alle Striche (Strich-Log der
+  Session) und den Folieninhalt (Deck); jede Folie wird mit reportlab als
+  Seite gesetzt, die Striche als Vektorpfade darüber gezeichnet. Kein Upload
+  vom Lehrer-Browser nötig.
+* ``build_live_pdf``: Fallback für hochgeladene Seiten-PNGs; sie liegen bereits
+  auf der Platte und werden einzeln in das PDF geschrieben – es ist immer nur
+  ein dekodiertes Bild im Speicher.
+"""
+import base64
+import os
+import re
+import shutil
+from datetime import datetime as dt
+from xml.sax.saxutils import escape
+
+from bs4 import BeautifulSoup, NavigableString
+from bs4.element import PreformattedString
+from flask import current_app
+from PIL import Image
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas as pdf_canvas
+from reportlab.platypus import Frame, Image as RLImage, Paragraph
+
+from . import files
+from ..extensions import db
+from ..models import ContentNode, Document, gen_id
+from ..utils import jobs
+
+PAGE_MARGIN = 36  # 0.5"
+DEFAULT_VIEWPORT = (1000.0, 560.0)   # Folie ohne Striche: typische Lehrer-Ansicht in CSS-Pixeln
+SLIDE_PADDING = 16                   # .p-3 im Live-View
+BASE_FONT_PX = 16
+HEADINGS = {"h1": 2.5, "h2": 2.0, "h3": 1.75, "h4": 1.5, "h5": 1.25, "h6": 1.0}
+BLOCKS = {"p", "li", "pre", "blockquote", "td", "th", "figcaption"}
+
+
+def upload_root() -> str:
+    return current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
+
+
+def staging_dir(course_id: str, job_token: str) -> str:
+    path = os.path.join(upload_root(), course_id, "exports", f"tmp-{job_token}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_data_url_page(dir_: str, i: int, data_url: str) -> str | None:
+    """Altes JSON-Format: eine base64-DataURL als PNG in den Staging-Ordner schreiben."""
+    m = re.match(r"data:image/[^;]+;base64,(.*)", data_url or "", re.DOTALL)
+    if not m:
+        return None
+    path = os.path.join(dir_, f"page_{i + 1:03d}.png")
+    with open(path, "wb") as f:
+        f.write(base64.b64decode(m.group(1)))
+    return path
+
+
+def next_order_index(course_id: str) -> int:
+    max_node = db.session.query(db.func.max(ContentNode.order_index)).filter_by(subject_year_id=course_id).scalar() or 0
+    max_doc = db.session.query(db.func.max(Document.order_index)).filter_by(subject_year_id=course_id).scalar() or 0
+    return max(max_node, max_doc) + 1
+
+
+def add_export_document(course_id: str, user_id: str, abs_pdf: str) -> str:
+    """PDF als Document am Kursende eintragen; liefert den relativen Pfad."""
+    rel_pdf = os.path.relpath(abs_pdf, upload_root()).replace("\\", "/")
+    db.session.add(Document(
+        id=gen_id(), subject_year_id=course_id, filename=os.path.basename(abs_pdf), path=rel_pdf,
+        mime_type="application/pdf", uploaded_by=user_id, order_index=next_order_index(course_id),
+        size=os.path.getsize(abs_pdf),
+    ))
+    db.session.commit()
+    return rel_pdf
+
+
+def _image_page(c, path: str, avail_w: float, avail_h: float) -> None:
+    """Ein Seiten-PNG zentriert auf eine Seite (nur Pillow/reportlab, läuft über ``jobs.native``)."""
+    pw, ph = A4
+    with Image.open(path) as raw:
+        img = raw.convert("RGB")
+    iw, ih = img.size
+    # fit to page
+    scale = min(avail_w / iw, avail_h / ih)
+    tw, th = iw * scale, ih * scale
+    c.drawImage(ImageReader(img), (pw - tw) / 2, (ph - th) / 2, tw, th)
+    c.showPage()
+    img.close()
+
+
+def build_live_pdf(job, course_id: str, user_id: str, page_paths: list, staging: str) -> dict:
+    export_dir = os.path.join(upload_root(), course_id, "exports")
+    abs_pdf = os.path.join(export_dir, f"live_{dt.utcnow().strftime('%Y%m%d_%H%M%S')}_{job.id[:8]}.pdf")
+
+    c = pdf_canvas.Canvas(abs_pdf, pagesize=A4)
+    pw, ph = A4
+    avail_w, avail_h = pw - 2 * PAGE_MARGIN, ph - 2 * PAGE_MARGIN
+    job.progress(0, len(page_paths))
+    try:
+        for i, p in enumerate(page_paths):
+            jobs.native(_image_page, c, p, avail_w, avail_h)
+            job.progress(i + 1)
+        jobs.native(c.save)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    rel_pdf = add_export_document(course_id, user_id, abs_pdf)
+    return {"pdf_url": f"/courses/files/{rel_pdf}"}
+
+
+# ---------- Vektor-Export ----------
+def _local_image_path(src: str) -> str | None:
+    if not src.startswith("/courses/files/"):
+        return None
+    rel = src.split("?", 1)[0].replace("/courses/files/", "", 1).replace("%5C", "/")
+    path = os.path.abspath(os.path.join(upload_root(), files.disk_rel(rel)))
+    if not path.startswith(os.path.abspath(upload_root())) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _flowables(html: str, scale: float, avail_w: float, max_h: float) -> list:
+    """Folien-HTML grob in reportlab-Flowables übersetzen (Text, Überschriften, Bilder ≤ ``max_h`` hoch)."""
+    body = ParagraphStyle("slide", fontName="Helvetica", fontSize=BASE_FONT_PX * scale,
+                          leading=BASE_FONT_PX * 1.5 * scale, spaceAfter=BASE_FONT_PX * 0.5 * scale)
+    out = []
+
+    def para(text, style=body):
+        text = (text or "").strip()
+        if text:
+            out.append(Paragraph(escape(text), style))
+
+    def image(el):
+        path = _local_image_path(el.get("src", ""))
+        if not path:
+            return
+        with Image.open(path) as im:
+            iw, ih = im.size
+        w = min(iw * scale, avail_w, max_h * iw / ih)  # passt immer in einen leeren Rahmen
+        out.append(RLImage(path, width=w, height=ih * w / iw))
+
+    def walk(node):
+        for child in node.children:
+            if isinstance(child, PreformattedString):
+                continue  # Kommentare, Doctype, CDATA
+            if isinstance(child, NavigableString):
+                para(str(child))
+                continue
+            if "d-none" in (child.get("class") or []):
+                continue  # z. B. nicht aufgedeckte Lösung
+            if child.name == "img":
+                image(child)
+            elif child.name in HEADINGS:
+                f = HEADINGS[child.name]
+                para(child.get_text(" ", strip=True), ParagraphStyle(
+                    child.name, parent=body, fontName="Helvetica-Bold",
+                    fontSize=BASE_FONT_PX * f * scale, leading=BASE_FONT_PX * f * 1.2 * scale))
+            elif child.name in BLOCKS and not child.find("img"):
+                para(("• " if child.name == "li" else "") + child.get_text(" ", strip=True))
+            elif child.name in ("script", "style"):
+                continue
+            else:
+                walk(child)
+
+    walk(BeautifulSoup(html or "", "html.parser"))
+    return out
+
+
+def _fill(frame: Frame, flow: list, c) -> None:
+    """Wie ``Frame.addFromList``, teilt aber zu lange Absätze am Rahmenende (Rest bleibt in ``flow``)."""
+    while flow:
+        if frame.add(flow[0], c, trySplit=0):
+            flow.pop(0)
+            continue
+        parts = frame.split(flow[0], c)
+        if len(parts) > 1 and frame.add(parts[0], c, trySplit=0):
+            flow[0:1] = parts[1:]
+        return
+
+
+def _draw_strokes(c, segments, to_page, scale: float) -> None:
+    """Zusammenhängende Segmente gleicher Farbe/Breite als ein Pfad."""
+    c.setLineCap(1)
+    c.setLineJoin(1)
+    path, pen, last = None, None, None
+    for x0, y0, x1, y1, w, rgb in segments:
+        if (w, rgb) != pen or last != (x0, y0):
+            if path is not None:
+                c.drawPath(path, stroke=1, fill=0)
+            pen = (w, rgb)
+            c.setStrokeColorRGB(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255)
+            c.setLineWidth(w * scale)
+            path = c.beginPath()
+            path.moveTo(*to_page(x0, y0))
+        path.lineTo(*to_page(x1, y1))
+        last = (x1, y1)
+    if path is not None:
+        c.drawPath(path, stroke=1, fill=0)
+
+
+def _slide_pages(c, flow: list, segments, vh: float, scale: float) -> None:
+    """Eine Folie setzen: Zeichenfläche mit Strichen, Überlauf auf Folgeseiten (nur reportlab)."""
+    pw, min_ph = landscape(A4)
+    avail_w = pw - 2 * PAGE_MARGIN
+    ph = max(min_ph, vh * scale + 2 * PAGE_MARGIN)
+    c.setPageSize((pw, ph))
+    top = ph - PAGE_MARGIN
+
+    # Inhalt wie im Live-View (Innenabstand der Folie), Höhe = Zeichenfläche
+    pad = SLIDE_PADDING * scale
+    frame_w = avail_w - 2 * pad
+    frame = Frame(PAGE_MARGIN + pad, top - vh * scale + pad, frame_w, vh * scale - 2 * pad,
+                  leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0, showBoundary=0)
+    _fill(frame, flow, c)
+
+    if segments:
+        _draw_strokes(c, segments, lambda x, y: (PAGE_MARGIN + x * scale, top - y * scale), scale)
+    c.showPage()
+
+    # Was nicht auf die Zeichenfläche passt, auf Folgeseiten (ohne Striche)
+    while flow:
+        c.setPageSize((pw, min_ph))
+        head = flow[0]
+        _fill(Frame(PAGE_MARGIN + pad, PAGE_MARGIN + pad, frame_w, min_ph - 2 * PAGE_MARGIN - 2 * pad,
+                    leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0, showBoundary=0), flow, c)
+        if flow and flow[0] is head:
+            flow.pop(0)  # passt nicht einmal auf eine leere Seite – überspringen statt Endlosschleife
+        c.showPage()
+
+
+def build_vector_pdf(job, course_id: str, user_id: str, slides: list, strokes_by_slide: dict) -> dict:
+    """
+    slides: [(titel, html)] in Deck-Reihenfolge (Lösungen wie im Live-Stand),
+    strokes_by_slide: Schnappschuss des Strich-Logs {index: (viewport, segmente)}.
+    """
+    export_dir = os.path.join(upload_root(), course_id, "exports")
+    os.makedirs(export_dir, exist_ok=True)
+    abs_pdf = os.path.join(export_dir, f"live_{dt.utcnow().strftime('%Y%m%d_%H%M%S')}_{job.id[:8]}.pdf")
+
+    pw, min_ph = landscape(A4)
+    avail_w = pw - 2 * PAGE_MARGIN
+    c = pdf_canvas.Canvas(abs_pdf, pagesize=(pw, min_ph))
+    c.setTitle("Live-Export")
+    job.progress(0, len(slides))
+    for i, (title, html) in enumerate(slides):
+        viewport, segments = strokes_by_slide.get(i, (None, []))
+        vw, vh = viewport or DEFAULT_VIEWPORT
+        scale = avail_w / vw                              # CSS-Pixel → pt
+        pad = SLIDE_PADDING * scale
+        # Bildpfade brauchen die App-Config → hier; Satz und Zeichnen ohne App im OS-Thread
+        flow = _flowables(html, scale, avail_w - 2 * pad, min(vh * scale, min_ph - 2 * PAGE_MARGIN) - 2 * pad)
+        jobs.native(_slide_pages, c, flow, segments, vh, scale)
+        job.progress(i + 1)
+    jobs.native(c.save)
+
+    rel_pdf = add_export_document(course_id, user_id, abs_pdf)
+    return {"pdf_url": f"/courses/files/{rel_pdf}"}
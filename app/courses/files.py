@@ -0,0 +1,125 @@
+"""
+Auslieferung von Uploads (Editor-Bilder, Dokumente, Exporte) nach der
+Berechtigungsprüfung in ``serve_file``.
+
+* Unveränderliche Dateien (Name = Inhalts-/Zufalls-ID, z. B.
+  ``<kurs>/blobs/<sha256>.png`` aus ``assets.py`` oder ältere
+  ``<kurs>/assets/<hex>.png``, Dokumente ``<kurs>/docs/<hex>.<ext>`` aus
+  ``uploads.py``): ETag = Dateiname, ``Cache-Control: private, max-age=1
+  Jahr, immutable``. Ein ``If-None-Match`` wird ohne Dateisystem-
+  zugriff mit 304 beantwortet.
+* Alle anderen: ETag aus mtime/Größe, ``no-cache`` (Browser fragt kurz mit
+  ``If-None-Match`` nach und bekommt meist 304).
+* Bildvarianten ``<kurs>/blobs/<sha256>-w<breite>.<ext>`` (siehe
+  ``images.py``): WebP, wenn der Browser es im ``Accept`` anbietet, sonst
+  JPEG/PNG; ist die Variante noch nicht erzeugt, das Original (ohne
+  Langzeit-Cache).
+* ``Range`` (große PDFs/Videos) und bedingte Requests übernimmt
+  ``send_file(conditional=True)``.
+* ``FILE_SENDFILE = "x-accel"``: nur der Header ``X-Accel-Redirect`` geht
+  zurück, nginx streamt die Bytes (inkl. Range) selbst, z. B.::
+
+      location /_uploads/ { internal; alias /pfad/zu/UPLOAD_FOLDER/; }
+
+  ``"x-sendfile"``: dasselbe für Apache/lighttpd (``X-Sendfile`` mit
+  absolutem Pfad).
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+
+from . import assets, images
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Dateien, deren Name sich bei jeder Inhaltsänderung ändert
+IMMUTABLE = (
+    re.compile(r"^[^/]+/assets/(?P<etag>[0-9a-f]{32})\.\w+$"),
+    re.compile(r"^[^/]+/blobs/(?P<etag>[0-9a-f]{64})\.\w+$"),
+    re.compile(r"^[^/]+/docs/(?P<etag>[0-9a-f]{32})\.\w+$"),
+)
+BLOB = re.compile(r"^[^/]+/blobs/(?P<sha>[0-9a-f]{64})\.(?P<ext>\w+)$")
+VARIANT = re.compile(r"^[^/]+/blobs/(?P<sha>[0-9a-f]{64})-w(?P<w>\d+)\.(?P<ext>\w+)$")
+
+
+def upload_root() -> str:
+    return current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
+
+
+def disk_rel(rel: str) -> str:
+    """URL-Pfad → Pfad unter ``UPLOAD_FOLDER`` (Kurs-Blobs liegen im gemeinsamen Speicher)."""
+    m = BLOB.match(rel)
+    return assets.blob_rel(m.group("sha"), m.group("ext")) if m else rel
+
+
+def immutable_etag(rel: str) -> str | None:
+    for rx in IMMUTABLE:
+        m = rx.match(rel)
+        if m:
+            return m.group("etag")
+    return None
+
+
+def _cache_headers(resp, etag: str | None):
+    if etag:
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = f"private, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def _candidates(rel: str) -> tuple[list, bool]:
+    """[(Pfad unter UPLOAD_FOLDER, ETag oder None)] in Reihenfolge; bool = Antwort hängt von Accept ab."""
+    m = VARIANT.match(rel)
+    if not m:
+        return [(disk_rel(rel), immutable_etag(rel))], False
+    sha, w, ext = m.group("sha"), int(m.group("w")), m.group("ext")
+    fmts = (("webp",) if "image/webp" in request.headers.get("Accept", "") else ()) + images.FALLBACK_FORMATS
+    # Variante noch nicht erzeugt → Original, aber ohne Langzeit-Cache
+    return [(images.variant_rel(sha, w, f), f"{sha}-w{w}-{f}") for f in fmts] + [(assets.blob_rel(sha, ext), None)], True
+
+
+def send_upload(rel: str):
+    """``rel`` relativ zu ``UPLOAD_FOLDER`` (bereits normalisiert und geprüft); None, wenn es die Datei nicht gibt."""
+    candidates, vary = _candidates(rel)
+    etag = candidates[0][1]
+    if etag and etag in request.if_none_match:
+        resp = _cache_headers(current_app.response_class(status=304), etag)
+        if vary:
+            resp.vary.add("Accept")
+        return resp
+
+    for rel, etag in candidates:
+        abs_path = os.path.join(upload_root(), rel)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            break
+    else:
+        return None
+
+    mode = (current_app.config.get("FILE_SENDFILE") or "").lower()
+    if mode in ("x-accel", "x-sendfile"):
+        resp = current_app.response_class(
+            mimetype=mimetypes.guess_type(rel)[0] or "application/octet-stream")
+        if mode == "x-accel":
+            prefix = current_app.config.get("FILE_ACCEL_PREFIX", "/_uploads/").rstrip("/")
+            resp.headers["X-Accel-Redirect"] = f"{prefix}/{quote(rel)}"
+        else:
+            resp.headers["X-Sendfile"] = abs_path
+        if not etag:
+            resp.last_modified = st.st_mtime
+            resp.set_etag(f"{int(st.st_mtime)}-{st.st_size}")
+        resp = _cache_headers(resp, etag).make_conditional(request)
+    else:
+        resp = _cache_headers(send_file(abs_path, conditional=True, etag=etag or True,
+                                        last_modified=st.st_mtime, max_age=None), etag)
+    if vary:
+        resp.vary.add("Accept")
+    return resp
@@ -0,0 +1,106 @@
+"""
+Bewertung von Übungen.
+
+``get(ex)`` liefert einen pro Übungs-Version einmal kompilierten ``Grader``:
+Textlösungen sind bereits normalisiert, MC-Schlüssel als ``frozenset``
+abgelegt. Der Cache lebt im Prozess; ``Exercise.version`` steigt bei jeder
+Item-Änderung, alte Einträge werden so nie mehr getroffen.
+
+``regrade(ex)`` bewertet alle Abgaben einer Übung neu (z. B. nach einem
+korrigierten Lösungsschlüssel) – in Batches, geänderte Scores per
+Bulk-UPDATE, ein Commit.
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import update
+
+from ..extensions import db
+from ..models import Exercise, ExerciseItem, Submission
+
+CACHE_SIZE = 512
+BATCH = 1000
+
+
+def normalize_text(s) -> str:
+    return (s or "").strip().lower()
+
+
+class Grader:
+    __slots__ = ("exercise_id", "version", "text_keys", "mc_keys", "total")
+
+    def __init__(self, exercise_id: str, version: int, items):
+        self.exercise_id = exercise_id
+        self.version = version
+        self.text_keys = {}   # item_id -> (normalisierte Lösung, Punkte)
+        self.mc_keys = {}     # item_id -> (frozenset Schlüssel, Punkte)
+        self.total = 0
+        for it in items:
+            pts = it.points or 0
+            if it.type == "text":
+                self.total += pts
+                if isinstance(it.correct, dict) and "equals" in it.correct:
+                    self.text_keys[it.id] = (normalize_text(it.correct["equals"]), pts)
+            elif it.type == "mc":
+                self.total += pts
+                self.mc_keys[it.id] = (frozenset(str(c).upper() for c in it.correct or []), pts)
+
+    def score(self, answers: dict) -> float:
+        """``answers`` im Format von ``Submission.answer_json``."""
+        score = 0
+        for item_id, ans in (answers or {}).items():
+            if not isinstance(ans, dict):
+                continue
+            if item_id in self.mc_keys:
+                key, pts = self.mc_keys[item_id]
+                if frozenset(str(c).upper() for c in ans.get("choices") or []) == key:
+                    score += pts
+            elif item_id in self.text_keys:
+                key, pts = self.text_keys[item_id]
+                if normalize_text(ans.get("text")) == key:
+                    score += pts
+        return score
+
+
+_cache = OrderedDict()  # (exercise_id, version) -> Grader
+_lock = threading.Lock()
+
+
+def get(ex: Exercise) -> Grader:
+    key = (ex.id, ex.version or 0)
+    with _lock:
+        g = _cache.get(key)
+        if g is not None:
+            _cache.move_to_end(key)
+            return g
+    items = ExerciseItem.query.filter(ExerciseItem.exercise_id == ex.id,
+                                      ExerciseItem.type.in_(("text", "mc"))).all()
+    g = Grader(ex.id, key[1], items)
+    with _lock:
+        _cache[key] = g
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return g
+
+
+def regrade(ex: Exercise) -> int:
+    """Alle Abgaben der Übung neu bewerten; liefert die Zahl geänderter Scores."""
+    g = get(ex)
+    changed, last_id = 0, ""
+    while True:
+        rows = (db.session.query(Submission.id, Submission.answer_json, Submission.score)
+                .filter(Submission.assignment_id == ex.content_node_id, Submission.id > last_id)
+                .order_by(Submission.id).limit(BATCH).all())
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = []
+        for sid, answers, old in rows:
+            new = g.score(answers)
+            if old is None or float(old) != float(new):
+                updates.append({"id": sid, "score": new})
+        if updates:
+            db.session.execute(update(Submission), updates)
+            changed += len(updates)
+    db.session.commit()
+    return changed
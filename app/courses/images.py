@@ -0,0 +1,168 @@
+"""
+Responsive Bildvarianten für Editor-Bilder (Blobs aus ``assets.py``).
+
+Beim Speichern eines Abschnitts bekommt jedes Blob-``<img>`` ein ``srcset``
+mit den Breiten aus ``WIDTHS`` (nur kleiner als das Original) plus
+``sizes``, ``width``/``height``, ``loading="lazy"``. Die Varianten selbst
+rechnet ein Hintergrund-Job (``jobs``) aus: je Breite WebP und als
+Rückfall JPEG (bzw. PNG bei Transparenz) unter
+``_blobs/ab/cd/<sha256>-w<breite>.<fmt>``. ``serve_file`` wählt das Format
+nach ``Accept``; solange eine Variante fehlt, liefert es das Original.
+
+Bestand nachziehen: ``flask assets-variants [--course ID]``.
+"""
+import os
+import tempfile
+
+from bs4 import BeautifulSoup
+from flask import current_app
+from PIL import Image, ImageOps
+
+from . import assets
+from ..extensions import db
+from ..models import AssetBlob
+from ..utils import jobs
+
+WIDTHS = (480, 960, 1600)
+RASTER = ("png", "jpg", "webp")     # GIF (Animation) und SVG bleiben wie sie sind
+ORIGINAL_MAX_W = 2400              # größere Originale tauchen im srcset nicht auf
+FALLBACK_FORMATS = ("jpg", "png")   # für Browser ohne WebP
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def variant_rel(sha: str, width: int, fmt: str) -> str:
+    return f"{assets.BLOB_DIR}/{sha[:2]}/{sha[2:4]}/{sha}-w{width}.{fmt}"
+
+
+def planned(width: int | None) -> list:
+    return [w for w in WIDTHS if width and w < width]
+
+
+def _path(rel: str) -> str:
+    return os.path.join(assets._root(), rel)
+
+
+def probe(sha: str, ext: str) -> tuple[int, int] | None:
+    """Anzeigegröße (EXIF-Drehung berücksichtigt) – liest nur den Header."""
+    try:
+        with Image.open(_path(assets.blob_rel(sha, ext))) as im:
+            w, h = im.size
+            if im.getexif().get(0x0112) in (5, 6, 7, 8):
+                w, h = h, w
+            return w, h
+    except (OSError, ValueError):
+        return None
+
+
+def _dimensions(blobs: dict) -> None:
+    """Fehlende width/height nachtragen (Altbestand); Commit macht der Aufrufer."""
+    for b in blobs.values():
+        if b.width is None and b.ext in RASTER:
+            size = probe(b.sha256, b.ext)
+            if size:
+                b.width, b.height = size
+
+
+def add_srcset(html: str) -> str:
+    """``srcset``/``sizes`` für alle Blob-Bilder setzen (idempotent)."""
+    soup = BeautifulSoup(html or "", "html.parser")
+    imgs = [(img, m) for img in soup.find_all("img") if (m := assets.BLOB_URL.match(img.get("src", "")))]
+    if not imgs:
+        return html
+    blobs = {b.sha256: b for b in AssetBlob.query.filter(AssetBlob.sha256.in_({m.group("sha") for _, m in imgs}))}
+    _dimensions(blobs)
+    for img, m in imgs:
+        b = blobs.get(m.group("sha"))
+        if b is None or b.ext not in RASTER or not b.width:
+            continue
+        widths = planned(b.width)
+        if widths:
+            base = img["src"].rsplit(".", 1)[0]
+            srcset = [f"{base}-w{w}.{b.ext} {w}w" for w in widths]
+            if b.width <= ORIGINAL_MAX_W:  # riesige Fotos nie über srcset ausliefern
+                srcset.append(f"{img['src']} {b.width}w")
+            img["srcset"] = ", ".join(srcset)
+            img["sizes"] = f"(max-width: {b.width}px) 100vw, {b.width}px"
+        img.attrs.setdefault("width", str(b.width))
+        img.attrs.setdefault("height", str(b.height))
+        img.attrs.setdefault("loading", "lazy")
+        img.attrs.setdefault("decoding", "async")
+    return str(soup)
+
+
+# ---------- Varianten erzeugen ----------
+def _save(im: Image.Image, path: str, fmt: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if fmt == "webp":
+                im.save(f, "WEBP", quality=WEBP_QUALITY, method=4)
+            elif fmt == "jpg":
+                im.save(f, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                im.save(f, "PNG", optimize=True)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _render(root: str, sha: str, ext: str) -> tuple[int, int, list]:
+    """Nur Pillow und Dateien (läuft über ``jobs.native``); liefert (Breite, Höhe, Varianten-Breiten)."""
+    with Image.open(os.path.join(root, assets.blob_rel(sha, ext))) as im:
+        im = ImageOps.exif_transpose(im)
+        width, height = im.size
+        alpha = im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info)
+        src = im.convert("RGBA" if alpha else "RGB")
+    widths = planned(width)
+    for w in widths:
+        v = src.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+        _save(v, os.path.join(root, variant_rel(sha, w, "webp")), "webp")
+        fmt = "png" if alpha else "jpg"
+        _save(v, os.path.join(root, variant_rel(sha, w, fmt)), fmt)
+    return width, height, widths
+
+
+def generate(sha: str) -> list:
+    """Alle Varianten eines Blobs schreiben; liefert die Breiten (Commit macht der Aufrufer)."""
+    b = db.session.get(AssetBlob, sha)
+    if b is None:
+        return []
+    if b.ext not in RASTER:
+        b.variants = []
+        return []
+    b.width, b.height, widths = jobs.native(_render, assets._root(), sha, b.ext)
+    b.variants = widths
+    return widths
+
+
+def _run(job, shas: list) -> dict:
+    done = 0
+    job.progress(0, len(shas))
+    for sha in shas:
+        try:
+            generate(sha)
+            db.session.commit()
+        except Exception as e:  # kaputtes Bild: Original bleibt, kein Job-Abbruch
+            db.session.rollback()
+            current_app.logger.warning("Bildvarianten für %s fehlgeschlagen: %s", sha, e)
+        done += 1
+        job.progress(done)
+    return {"blobs": done}
+
+
+def pending(shas) -> list:
+    shas = set(shas)
+    if not shas:
+        return []
+    return [sha for (sha,) in db.session.query(AssetBlob.sha256)
+            .filter(AssetBlob.sha256.in_(shas), AssetBlob.variants.is_(None))]
+
+
+def schedule(shas, owner_id: str | None = None):
+    """Varianten für noch nicht bearbeitete Blobs im Hintergrund erzeugen (nach dem Commit aufrufen)."""
+    todo = pending(shas)
+    if not todo:
+        return None
+    return jobs.submit(current_app._get_current_object(), "image_variants", _run, todo, owner_id=owner_id)
@@ -0,0 +1,226 @@
+"""
+PDFs von Abschnitten (WeasyPrint) mit Plattencache und Kurs-Heft.
+
+Schlüssel = SHA-256 über ``STYLE_VERSION``, Titel und das beim Speichern
+vorgerenderte PDF-Fragment (``render.section_pdf_html``). Bilder stecken
+inhaltsadressiert im Fragment, ändern also ebenfalls den Schlüssel. Das PDF
+liegt unter ``UPLOAD_FOLDER/_pdfcache/ab/<key>.pdf``; 30 Downloads desselben
+Arbeitsblatts rendern einmal. Beim Freigeben eines Abschnitts wird das PDF
+im Hintergrund vorgerendert.
+
+``build_booklet`` (Job) setzt alle freigegebenen Abschnitte und Übungen
+eines Kurses zu einem Heft zusammen: jeder Teil wird einzeln gerendert (bzw.
+aus dem Cache genommen) – WeasyPrint hält nie das ganze Heft als Layout.
+Zusammengefügt wird per ``pypdf``: immer nur ein Teil ist geöffnet, seine
+Seiten werden in den ``PdfWriter`` kopiert. Der hält bis zum Schreiben alle
+Seitenobjekte; der Speicherbedarf liegt also bei etwa der Größe des fertigen
+(komprimierten) Hefts, nicht gestreamt.
+
+WeasyPrint (und für das Heft ``pypdf``) sind optional; ohne sie gibt es
+eine Meldung statt eines PDFs.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+from datetime import datetime as dt
+
+from flask import current_app, render_template
+from markupsafe import escape
+
+from . import exports, files, render
+from ..extensions import db
+from ..models import ContentNode, Exercise, ExerciseItem
+from ..utils import jobs
+
+STYLE_VERSION = 1      # erhöhen, wenn sich CSS/Template ändern → alle Cache-Einträge veralten
+CACHE_DIR = "_pdfcache"
+CACHE_MAX_AGE_DAYS = 30
+PAGE_CSS = """
+    @page { size: A4; margin: 18mm; }
+    body { font-family: Arial, sans-serif; }
+    h1, h2, h3 { page-break-after: avoid; }
+    img, video { max-width: 100%; }
+"""
+
+
+class Unavailable(RuntimeError):
+    """WeasyPrint bzw. pypdf nicht installiert."""
+
+
+def _weasy():
+    try:
+        from weasyprint import CSS, HTML
+    except Exception as e:
+        raise Unavailable("PDF-Export benötigt WeasyPrint (pip install weasyprint)") from e
+    return HTML, CSS
+
+
+def available() -> bool:
+    try:
+        _weasy()
+        return True
+    except Unavailable:
+        return False
+
+
+def _key(*parts: str) -> str:
+    h = hashlib.sha256(f"pdf-v{STYLE_VERSION}".encode())
+    for p in parts:
+        h.update(b"\0")
+        h.update((p or "").encode())
+    return h.hexdigest()
+
+
+def cache_path(key: str) -> str:
+    return os.path.join(files.upload_root(), CACHE_DIR, key[:2], f"{key}.pdf")
+
+
+def _write_atomic(path: str, write) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _render(title: str, body_html: str, target) -> None:
+    HTML, CSS = _weasy()
+    html = render_template("courses/section_pdf.html", node=type("Obj", (), {"title": title, "body_html": body_html})())
+    base_url = files.upload_root()
+    jobs.native(lambda: HTML(string=html, base_url=base_url).write_pdf(target, stylesheets=[CSS(string=PAGE_CSS)]))
+
+
+def _cached(title: str, body_html: str) -> tuple[str, str]:
+    """(key, Pfad) – rendert nur, wenn der Eintrag fehlt.
+
+    Pro Schlüssel rendert nur einer (``flock`` auf ``<key>.pdf.lock``, auch
+    über Worker hinweg); wer wartet, findet danach die fertige Datei vor.
+    """
+    key = _key(title, body_html)
+    path = cache_path(key)
+    if os.path.exists(path):
+        os.utime(path)  # für prune(): zuletzt benutzt
+        return key, path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        _flock(lock)
+        if not os.path.exists(path):
+            _write_atomic(path, lambda f: _render(title, body_html, f))
+    return key, path
+
+
+def _flock(f) -> None:
+    """Exklusive Sperre, ohne den Eventlet-Hub zu blockieren (wie in ``uploads``)."""
+    while True:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(0.05)
+
+
+def section(node: ContentNode) -> tuple[str, str]:
+    """PDF eines Abschnitts aus dem Cache (oder jetzt rendern); liefert (key, Pfad)."""
+    return _cached(node.title or "", render.section_pdf_html(node))
+
+
+def section_key(node: ContentNode) -> str:
+    return _key(node.title or "", render.section_pdf_html(node))
+
+
+def _exercise_body(node: ContentNode, ex: Exercise | None) -> str:
+    """Übung fürs Heft: Aufgabe (ohne Lösung) + Teilaufgaben mit Antwortoptionen."""
+    parts = [render.exercise_html(node.id, ex, False)]
+    if ex is not None:
+        items = (ExerciseItem.query.filter_by(exercise_id=ex.id)
+                 .order_by(ExerciseItem.order_index.asc(), ExerciseItem.id.asc()).all())
+        for i, it in enumerate(items, 1):
+            parts.append(f"<h3>Aufgabe {i}</h3>{it.prompt_html or ''}")
+            opts = [o for o in (it.options or []) if isinstance(o, dict)]
+            if opts:
+                parts.append("<ul>" + "".join(f"<li>{escape(o.get('id', ''))}) {escape(o.get('text', ''))}</li>"
+                                              for o in opts) + "</ul>")
+    return render._pdf_fragment("".join(parts))
+
+
+# ---------- Hintergrund ----------
+def prerender(job, node_ids: list) -> dict:
+    """Job: PDFs für frisch freigegebene Abschnitte in den Cache legen."""
+    done = 0
+    job.progress(0, len(node_ids))
+    for node_id in node_ids:
+        node = db.session.get(ContentNode, node_id)
+        if node is not None and node.type in ("section", "lesson"):
+            section(node)
+        done += 1
+        job.progress(done)
+    return {"rendered": done}
+
+
+def build_booklet(job, course_id: str, user_id: str) -> dict:
+    """Job: alle freigegebenen Abschnitte/Übungen als ein PDF (Document am Kursende)."""
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError as e:
+        raise Unavailable("Kurs-Heft benötigt pypdf (pip install pypdf)") from e
+    _weasy()
+
+    nodes = (ContentNode.query.filter_by(subject_year_id=course_id, released=True)
+             .filter(ContentNode.type.in_(("section", "lesson", "exercise")))
+             .order_by(ContentNode.order_index.asc(), ContentNode.title.asc()).all())
+    ex_ids = [n.id for n in nodes if n.type == "exercise"]
+    exercises = {e.content_node_id: e for e in Exercise.query.filter(Exercise.content_node_id.in_(ex_ids))} if ex_ids else {}
+    job.progress(0, len(nodes) + 1)
+
+    parts = []
+    for i, n in enumerate(nodes):
+        if n.type == "exercise":
+            parts.append(_cached(n.title or "", _exercise_body(n, exercises.get(n.id)))[1])
+        else:
+            parts.append(section(n)[1])
+        job.progress(i + 1)
+
+    export_dir = os.path.join(files.upload_root(), course_id, "exports")
+    abs_pdf = os.path.join(export_dir, f"heft_{dt.utcnow().strftime('%Y%m%d_%H%M%S')}_{job.id[:8]}.pdf")
+
+    def write(f):
+        writer = PdfWriter()
+        for path in parts:
+            with open(path, "rb") as src:  # add_page kopiert die Seite → Teil danach wieder zu
+                for page in PdfReader(src).pages:
+                    writer.add_page(page)
+        writer.write(f)
+
+    jobs.native(_write_atomic, abs_pdf, write)
+    rel_pdf = exports.add_export_document(course_id, user_id, abs_pdf)
+    job.progress(len(nodes) + 1)
+    return {"pdf_url": f"/courses/files/{rel_pdf}", "sections": len(nodes)}
+
+
+def prune(max_age_days: float = CACHE_MAX_AGE_DAYS, dry_run: bool = False) -> tuple[int, int]:
+    """Cache-Einträge entfernen, die so lange nicht benutzt wurden; liefert (Dateien, Bytes)."""
+    cutoff = time.time() - max_age_days * 86400
+    n = size = 0
+    for dirpath, _, names in os.walk(os.path.join(files.upload_root(), CACHE_DIR)):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            st = os.stat(path)
+            if st.st_mtime < cutoff:
+                n, size = n + 1, size + st.st_size
+                if not dry_run:
+                    os.remove(path)
+    return n, size
+
+
+def schedule_release(node_ids: list, owner_id: str | None = None):
+    """Nach der Freigabe: Abschnitts-PDFs vorrendern (ohne WeasyPrint: nichts tun)."""
+    if not node_ids or not available():
+        return None
+    return jobs.submit(current_app._get_current_object(), "pdf_prerender", prerender, list(node_ids),
+                       owner_id=owner_id)
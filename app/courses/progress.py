@@ -0,0 +1,83 @@
+"""
+Kursfortschritt: ``ExerciseProgress`` hält je Schüler und Übung eine Zeile,
+sobald eine Abgabe existiert. Geschrieben wird in derselben Transaktion wie
+die Abgabe (``mark_completed`` committet nicht selbst); ``detail()`` liest nur
+noch über die beiden Indizes der Tabelle.
+
+Backfill/Reparatur: ``flask rebuild-progress [--course ID]``.
+"""
+from datetime import datetime as dt
+
+from sqlalchemy import func, insert
+
+from ..extensions import db
+from ..models import ContentNode, ExerciseProgress, Submission, gen_id
+
+DONE_STATUSES = ("submitted", "evaluated")
+BATCH = 1000
+
+
+def mark_completed(course_id: str, node_id: str, student_ids, when=None) -> int:
+    """
+    Fehlende Zeilen anlegen (ein SELECT, ein INSERT); Commit macht der Aufrufer.
+    Parallel angelegte Zeilen (Doppel-Abgabe) überspringt ``ON CONFLICT DO NOTHING``.
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return 0
+    have = {sid for (sid,) in db.session.query(ExerciseProgress.student_id)
+            .filter(ExerciseProgress.node_id == node_id, ExerciseProgress.student_id.in_(student_ids))}
+    rows = [{"id": gen_id(), "course_id": course_id, "student_id": sid, "node_id": node_id,
+             "completed_at": when or dt.utcnow()} for sid in student_ids - have]
+    if rows:
+        db.session.execute(_insert_ignore(), rows)
+    return len(rows)
+
+
+def _insert_ignore():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(ExerciseProgress)
+    return dialect_insert(ExerciseProgress).on_conflict_do_nothing(index_elements=["student_id", "node_id"])
+
+
+def completion_counts(course_id: str, student_ids) -> dict:
+    """{node_id: Anzahl Schüler der Klasse mit Abgabe}."""
+    if not student_ids:
+        return {}
+    rows = (db.session.query(ExerciseProgress.node_id, func.count(ExerciseProgress.id))
+            .filter(ExerciseProgress.course_id == course_id, ExerciseProgress.student_id.in_(student_ids))
+            .group_by(ExerciseProgress.node_id))
+    return dict(rows)
+
+
+def completed_ids(course_id: str, student_id: str) -> set:
+    return {nid for (nid,) in db.session.query(ExerciseProgress.node_id)
+            .filter_by(student_id=student_id, course_id=course_id)}
+
+
+def rebuild(course_id: str | None = None) -> int:
+    """Tabelle (ganz oder für einen Kurs) aus den Abgaben neu aufbauen."""
+    q = ExerciseProgress.query
+    if course_id:
+        q = q.filter_by(course_id=course_id)
+    q.delete(synchronize_session=False)
+
+    src = (db.session.query(ContentNode.subject_year_id, Submission.student_id, Submission.assignment_id,
+                            func.min(Submission.submitted_at))
+           .join(ContentNode, ContentNode.id == Submission.assignment_id)
+           .filter(ContentNode.type == "exercise", Submission.status.in_(DONE_STATUSES))
+           .group_by(ContentNode.subject_year_id, Submission.student_id, Submission.assignment_id))
+    if course_id:
+        src = src.filter(ContentNode.subject_year_id == course_id)
+
+    rows = [{"id": gen_id(), "course_id": cid, "student_id": sid, "node_id": nid, "completed_at": when or dt.utcnow()}
+            for cid, sid, nid, when in src.all()]
+    for i in range(0, len(rows), BATCH):
+        db.session.execute(insert(ExerciseProgress), rows[i:i + BATCH])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,106 @@
+"""
+Beim Speichern vorgerenderte HTML-Fragmente.
+
+``save_section`` / ``exercise_save`` rufen ``section(node)`` bzw.
+``exercise(node_id, ex)``; die Ergebnisse liegen in der DB:
+
+* ``ContentNode.render_html``      – Ansicht/Live-Folie
+* ``ContentNode.render_pdf_html``  – für WeasyPrint: Bilder als absolute
+  lokale Pfade, ohne ``srcset``/``loading``
+* ``Exercise.render_html`` / ``render_revealed_html`` – Folie ohne/mit Lösung
+
+Leser (``section_view``, ``section_pdf``, Live-Deck) nehmen nur noch das
+fertige Fragment, ohne BeautifulSoup. ``RENDER_VERSION`` steigt, wenn sich
+der Renderer ändert; ältere Artefakte rendern die Leser ersatzweise selbst,
+bis ``flask rerender`` gelaufen ist (auch nach Umzug von ``UPLOAD_FOLDER``).
+"""
+import os
+
+from bs4 import BeautifulSoup
+
+from . import files
+from ..models import ContentNode, Exercise
+
+RENDER_VERSION = 1
+
+EMPTY_EXERCISE = "<div class='alert alert-warning'>Diese Übung hat noch keinen Inhalt.</div>"
+PDF_DROP_ATTRS = ("srcset", "sizes", "loading", "decoding")
+
+
+def _pdf_fragment(html: str) -> str:
+    soup = BeautifulSoup(html or "", "html.parser")
+    root = files.upload_root()
+    for img in soup.find_all("img"):
+        src = img.get("src", "")
+        if src.startswith("/courses/files/"):
+            rel = src.split("?", 1)[0].replace("/courses/files/", "", 1).replace("%5C", "/")
+            img["src"] = os.path.join(root, files.disk_rel(rel)).replace("\\", "/")
+        for attr in PDF_DROP_ATTRS:
+            img.attrs.pop(attr, None)
+    return str(soup)
+
+
+def _exercise_html(node_id: str, ex: Exercise | None, show_solution: bool) -> str:
+    if not ex:
+        return EMPTY_EXERCISE
+    prompt = (ex.prompt_html or ex.prompt_md or "").strip()
+    solution = (ex.solution_html or "").strip()
+    # Klasse "d-none" nur setzen, wenn Lösung versteckt bleiben soll
+    solution_class = "" if show_solution else "d-none"
+    return (
+        f"<div class='ex-wrapper' data-node-id='{node_id}'>"
+        f"  <div class='ex-prompt'>{prompt}</div>"
+        f"  <div class='ex-solution {solution_class}'>"
+        f"    <hr><div class='alert alert-success'><strong>Lösung:</strong></div>"
+        f"    {solution}"
+        f"  </div>"
+        f"</div>"
+    )
+
+
+# ---------- Schreiben (beim Speichern) ----------
+def section(node: ContentNode) -> None:
+    node.render_html = node.body_html or node.body_md or ""
+    node.render_pdf_html = _pdf_fragment(node.render_html)
+    node.render_version = RENDER_VERSION
+
+
+def exercise(node_id: str, ex: Exercise) -> None:
+    ex.render_html = _exercise_html(node_id, ex, False)
+    ex.render_revealed_html = _exercise_html(node_id, ex, True)
+    ex.render_version = RENDER_VERSION
+
+
+# ---------- Lesen ----------
+def section_html(node: ContentNode) -> str:
+    if node.render_version == RENDER_VERSION:
+        return node.render_html or ""
+    return node.body_html or node.body_md or ""
+
+
+def section_pdf_html(node: ContentNode) -> str:
+    if node.render_version == RENDER_VERSION:
+        return node.render_pdf_html or ""
+    return _pdf_fragment(node.body_html or node.body_md or "")
+
+
+def exercise_html(node_id: str, ex: Exercise | None, show_solution: bool) -> str:
+    if ex is not None and ex.render_version == RENDER_VERSION:
+        return (ex.render_revealed_html if show_solution else ex.render_html) or ""
+    return _exercise_html(node_id, ex, show_solution)
+
+
+def rerender(course_id: str | None = None) -> int:
+    """Alle Artefakte (ganz oder für einen Kurs) neu erzeugen; Commit macht der Aufrufer."""
+    q = ContentNode.query
+    if course_id:
+        q = q.filter_by(subject_year_id=course_id)
+    nodes = q.all()
+    ids = [n.id for n in nodes if n.type == "exercise"]
+    exercises = {ex.content_node_id: ex for ex in Exercise.query.filter(Exercise.content_node_id.in_(ids))} if ids else {}
+    for node in nodes:
+        if node.type != "exercise":
+            section(node)
+        elif node.id in exercises:
+            exercise(node.id, exercises[node.id])
+    return len(nodes)
@@ -1,31 +1,21 @@
-import os, re, uuid, base64, random, io
-from io import BytesIO
+import os, random, shutil, zlib
 from datetime import datetime as dt
-from bs4 import BeautifulSoup
-from PIL import Image
 from sqlalchemy import func
-from reportlab.pdfgen import canvas as pdf_canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
-from flask import request, abort, jsonify, render_template, redirect, url_for, flash, current_app, send_from_directory, \
-    make_response
+from flask import request, abort, jsonify, render_template, redirect, url_for, flash, current_app, send_file
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 
-from . import bp
+from . import bp, assets, exports, files, grading, images, pdfs, progress, render, uploads
 from .. import Config
 from ..extensions import db, csrf
+from ..live import deck as live_deck
+from ..utils import authz, jobs, stars
+from ..utils.authz import course_required
 from ..models import (
     Subject, SubjectYear, Class, Enrollment,
-    ContentNode, Exercise, ExerciseItem, Submission, Document, StarTransaction, Document, LiveSession, gen_id, User
+    ContentNode, Exercise, ExerciseItem, Submission, Document, StarTransaction, Document, LiveSession, UploadSession, gen_id, User
 )
 
-ALLOWED_DOC_EXTS = {"pdf","png","jpg","jpeg","doc","docx","ppt","pptx","xls","xlsx","txt"}
-
-def _nodes_for_course_sorted(course_id):
-    return ContentNode.query.filter_by(subject_year_id=course_id)\
-        .order_by(ContentNode.order_index.asc(), ContentNode.title.asc()).all()
-
 def _gen_code(n=6):
     charset = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
     return "".join(random.choice(charset) for _ in range(n))
@@ -34,7 +24,7 @@ def _gen_code(n=6):
 def _user_courses():
     if current_user.role == "admin":
         return SubjectYear.query.all()
-    class_ids = [e.class_id for e in Enrollment.query.filter_by(user_id=current_user.id).all()]
+    class_ids = list(authz.memberships(current_user.id).classes)
     return SubjectYear.query.filter(SubjectYear.class_id.in_(class_ids)).all() if class_ids else []
 
 def _current_school_year():
@@ -52,34 +42,7 @@ def _get_or_create_subject(name: str) -> Subject:
     return s
 
 def _star_balance(user_id: str) -> int:
-    return sum(t.amount for t in StarTransaction.query.filter_by(user_id=user_id).all())
-
-def _save_data_image(course_id: str, data_url: str) -> str:
-    m = re.match(r"data:(image/[^;]+);base64,(.*)", data_url, re.DOTALL)
-    if not m: return ""
-    mime, b64 = m.groups()
-    ext = {"image/png":"png", "image/jpeg":"jpg", "image/jpg":"jpg", "image/gif":"gif"}.get(mime, "png")
-    upload_root = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
-    asset_dir = os.path.join(upload_root, course_id, "assets")
-    os.makedirs(asset_dir, exist_ok=True)
-    fname = f"{uuid.uuid4().hex}.{ext}"
-    path = os.path.join(asset_dir, fname)
-    with open(path, "wb") as f:
-        f.write(base64.b64decode(b64))
-    return os.path.relpath(path, upload_root).replace("\\", "/")
-
-def _process_body_html(course_id: str, html: str) -> str:
-    # wandelt data:-Bilder in Dateien um und ersetzt src
-    soup = BeautifulSoup(html or "", "html.parser")
-    changed = False
-    for img in soup.find_all("img"):
-        src = img.get("src", "")
-        if src.startswith("data:image/"):
-            rel = _save_data_image(course_id, src)
-            if rel:
-                img["src"] = f"/courses/files/{rel}"
-                changed = True
-    return str(soup) if changed else html
+    return stars.balance(user_id)
 
 def _sorted_nodes_for_course(course_id: str, *, include_unreleased_for_teacher=False):
     nodes_q = ContentNode.query.filter_by(subject_year_id=course_id)\
@@ -140,6 +103,7 @@ def manage():
                 db.session.add(Enrollment(id=gen_id(), class_id=class_id, user_id=current_user.id, role_in_class="teacher"))
 
         db.session.commit()
+        authz.invalidate(current_user.id)
         flash("Kurs angelegt.", "success")
         return redirect(url_for("courses.detail", course_id=course.id))
 
@@ -162,13 +126,10 @@ def manage():
 
 @bp.route("/<course_id>")
 @login_required
+@course_required()
 def detail(course_id):
     import os
     course = db.session.get(SubjectYear, course_id)
-    if not course: abort(404)
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first():
-            abort(403)
 
     nodes = _sorted_nodes_for_course(course.id, include_unreleased_for_teacher=(current_user.role != "student"))
 
@@ -194,30 +155,25 @@ def detail(course_id):
             "id": n.id, "kind": kind, "title": n.title or "(Ohne Titel)",
             "order_index": oi, "released": bool(getattr(n, "released", True)),
         })
+    # Hochgeladene Dokumente (Exporte stehen unten extra)
+    for d in docs:
+        if "/exports/" in (d.path or "") or (current_user.role == "student" and not d.released):
+            continue
+        items.append({
+            "id": d.id, "kind": "file", "title": d.filename,
+            "order_index": d.order_index if d.order_index is not None else 1_000_000, "released": bool(d.released),
+        })
     items.sort(key=lambda it: (it.get("order_index", 1_000_000), (it.get("title") or "").lower()))
 
     # Schüler der Klasse
     student_ids = [e.user_id for e in Enrollment.query.filter_by(class_id=course.class_id, role_in_class="student").all()]
     total_students = len(student_ids)
 
-    # Abschluss: DISTINCT Schüler je Übung (nur Klasse!)
-    ex_ids = [it["id"] for it in items if it["kind"] == "exercise"]
-    exercise_counts = {}
-    if ex_ids and student_ids:
-        rows = (db.session.query(Submission.assignment_id,
-                                 func.count(func.distinct(Submission.student_id)))
-                .filter(Submission.assignment_id.in_(ex_ids))
-                .filter(Submission.student_id.in_(student_ids))
-                .filter(Submission.status.in_(["submitted", "evaluated"]))
-                .group_by(Submission.assignment_id)
-                .all())
-        exercise_counts = {aid: cnt for (aid, cnt) in rows}
-
-    # „Erledigt“-Set für aktuellen User
+    # Abschluss je Übung (nur Klasse!) + „Erledigt“-Set – beides aus ExerciseProgress
+    exercise_counts = progress.completion_counts(course.id, student_ids)
     completed_ids = set()
     if current_user.is_authenticated and current_user.role in ("student", "admin"):
-        subs = Submission.query.filter_by(student_id=current_user.id).all()
-        completed_ids = {s.assignment_id for s in subs}
+        completed_ids = progress.completed_ids(course.id, current_user.id)
 
     return render_template(
         "courses/detail.html",
@@ -232,14 +188,9 @@ def detail(course_id):
 
 @bp.route("/<course_id>/content/<node_id>/release", methods=["POST"])
 @login_required
+@course_required(teacher=True)
 def content_release(course_id, node_id):
     course = db.session.get(SubjectYear, course_id)
-    if not course: abort(404)
-    if current_user.role not in ("teacher", "admin"): abort(403)
-    # Lehrer muss zur Klasse gehören, wenn nicht Admin
-    if current_user.role == "teacher":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id, role_in_class="teacher").first():
-            abort(403)
 
     action = (request.form.get("action") or "").strip()
     # ContentNode?
@@ -250,6 +201,8 @@ def content_release(course_id, node_id):
             return redirect(url_for("courses.detail", course_id=course_id))
         node.released = (action == "release")
         db.session.commit()
+        if node.released and node.type in ("section", "lesson"):
+            pdfs.schedule_release([node.id], owner_id=current_user.id)
         flash(("Freigegeben" if node.released else "Gesperrt") + f": {node.title}", "success")
         return redirect(url_for("courses.detail", course_id=course_id))
 
@@ -276,28 +229,34 @@ def diag(course_id):
 # ---------- JSON: Live-Status (für Schüler-Button + initialer Slide) ----------
 @bp.route("/<course_id>/live/status")
 @login_required
+@course_required()
 def live_status(course_id):
-    s = LiveSession.query.filter_by(course_id=course_id, active=True).first()
-    if not s:
-        return jsonify({"active": False})
-    # aktuellen Slide-HTML bereitstellen (Schüler brauchen Startinhalt)
-    nodes = _sorted_nodes_for_course(course_id, include_unreleased_for_teacher=True)
-    html = ""
-    if 0 <= s.current_slide < len(nodes):
-        n = nodes[s.current_slide]
-        html = (n.body_html or n.body_md or "")
-    return jsonify({"active": True, "session_id": s.id, "index": s.current_slide, "html": html})
+    """
+    Aus dem Speicher (Session-Register + Deck) mit ETag: unveränderter Stand → 304.
+    Die Kursseite bekommt Start/Ende per Socket (``live_status``); das hier ist der Fallback.
+    """
+    from ..live import presence, state as live_state
+    st = live_state.for_course(course_id)
+    if st is None:
+        resp = jsonify({"active": False})
+        resp.set_etag("off")
+    else:
+        d = live_deck.get(course_id)
+        revealed = sorted(st.revealed_ids)
+        participants = presence.count(st.id, "student")
+        resp = jsonify({"active": True, "session_id": st.id, "index": st.current_slide,
+                        "html": d.html(st.current_slide, revealed), "participants": participants})
+        # Teilnehmerzahl nicht im ETag: jedes Kommen/Gehen würde sonst alle Abfragen zu 200ern machen
+        resp.set_etag(f"{st.id}.{st.current_slide}.{d.version}.{zlib.crc32(','.join(revealed).encode())}")
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
 
 # ---------- Teacher: Live-Seite (erzeugt/holt Session + Code) ----------
 @bp.route("/<course_id>/live")
 @login_required
+@course_required(teacher=True)
 def live(course_id):
     course = db.session.get(SubjectYear, course_id)
-    if not course: abort(404)
-    if current_user.role not in ("teacher","admin"): abort(403)
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id, role_in_class="teacher").first():
-            abort(403)
 
     sess = LiveSession.query.filter_by(course_id=course.id, active=True).first()
     if not sess:
@@ -305,10 +264,15 @@ def live(course_id):
         sess = LiveSession(id=gen_id(), course_id=course.id, host_user_id=current_user.id,
                            join_code=_gen_code(), started_at=dt.utcnow(), active=True, current_slide=0, revealed_ids=[])
         db.session.add(sess); db.session.commit()
+        from ..live import notify, state as live_state
+        live_state.started(sess)
+        notify.live_changed(course.id, course.class_id, sess.id)
+    else:
+        from ..live import state as live_state
+        live_state.register(sess)
 
-    nodes = _nodes_for_course_sorted(course.id)
-    # Für die Seitenliste: reines Meta
-    slides = [{"id": n.id, "type": n.type, "title": n.title} for n in nodes]
+    # Deck einmal bauen (bzw. aus dem Cache); für die Seitenliste reines Meta
+    slides = live_deck.get(course.id).meta()
     return render_template("courses/live.html", course=course, slides=slides, session=sess)
 
 
@@ -320,9 +284,7 @@ def live_join(course_id):
     if not course: abort(404)
     if current_user.role == "teacher":
         return redirect(url_for("courses.live", course_id=course_id))
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first():
-            abort(403)
+    authz.check_course(course_id)
     sess = LiveSession.query.filter_by(course_id=course.id, active=True).first()
     if not sess:
         flash("Aktuell läuft keine Live-Session.", "info")
@@ -341,11 +303,16 @@ def live_end(course_id):
         return jsonify({"ok": True})  # schon beendet
     if current_user.id != sess.host_user_id and current_user.role != "admin":
         abort(403)
-    sess.active = False
-    sess.ended_at = dt.utcnow()
-    db.session.commit()
     from ..extensions import socketio
+    from ..live import batcher, presence, quiz, strokes, state as live_state
+    quiz.close(sess.id)  # offene Live-Abfrage noch speichern
+    presence.drop(sess.id)
+    batcher.drop(sess.id)
+    strokes.drop(sess.id)
+    live_state.end(sess.id)
     socketio.emit("ended", {}, to=f"live:{sess.id}")
+    from ..live import notify
+    notify.live_changed(course.id, course.class_id, None)
     return jsonify({"ok": True})
 
 # ---------- Join per Code ----------
@@ -358,75 +325,73 @@ def live_join_by_code():
     if not sess:
         flash("Ungültiger oder abgelaufener Code.", "warning")
         return redirect(url_for("index"))
-    course = db.session.get(SubjectYear, sess.course_id)
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first():
-            abort(403)
+    authz.check_course(sess.course_id)
     return redirect(url_for("courses.live_join", course_id=sess.course_id))
 
-# ---------- PDF Export ----------
+# ---------- PDF Export (Hintergrund-Job) ----------
+@csrf.exempt
 @bp.route("/<course_id>/live/export", methods=["POST"])
 @login_required
+@course_required(teacher=True)
 def live_export(course_id):
+    """
+    Startet den PDF-Bau im Hintergrund und antwortet sofort mit der Job-ID;
+    Fortschritt kommt als ``job_progress`` an die Socket-ID ``sid``.
+    Standard: ``{"session_id", "sid"}`` – Folien und Striche kommen vom Server (Vektor-PDF).
+    Weiterhin möglich: hochgeladene Seiten (multipart ``pages`` oder JSON ``{"images": [dataURL…]}``).
+    """
     course = db.session.get(SubjectYear, course_id)
-    if not course: abort(404)
-    # nur Lehrkraft/Admin
-    if current_user.role not in ("teacher","admin"): abort(403)
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id, role_in_class="teacher").first():
-            abort(403)
 
     data = request.get_json(silent=True) or {}
-    images = data.get("images", [])
-    if not images:
+    files = request.files.getlist("pages")
+    if not files and not data.get("images"):
+        return _live_export_vector(course, data)
+
+    token = gen_id()
+    staging = exports.staging_dir(course.id, token)
+    page_paths = []
+    if files:
+        for i, f in enumerate(files):
+            path = os.path.join(staging, f"page_{i + 1:03d}.png")
+            f.save(path)  # Werkzeug hat große Teile bereits auf Platte gespoolt
+            page_paths.append(path)
+    else:
+        for i, data_url in enumerate(data.get("images", [])):
+            path = exports.save_data_url_page(staging, i, data_url)
+            if path: page_paths.append(path)
+    if not page_paths:
+        shutil.rmtree(staging, ignore_errors=True)
         return jsonify({"ok": False, "error": "no images"}), 400
 
-    # Pfad vorbereiten
-    upload_root = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
-    rel_dir = os.path.join(str(course.id), "exports")
-    abs_dir = os.path.abspath(os.path.join(upload_root, rel_dir))
-    os.makedirs(abs_dir, exist_ok=True)
-
-    # PDF bauen
-    filename = f"live_export_{dt.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
-    abs_pdf = os.path.join(abs_dir, filename)
-
-    c = pdf_canvas.Canvas(abs_pdf, pagesize=A4)
-    pw, ph = A4
-    margin = 36  # 0.5"
-    avail_w, avail_h = pw - 2*margin, ph - 2*margin
-
-    for dataurl in images:
-        try:
-            header, b64 = dataurl.split(",", 1)
-        except ValueError:
-            continue
-        raw = base64.b64decode(b64)
-        img = Image.open(io.BytesIO(raw)).convert("RGB")
-        iw, ih = img.size
-        # fit to page
-        scale = min(avail_w/iw, avail_h/ih)
-        tw, th = iw*scale, ih*scale
-        x = (pw - tw)/2
-        y = (ph - th)/2
-        c.drawImage(ImageReader(img), x, y, tw, th)
-        c.showPage()
-    c.save()
-
-    # Document speichern
-    rel_pdf = f"{course.id}/exports/{filename}"
-    doc = Document(
-        id=gen_id(),
-        subject_year_id=course.id,  # <- WICHTIG: nicht course_id, sondern subject_year_id
-        owner_user_id=current_user.id,
-        title=f"Export {dt.datetime.utcnow().strftime('%Y-%m-%d %H:%M')}",
-        path=rel_pdf,
-        mime="application/pdf"
-    )
-    db.session.add(doc)
-    db.session.commit()
-
-    return jsonify({"ok": True, "pdf_url": f"/courses/files/{rel_pdf}"}), 200
+    job = jobs.submit(current_app._get_current_object(), "live_export", exports.build_live_pdf,
+                      course.id, current_user.id, page_paths, staging,
+                      owner_id=current_user.id, notify_sid=request.form.get("sid") or request.args.get("sid"))
+    return jsonify({"ok": True, "job_id": job.id}), 202
+
+def _live_export_vector(course, data):
+    """Schnappschuss von Deck, Lösungsstand und Strich-Log jetzt ziehen – live_end verwirft das Log danach."""
+    from ..live import strokes as live_strokes, state as live_state
+    sess_id = data.get("session_id") or request.form.get("session_id")
+    st = live_state.get(sess_id) if sess_id else None
+    if st is None:
+        sess = LiveSession.query.filter_by(course_id=course.id, active=True).first()
+        st = live_state.register(sess) if sess else None
+    if st is None or st.course_id != course.id:
+        return jsonify({"ok": False, "error": "no live session"}), 400
+
+    d = live_deck.get(course.id)
+    slides = [(s.title, d.html(i, st.revealed_ids)) for i, s in enumerate(d.slides)]
+    job = jobs.submit(current_app._get_current_object(), "live_export", exports.build_vector_pdf,
+                      course.id, current_user.id, slides, live_strokes.snapshot(st.id),
+                      owner_id=current_user.id, notify_sid=data.get("sid") or request.args.get("sid"))
+    return jsonify({"ok": True, "job_id": job.id}), 202
+
+@bp.route("/<course_id>/live/export/<job_id>")
+@login_required
+def live_export_status(course_id, job_id):
+    job = jobs.get(job_id)
+    if not job or (job.owner_id != current_user.id and current_user.role != "admin"): abort(404)
+    return jsonify(job.to_dict())
 
 
 # ---------- Inhalte anlegen ----------
@@ -459,8 +424,9 @@ def create_content(course_id):
     if ntype == "exercise":
         kind = request.form.get("kind","short_answer")
         prompt_md = request.form.get("prompt_md","")
-        db.session.add(Exercise(id=gen_id(), content_node_id=node.id, kind=kind, prompt_md=prompt_md))
+        db.session.add(Exercise(id=gen_id(), content_node_id=node.id, kind=kind, prompt_md=prompt_md, points_total=0))
     db.session.commit()
+    live_deck.structure_changed(course.id)
     flash("Inhalt angelegt.", "success")
     return redirect(url_for("courses.detail", course_id=course_id))
 
@@ -481,18 +447,17 @@ def reorder_mix(course_id):
             d = db.session.get(Document, _id)
             if d and d.subject_year_id == course_id: d.order_index = idx
     db.session.commit()
+    live_deck.structure_changed(course_id)
     return jsonify({"ok": True})
 
 # ---------- Abschnitt: Anzeigen / Edit / PDF ----------
 @bp.route("/<course_id>/section/<node_id>/view")
 @login_required
+@course_required()
 def section_view(course_id, node_id):
     n = db.session.get(ContentNode, node_id)
     if not n or n.subject_year_id != course_id or n.type not in ("section","lesson"): abort(404)
-    if current_user.role != "admin":
-        course = db.session.get(SubjectYear, course_id)
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first(): abort(403)
-    return render_template("courses/section_view.html", node=n, course_id=course_id)
+    return render_template("courses/section_view.html", node=n, course_id=course_id, html=render.section_html(n))
 
 @bp.route("/<course_id>/section/<node_id>/edit")
 @login_required
@@ -508,58 +473,64 @@ def save_section(course_id, node_id):
     n = db.session.get(ContentNode, node_id)
     if not n or n.subject_year_id != course_id or n.type not in ("section","lesson"): abort(404)
     if current_user.role not in ("teacher","admin"): abort(403)
+    old_title = n.title
     n.title = request.form.get("title", n.title).strip()
     raw_html = request.form.get("body_html", "")
-    n.body_html = _process_body_html(course_id, raw_html)
+    n.body_html = images.add_srcset(assets.process_html(course_id, raw_html, user=current_user))
+    assets.sync_refs(n.id, n.body_html)
+    render.section(n)
     db.session.commit()
+    images.schedule(assets.refs_in(n.body_html), owner_id=current_user.id)
+    if n.released:  # Inhalt geändert → neuer Schlüssel, PDF schon jetzt statt beim ersten Download
+        pdfs.schedule_release([n.id], owner_id=current_user.id)
+    # Titel bestimmt die Sortierung mit → dann ganzes Deck, sonst nur diesen Slide
+    if n.title != old_title:
+        live_deck.structure_changed(course_id)
+    else:
+        live_deck.node_saved(course_id, n.id)
     flash("Abschnitt gespeichert.", "success")
     return redirect(url_for("courses.detail", course_id=course_id))
 
 @bp.route("/<course_id>/section/<node_id>/pdf")
 @login_required
+@course_required()
 def section_pdf(course_id, node_id):
-    try:
-        from weasyprint import HTML, CSS
-    except Exception:
-        flash("PDF-Export benötigt WeasyPrint (pip install weasyprint)", "warning")
-        return redirect(url_for("courses.detail", course_id=course_id))
     n = db.session.get(ContentNode, node_id)
     if not n or n.subject_year_id != course_id or n.type not in ("section","lesson"): abort(404)
-    if current_user.role != "admin":
-        course = db.session.get(SubjectYear, course_id)
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first(): abort(403)
-
-    upload_root = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
-    soup = BeautifulSoup(n.body_html or "", "html.parser")
-    for img in soup.find_all("img"):
-        src = img.get("src","")
-        if src.startswith("/courses/files/"):
-            rel = src.replace("/courses/files/","").replace("%5C","/")
-            img["src"] = os.path.join(upload_root, rel).replace("\\","/")
-    html = render_template("courses/section_pdf.html", node=type("Obj",(),{"title":n.title, "body_html":str(soup)})())
-    pdf_io = BytesIO()
-    HTML(string=html, base_url=upload_root).write_pdf(pdf_io, stylesheets=[CSS(string="""
-        @page { size: A4; margin: 18mm; }
-        body { font-family: Arial, sans-serif; }
-        h1, h2, h3 { page-break-after: avoid; }
-        img, video { max-width: 100%; }
-    """)])
-    pdf_io.seek(0)
-    resp = make_response(pdf_io.read())
-    resp.headers.set("Content-Type", "application/pdf")
-    resp.headers.set("Content-Disposition", "attachment", filename=f"{(n.title or 'abschnitt')[:40]}.pdf")
+    try:
+        key, path = pdfs.section(n)
+    except pdfs.Unavailable as e:
+        flash(str(e), "warning")
+        return redirect(url_for("courses.detail", course_id=course_id))
+    resp = send_file(path, mimetype="application/pdf", as_attachment=True,
+                     download_name=f"{(n.title or 'abschnitt')[:40]}.pdf", etag=key, conditional=True, max_age=None)
+    resp.headers["Cache-Control"] = "private, no-cache"
     return resp
 
+@bp.route("/<course_id>/booklet", methods=["POST"])
+@login_required
+@course_required(teacher=True)
+def booklet_export(course_id):
+    """Kurs-Heft (alle freigegebenen Abschnitte/Übungen) im Hintergrund bauen."""
+    job = jobs.submit(current_app._get_current_object(), "booklet", pdfs.build_booklet, course_id, current_user.id,
+                      owner_id=current_user.id, notify_sid=request.form.get("sid") or request.args.get("sid"))
+    return jsonify({"ok": True, "job_id": job.id}), 202
+
+@bp.route("/<course_id>/booklet/<job_id>")
+@login_required
+def booklet_status(course_id, job_id):
+    job = jobs.get(job_id)
+    if not job or (job.owner_id != current_user.id and current_user.role != "admin"): abort(404)
+    return jsonify(job.to_dict())
+
 # ---------- Übungen ----------
 @bp.route("/<course_id>/exercise/<node_id>", methods=["GET", "POST"])
 @login_required
+@course_required()
 def exercise_view(course_id, node_id):
     node = db.session.get(ContentNode, node_id)
     if not node or node.subject_year_id != course_id or node.type != "exercise": abort(404)
     course = db.session.get(SubjectYear, course_id)
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first():
-            abort(403)
 
     ex = Exercise.query.filter_by(content_node_id=node.id).first()
     items = (ExerciseItem.query.filter_by(exercise_id=ex.id)
@@ -570,28 +541,13 @@ def exercise_view(course_id, node_id):
     if request.method == "POST":
         if current_user.role not in ("student","admin"): abort(403)
         answers = {}
-        score = 0
-        total = ex.total_points()
-
         for it in items:
-            if it.type == "content":
-                continue
             if it.type == "text":
-                key = f"text_{it.id}"
-                ans = (request.form.get(key) or "").strip()
-                answers[it.id] = {"type": "text", "text": ans}
-                # auto-gleichheit, optional
-                if it.correct and isinstance(it.correct, dict) and "equals" in it.correct:
-                    if ans.strip().lower() == (it.correct["equals"] or "").strip().lower():
-                        score += (it.points or 0)
+                answers[it.id] = {"type": "text", "text": (request.form.get(f"text_{it.id}") or "").strip()}
             elif it.type == "mc":
-                key = f"mc_{it.id}[]"
-                vals = request.form.getlist(key)
-                selected = sorted([v.upper() for v in vals])
-                answers[it.id] = {"type": "mc", "choices": selected}
-                correct = sorted((it.correct or []))
-                if selected == correct:
-                    score += (it.points or 0)
+                answers[it.id] = {"type": "mc", "choices": sorted(v.upper() for v in request.form.getlist(f"mc_{it.id}[]"))}
+        # Bewertung über den (pro Übungs-Version gecachten) Grader
+        score = grading.get(ex).score(answers)
 
         if not sub:
             sub = Submission(id=gen_id(), assignment_id=node.id, student_id=current_user.id,
@@ -602,13 +558,14 @@ def exercise_view(course_id, node_id):
             sub.score = score
             sub.attempts_count = (sub.attempts_count or 0) + 1
             sub.status = "submitted"
+        progress.mark_completed(course_id, node.id, [current_user.id])
         db.session.commit()
 
         # Sterne für Abgabe (einmalig)
         already = StarTransaction.query.filter_by(user_id=current_user.id, assignment_id=node.id, reason="submission").first()
         if not already:
-            st = StarTransaction(id=gen_id(), user_id=current_user.id, assignment_id=node.id, amount=1, reason="submission")
-            db.session.add(st); db.session.commit()
+            stars.add(current_user.id, 1, "submission", assignment_id=node.id)
+            db.session.commit()
 
         flash("Abgabe gespeichert.", "success")
         return redirect(url_for("courses.detail", course_id=course_id))
@@ -626,13 +583,11 @@ def exercise_view(course_id, node_id):
 
 @bp.route("/<course_id>/exercise/<node_id>/submit", methods=["POST"])
 @login_required
+@course_required()
 def exercise_submit(course_id, node_id):
     n = db.session.get(ContentNode, node_id)
     if not n or n.subject_year_id != course_id or n.type != "exercise": abort(404)
-    course = db.session.get(SubjectYear, course_id)
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first(): abort(403)
-    db.session.add(StarTransaction(id=gen_id(), user_id=current_user.id, assignment_id=None, amount=1, reason="submission", created_by=None))
+    stars.add(current_user.id, 1, "submission")
     db.session.commit()
     flash("Abgabe gespeichert. +1 Stern", "success")
     return redirect(url_for("courses.detail", course_id=course_id))
@@ -646,7 +601,7 @@ def exercise_edit(course_id, node_id):
 
     ex = Exercise.query.filter_by(content_node_id=node.id).first()
     if not ex:
-        ex = Exercise(id=gen_id(), content_node_id=node.id, kind="rich", is_live_only=False)
+        ex = Exercise(id=gen_id(), content_node_id=node.id, kind="rich", is_live_only=False, points_total=0)
         db.session.add(ex); db.session.commit()
 
     if request.method == "POST":
@@ -669,11 +624,15 @@ def exercise_save(course_id, node_id):
     if current_user.role not in ("teacher","admin"): abort(403)
     ex = Exercise.query.filter_by(content_node_id=n.id).first()
     if not ex:
-        ex = Exercise(id=gen_id(), content_node_id=n.id, kind="rich")
+        ex = Exercise(id=gen_id(), content_node_id=n.id, kind="rich", points_total=0)
         db.session.add(ex)
-    ex.prompt_html = request.form.get("prompt_html", "")
-    ex.solution_html = request.form.get("solution_html", "")
+    ex.prompt_html = images.add_srcset(assets.process_html(course_id, request.form.get("prompt_html", ""), user=current_user))
+    ex.solution_html = images.add_srcset(assets.process_html(course_id, request.form.get("solution_html", ""), user=current_user))
+    assets.sync_refs(n.id, ex.prompt_html + ex.solution_html)
+    render.exercise(n.id, ex)
     db.session.commit()
+    images.schedule(assets.refs_in(ex.prompt_html + ex.solution_html), owner_id=current_user.id)
+    live_deck.node_saved(course_id, n.id)
     flash("Übung gespeichert.", "success")
     return redirect(url_for("courses.detail", course_id=course_id))
 
@@ -774,7 +733,9 @@ def exercise_item_add(course_id, node_id):
         points=(0 if itype == "content" else points),
         order_index=idx
     )
-    db.session.add(item); db.session.commit()
+    db.session.add(item)
+    ex.items_changed()
+    db.session.commit()
     flash("Aufgabe/Block hinzugefügt.", "success")
     return redirect(url_for("courses.exercise_edit", course_id=course_id, node_id=node_id))
 
@@ -801,8 +762,12 @@ def exercise_item_update(course_id, node_id, item_id):
         correct_ids = set(request.form.getlist("correct[]"))
         item.correct = [c.upper() for c in correct_ids if len(c)==1 and c.isalpha()]
 
+    ex = db.session.get(Exercise, item.exercise_id)
+    if ex: ex.items_changed()
     db.session.commit()
-    flash("Aufgabe aktualisiert.", "success")
+    # Lösungsschlüssel/Punkte evtl. geändert → vorhandene Abgaben neu bewerten
+    regraded = grading.regrade(ex) if ex else 0
+    flash("Aufgabe aktualisiert." + (f" {regraded} Abgabe(n) neu bewertet." if regraded else ""), "success")
     return redirect(url_for("courses.exercise_edit", course_id=course_id, node_id=node_id))
 
 @bp.route("/<course_id>/exercise/<node_id>/item/<item_id>/delete", methods=["POST"])
@@ -813,37 +778,92 @@ def exercise_item_delete(course_id, node_id, item_id):
     node = db.session.get(ContentNode, node_id)
     if not node or node.subject_year_id != course_id: abort(404)
     if current_user.role not in ("teacher","admin"): abort(403)
-    db.session.delete(item); db.session.commit()
-    flash("Aufgabe gelöscht.", "info")
+    ex = db.session.get(Exercise, item.exercise_id)
+    db.session.delete(item)
+    if ex: ex.items_changed()
+    db.session.commit()
+    regraded = grading.regrade(ex) if ex else 0
+    flash("Aufgabe gelöscht." + (f" {regraded} Abgabe(n) neu bewertet." if regraded else ""), "info")
     return redirect(url_for("courses.exercise_edit", course_id=course_id, node_id=node_id))
 
 
+# ---------- Dokument-Uploads (in Teilen, fortsetzbar) ----------
+def _upload_or_404(course_id, upload_id):
+    up = db.session.get(UploadSession, upload_id)
+    if not up or up.subject_year_id != course_id: abort(404)
+    if up.user_id != current_user.id and current_user.role != "admin": abort(404)
+    return up
+
+def _upload_state(up):
+    return {"ok": True, "upload_id": up.id, "offset": up.offset, "size": up.size, "chunk_size": uploads.chunk_max()}
+
+def _rejected(e):
+    return jsonify({"ok": False, "error": str(e), **e.extra}), e.status
+
+@bp.route("/<course_id>/uploads", methods=["GET", "POST"])
+@login_required
+@course_required(teacher=True)
+def upload_start(course_id):
+    if request.method == "GET":
+        return jsonify(uploads.quota(course_id))
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get("size") or 0)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Größe fehlt"}), 400
+    try:
+        up = uploads.start(course_id, current_user.id, data.get("filename") or "", size, data.get("sha256"))
+    except uploads.Rejected as e:
+        return _rejected(e)
+    return jsonify(_upload_state(up)), 201
+
+@bp.route("/<course_id>/uploads/<upload_id>", methods=["GET", "PATCH", "DELETE"])
+@login_required
+@course_required(teacher=True)
+def upload_chunk(course_id, upload_id):
+    up = _upload_or_404(course_id, upload_id)
+    if request.method == "GET":
+        return jsonify(_upload_state(up))
+    if request.method == "DELETE":
+        uploads.cancel(up)
+        return jsonify({"ok": True})
+
+    # Rumpf nie als Formular auswerten – direkt vom Stream auf die Platte
+    length = request.content_length
+    if length is None:
+        return jsonify({"ok": False, "error": "Content-Length fehlt"}), 411
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"ok": False, "error": "Upload-Offset fehlt", "offset": up.offset}), 400
+    try:
+        doc = uploads.append(up, offset, request.stream, length)
+    except uploads.Rejected as e:
+        return _rejected(e)
+    if doc is None:
+        return jsonify(_upload_state(up))
+    return jsonify({"ok": True, "done": True, "document_id": doc.id, "filename": doc.filename,
+                    "url": f"/courses/files/{doc.path}", "sha256": doc.sha256}), 201
+
+
 # ---------- Dateien & Assets SERVEN (fix für Bilder aus dem Editor) ----------
 @bp.route("/files/<path:relpath>")
 @login_required
 def serve_file(relpath):
-    upload_root = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
     safe_rel = os.path.normpath(relpath).replace("\\", "/")
-    if safe_rel.startswith("../") or safe_rel.startswith("/"):
+    if safe_rel.startswith("../") or safe_rel.startswith("/") or safe_rel == "..":
         abort(400)
     parts = safe_rel.split("/", 1)
-    course_id = parts[0] if parts else None
-    course = db.session.get(SubjectYear, course_id) if course_id else None
-    if not course: abort(404)
-    if current_user.role != "admin":
-        if not Enrollment.query.filter_by(class_id=course.class_id, user_id=current_user.id).first():
-            abort(403)
-    abs_path = os.path.abspath(os.path.join(upload_root, safe_rel))
-    if not abs_path.startswith(os.path.abspath(upload_root)):
-        abort(403)
-    if os.path.exists(abs_path) and os.path.isfile(abs_path):
-        return send_from_directory(os.path.dirname(abs_path), os.path.basename(abs_path), as_attachment=False)
+    authz.check_course(parts[0] if parts else None)
+    resp = files.send_upload(safe_rel)
+    if resp is not None:
+        return resp
     from ..models import Document
     doc = Document.query.filter_by(path=safe_rel).first()
     if doc:
-        abs_path = os.path.abspath(os.path.join(upload_root, doc.path.replace("\\","/")))
-        if os.path.exists(abs_path):
-            return send_from_directory(os.path.dirname(abs_path), os.path.basename(abs_path), as_attachment=False)
+        resp = files.send_upload(os.path.normpath(doc.path.replace("\\", "/")))
+        if resp is not None:
+            return resp
     abort(404)
 
 # ---------- Freigeben/Sperren ----------
@@ -870,46 +890,3 @@ def toggle_release(course_id, node_id):
     db.session.commit()
     flash(("Freigegeben" if action == "release" else "Gesperrt") + f": {n.title}", "success")
     return redirect(url_for("courses.detail", course_id=course_id))
-
-# ---------- Live-Export (Canvas → PDF/PNG) ----------
-@csrf.exempt
-@bp.route("/<course_id>/live/export", methods=["POST"], endpoint="live_export_pdf")
-@login_required
-def live_export(course_id):
-    course = db.session.get(SubjectYear, course_id)
-    if not course: abort(404)
-    if current_user.role not in ("teacher","admin"): abort(403)
-    data = request.get_json(silent=True) or {}
-    images = data.get("images", [])
-    if not images:
-        return jsonify({"ok": False, "error": "no images"}), 400
-    upload_root = current_app.config.get("UPLOAD_FOLDER", os.path.join(current_app.root_path, "uploads"))
-    export_dir = os.path.join(upload_root, course.id, "exports")
-    os.makedirs(export_dir, exist_ok=True)
-    saved_pngs = []
-    for i, data_url in enumerate(images):
-        m = re.match(r"data:image/[^;]+;base64,(.*)", data_url)
-        if not m: continue
-        img_bytes = base64.b64decode(m.group(1))
-        fname = f"live_page_{i+1:03d}.png"
-        fpath = os.path.join(export_dir, fname)
-        with open(fpath, "wb") as f:
-            f.write(img_bytes)
-        saved_pngs.append(fpath)
-    pdf_rel = None
-    try:
-        from PIL import Image
-        pdf_name = f"live_{dt.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_path = os.path.join(export_dir, pdf_name)
-        imgs = [Image.open(p).convert("RGB") for p in saved_pngs]
-        if imgs:
-            first, rest = imgs[0], imgs[1:]
-            first.save(pdf_path, save_all=True, append_images=rest)
-            pdf_rel = os.path.relpath(pdf_path, upload_root).replace("\\", "/")
-    except Exception as e:
-        current_app.logger.warning("Live-Export PDF: Pillow nicht verfügbar oder Fehler: %s", e)
-    if pdf_rel:
-        return jsonify({"ok": True, "pdf_url": f"/courses/files/{pdf_rel}"})
-    else:
-        rels = [os.path.relpath(p, upload_root).replace("\\", "/") for p in saved_pngs]
-        return jsonify({"ok": True, "images": [f"/courses/files/{r}" for r in rels]})
@@ -0,0 +1,262 @@
+"""
+Dokument-Uploads in Teilen (fortsetzbar), z. B. Videos oder gescannte PDFs.
+
+Ablauf (JSON, siehe Routen in ``routes.py``)::
+
+    POST   /courses/<kurs>/uploads           {"filename", "size", "sha256"?} → upload_id, offset
+    PATCH  /courses/<kurs>/uploads/<id>      Header Upload-Offset, Rumpf = rohe Bytes
+    GET    /courses/<kurs>/uploads/<id>      aktueller offset (nach Abbruch weitermachen)
+    DELETE /courses/<kurs>/uploads/<id>      abbrechen
+
+Der Rumpf eines Teils wird blockweise von ``request.stream`` gelesen, direkt
+in ``UPLOAD_FOLDER/_partial/<id>.part`` geschrieben und dabei SHA-256-
+gehasht – keine Formular-Auswertung, Speicherbedarf unabhängig von der
+Dateigröße. Bricht ein Teil ab, zählt, was angekommen ist; der Client fragt
+den offset ab und schickt den Rest. Maßgeblich ist der offset in der DB:
+geschrieben wird nur unter Sperre (Thread-Lock + ``flock`` auf die
+Teildatei) und nachdem der offset dort erneut gelesen wurde; die Datei wird
+nie gekürzt. Der Hash-Zustand liegt pro Prozess im Speicher; landet ein Teil
+in einem anderen Worker (oder nach Neustart), wird er einmal aus der
+Teildatei nachgerechnet.
+
+Die angekündigte Größe wird beim Start gegen ``UPLOAD_MAX_MB`` und das
+Kurs-Kontingent ``COURSE_QUOTA_MB`` (fertige Dokumente + offene Uploads)
+geprüft. Mit dem letzten Byte wird die Datei nach
+``<kurs>/docs/<hex>.<ext>`` verschoben und das ``Document`` am Kursende
+angelegt. Liegen gebliebene Uploads: ``flask uploads-gc``.
+"""
+import fcntl
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+import uuid
+from datetime import datetime as dt, timedelta
+
+from flask import current_app
+from sqlalchemy import func, update
+from sqlalchemy.exc import InvalidRequestError
+from werkzeug.exceptions import ClientDisconnected
+
+from . import exports, files
+from ..extensions import db
+from ..models import Document, UploadSession, gen_id
+
+ALLOWED_DOC_EXTS = {"pdf","png","jpg","jpeg","doc","docx","ppt","pptx","xls","xlsx","txt","mp4","webm","mp3"}
+PARTIAL_DIR = "_partial"
+DOC_DIR = "docs"
+BLOCK = 256 * 1024
+STALE_HOURS = 24
+
+_lock = threading.Lock()
+_hashers: dict = {}   # upload_id -> (offset, sha256-Objekt)
+_upload_locks: dict = {}
+
+
+class Rejected(ValueError):
+    """Upload abgelehnt; ``status`` = HTTP-Status für die Antwort."""
+
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def _mb(key: str, default: int) -> int:
+    return int(current_app.config.get(key, default)) * 1024 * 1024
+
+
+def chunk_max() -> int:
+    return _mb("UPLOAD_CHUNK_MAX_MB", 8)
+
+
+def part_path(upload_id: str) -> str:
+    return os.path.join(files.upload_root(), PARTIAL_DIR, f"{upload_id}.part")
+
+
+def usage(course_id: str) -> int:
+    """Belegte Bytes: fertige Dokumente + reservierte Größe offener Uploads."""
+    docs = db.session.query(func.coalesce(func.sum(Document.size), 0)).filter_by(subject_year_id=course_id).scalar()
+    open_ = db.session.query(func.coalesce(func.sum(UploadSession.size), 0)).filter_by(subject_year_id=course_id).scalar()
+    return int(docs) + int(open_)
+
+
+def quota(course_id: str) -> dict:
+    return {"used": usage(course_id), "quota": _mb("COURSE_QUOTA_MB", 5120)}
+
+
+def start(course_id: str, user_id: str, filename: str, size: int, sha256: str | None = None) -> UploadSession:
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    if not name or ext not in ALLOWED_DOC_EXTS:
+        raise Rejected("Dateityp nicht erlaubt", 415)
+    if size <= 0:
+        raise Rejected("Leere Datei")
+    if size > _mb("UPLOAD_MAX_MB", 2048):
+        raise Rejected("Datei zu groß", 413)
+    q = quota(course_id)
+    if q["used"] + size > q["quota"]:
+        raise Rejected("Speicherkontingent des Kurses erschöpft", 413, **q)
+    if sha256 and (len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256.lower())):
+        raise Rejected("Ungültige Prüfsumme")
+
+    up = UploadSession(id=gen_id(), subject_year_id=course_id, user_id=user_id, filename=name[:200],
+                       size=size, offset=0, sha256=sha256.lower() if sha256 else None)
+    os.makedirs(os.path.dirname(part_path(up.id)), exist_ok=True)
+    open(part_path(up.id), "wb").close()
+    db.session.add(up)
+    db.session.commit()
+    return up
+
+
+def _upload_lock(upload_id: str) -> threading.Lock:
+    with _lock:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _forget(upload_id: str) -> None:
+    with _lock:
+        _hashers.pop(upload_id, None)
+        _upload_locks.pop(upload_id, None)
+
+
+def _hasher(up: UploadSession):
+    """Hash-Zustand bis ``up.offset`` – aus dem Speicher oder aus der Teildatei nachgerechnet."""
+    cached = _hashers.get(up.id)
+    if cached and cached[0] == up.offset:
+        return cached[1]
+    h, left = hashlib.sha256(), up.offset
+    with open(part_path(up.id), "rb") as f:
+        while left:
+            block = f.read(min(BLOCK, left))
+            if not block:
+                # Datei kürzer als der gebuchte Stand (z. B. Plattenfehler): Stand auf die Datei
+                # zurücksetzen, damit der Client von dort weitermachen kann
+                have = up.offset - left
+                db.session.execute(update(UploadSession).where(UploadSession.id == up.id)
+                                   .values(offset=have).execution_options(synchronize_session=False))
+                db.session.commit()
+                raise Rejected("Teildatei unvollständig", 409, offset=have)
+            h.update(block)
+            left -= len(block)
+    return h
+
+
+def _flock(f) -> None:
+    """Exklusive Sperre auf die Teildatei über Prozesse hinweg (ohne den Eventlet-Hub zu blockieren)."""
+    while True:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(0.05)
+
+
+def append(up: UploadSession, offset: int, stream, length: int) -> Document | None:
+    """
+    Bis zu ``length`` Bytes aus ``stream`` ab ``offset`` anhängen. Liefert das
+    ``Document``, wenn die Datei damit vollständig ist, sonst None (neuer
+    Stand in ``up.offset``).
+    """
+    if length > chunk_max():
+        raise Rejected("Teil zu groß", 413, chunk_size=chunk_max())
+
+    with _upload_lock(up.id):
+        try:
+            f = open(part_path(up.id), "r+b")
+        except FileNotFoundError:
+            raise Rejected("Upload nicht mehr vorhanden", 404)
+        with f:
+            _flock(f)
+            # Stand erst unter der Sperre lesen – ``up`` kann von vor einem parallelen Teil stammen
+            db.session.commit()
+            try:
+                db.session.refresh(up)
+            except InvalidRequestError:  # Zeile inzwischen gelöscht (abgebrochen/fertig)
+                raise Rejected("Upload nicht mehr vorhanden", 404)
+            if offset != up.offset:
+                raise Rejected("Falscher Offset", 409, offset=up.offset)
+            if offset + length > up.size:
+                raise Rejected("Mehr Daten als angekündigt", 400, offset=up.offset)
+
+            h = _hasher(up)
+            written = 0
+            f.seek(offset)
+            while written < length:
+                try:
+                    block = stream.read(min(BLOCK, length - written))
+                except ClientDisconnected:
+                    block = b""
+                if not block:
+                    break  # Verbindung abgebrochen – was da ist, zählt
+                f.write(block)
+                h.update(block)
+                written += len(block)
+            f.flush()
+
+            res = db.session.execute(update(UploadSession)
+                                     .where(UploadSession.id == up.id, UploadSession.offset == offset)
+                                     .values(offset=offset + written, updated_at=dt.utcnow())
+                                     .execution_options(synchronize_session=False))
+            db.session.commit()
+            db.session.refresh(up)
+            if res.rowcount != 1:
+                _hashers.pop(up.id, None)
+                raise Rejected("Falscher Offset", 409, offset=up.offset)
+            _hashers[up.id] = (up.offset, h)
+
+    return _finish(up, h.hexdigest()) if up.offset == up.size else None
+
+
+def _finish(up: UploadSession, digest: str) -> Document:
+    if up.sha256 and up.sha256 != digest:
+        cancel(up)
+        raise Rejected("Prüfsumme stimmt nicht – Upload verworfen", 422, sha256=digest)
+    ext = up.filename.rsplit(".", 1)[-1].lower()
+    rel = f"{up.subject_year_id}/{DOC_DIR}/{uuid.uuid4().hex}.{ext}"
+    abs_path = os.path.join(files.upload_root(), rel)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    os.replace(part_path(up.id), abs_path)
+    doc = Document(id=gen_id(), subject_year_id=up.subject_year_id, filename=up.filename, path=rel,
+                   mime_type=mimetypes.guess_type(up.filename)[0] or "application/octet-stream",
+                   uploaded_by=up.user_id, order_index=exports.next_order_index(up.subject_year_id),
+                   size=up.size, sha256=digest)
+    db.session.add(doc)
+    db.session.delete(up)
+    db.session.commit()
+    _forget(up.id)
+    return doc
+
+
+def cancel(up: UploadSession) -> None:
+    try:
+        os.remove(part_path(up.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(up)
+    db.session.commit()
+    _forget(up.id)
+
+
+# ---------- Wartung ----------
+def gc(stale_hours: float = STALE_HOURS, dry_run: bool = False) -> dict:
+    """Uploads ohne Fortschritt seit ``stale_hours`` sowie Teildateien ohne Zeile löschen."""
+    cutoff = dt.utcnow() - timedelta(hours=stale_hours)
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    freed = sum(up.offset or 0 for up in stale)
+    if not dry_run:
+        for up in stale:
+            cancel(up)
+    known = {uid for (uid,) in db.session.query(UploadSession.id)}
+    orphans, cutoff_ts = 0, time.time() - stale_hours * 3600
+    root = os.path.join(files.upload_root(), PARTIAL_DIR)
+    for name in os.listdir(root) if os.path.isdir(root) else ():
+        path = os.path.join(root, name)
+        if name.rsplit(".", 1)[0] in known or os.stat(path).st_mtime >= cutoff_ts:
+            continue
+        orphans += 1
+        freed += os.stat(path).st_size
+        if not dry_run:
+            os.remove(path)
+    return {"uploads": len(stale), "orphans": orphans, "bytes": freed}
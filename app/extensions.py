@@ -10,4 +10,5 @@ login_manager = LoginManager()
 csrf = CSRFProtect()
 
 # Wichtig: kein "*" bei CORS, wenn Cookies/Sessions genutzt werden (gleiches Origin → ok)
-socketio = SocketIO(async_mode="threading", cors_allowed_origins=None, logger=False, engineio_logger=False)
+# async_mode kommt aus der Config (SOCKETIO_ASYNC_MODE): threading im DEV, eventlet im live_gateway.py
+socketio = SocketIO(cors_allowed_origins=None, logger=False, engineio_logger=False)
@@ -0,0 +1,192 @@
+"""
+Strich-Batcher für Live-Räume.
+
+Statt jedes Liniensegment einzeln zu emitten, werden Segmente pro Raum (und
+Absender) gepuffert und mit festem Takt (~30 Hz) als ein gepackter Binärframe
+an den Raum geschickt.
+
+Frame-Format (little endian):
+    Header:  u8 version | u16 slide | u16 anzahl
+    Segment: i16 x0 | i16 y0 | i16 x1 | i16 y1 | u8 breite | 3 Byte RGB
+Koordinaten und Breite sind auf 1/4 Pixel quantisiert.
+
+Reihenfolge: ``barrier(fn)`` sendet alle gepufferten Segmente und führt danach
+``fn`` unter demselben Lock aus – ``clear``/``slide_change`` kommen damit beim
+Client garantiert nach den Strichen, die vorher gezeichnet wurden.
+"""
+import struct
+import threading
+
+from ..extensions import socketio
+
+TICK_HZ = 30
+FRAME_VERSION = 1
+QUANT = 4                 # 1/4 Pixel
+MAX_SEGMENTS = 4096       # Frame früher abschicken, wenn der Puffer so voll ist
+DEFAULT_COLOR = b"\xff\x00\x00"
+
+_HEADER = struct.Struct("<BHH")
+_SEGMENT = struct.Struct("<hhhhB3s")
+
+
+def _q(v) -> int:
+    try:
+        i = int(round(float(v) * QUANT))
+    except (TypeError, ValueError):
+        return 0
+    return max(-32768, min(32767, i))
+
+
+def _q_width(w) -> int:
+    try:
+        i = int(round(float(w) * QUANT))
+    except (TypeError, ValueError):
+        i = 2 * QUANT
+    return max(1, min(255, i))
+
+
+def parse_color(c) -> bytes:
+    """'#rrggbb' / '#rgb' → 3 Byte RGB, sonst Standardfarbe."""
+    s = (c or "").strip().lstrip("#")
+    if len(s) == 3:
+        s = "".join(ch * 2 for ch in s)
+    try:
+        return bytes.fromhex(s) if len(s) == 6 else DEFAULT_COLOR
+    except ValueError:
+        return DEFAULT_COLOR
+
+
+def segments_from_event(data: dict):
+    """
+    Liefert (slide, [(x0, y0, x1, y1, w, rgb), ...]) aus einem draw-Event.
+    Akzeptiert das alte Einzelsegment-Format (x0..y1) und das gebündelte
+    Format ``segs: [x0, y0, x1, y1, x0, y0, ...]`` mit gemeinsamem w/c.
+    """
+    slide = int(data.get("slide", 0) or 0)
+    w = data.get("w", 2)
+    rgb = parse_color(data.get("c"))
+    flat = data.get("segs")
+    if isinstance(flat, list):
+        n = len(flat) - len(flat) % 4
+        segs = [(flat[i], flat[i + 1], flat[i + 2], flat[i + 3], w, rgb) for i in range(0, n, 4)]
+    else:
+        segs = [(data.get("x0", 0), data.get("y0", 0), data.get("x1", 0), data.get("y1", 0), w, rgb)]
+    return slide, segs
+
+
+def viewport_from_event(data: dict):
+    """Größe der Zeichenfläche beim Absender (vw/vh), falls mitgeschickt."""
+    try:
+        vw, vh = float(data.get("vw") or 0), float(data.get("vh") or 0)
+    except (TypeError, ValueError):
+        return None
+    return (vw, vh) if vw > 0 and vh > 0 else None
+
+
+def pack_frames(slide: int, segments) -> list:
+    """Segmente als eine Folge von draw_batch-Frames (je höchstens MAX_SEGMENTS)."""
+    frames = []
+    for i in range(0, len(segments), MAX_SEGMENTS):
+        chunk = segments[i:i + MAX_SEGMENTS]
+        body = b"".join(_SEGMENT.pack(_q(x0), _q(y0), _q(x1), _q(y1), _q_width(w), rgb)
+                        for x0, y0, x1, y1, w, rgb in chunk)
+        frames.append(_HEADER.pack(FRAME_VERSION, slide & 0xFFFF, len(chunk)) + body)
+    return frames
+
+
+class RoomBatcher:
+    """Puffer eines Live-Raums; ein Teilpuffer je Absender (der Absender bekommt seine Striche nicht zurück)."""
+
+    def __init__(self, room: str):
+        self.room = room
+        self.lock = threading.Lock()
+        self._pending = {}  # sender_sid -> [slide, bytearray, count]
+
+    def add(self, sender: str, slide: int, segments) -> None:
+        with self.lock:
+            buf = self._pending.get(sender)
+            if buf and buf[0] != slide:
+                # anderer Slide → alten Frame zuerst raus, sonst vermischt sich die Reihenfolge
+                self._emit(sender, self._pending.pop(sender))
+                buf = None
+            if buf is None:
+                buf = self._pending[sender] = [slide, bytearray(), 0]
+            for x0, y0, x1, y1, w, rgb in segments:
+                buf[1] += _SEGMENT.pack(_q(x0), _q(y0), _q(x1), _q(y1), _q_width(w), rgb)
+                buf[2] += 1
+                if buf[2] >= MAX_SEGMENTS:
+                    self._emit(sender, self._pending.pop(sender))
+                    buf = self._pending[sender] = [slide, bytearray(), 0]
+            if buf[2] == 0:
+                self._pending.pop(sender, None)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with self.lock:
+            self._flush_locked()
+
+    def barrier(self, fn=None):
+        """Alles Gepufferte senden, dann ``fn`` ausführen – atomar gegenüber dem Tick."""
+        with self.lock:
+            self._flush_locked()
+            return fn() if fn else None
+
+    def _flush_locked(self) -> None:
+        pending, self._pending = self._pending, {}
+        for sender, buf in pending.items():
+            self._emit(sender, buf)
+
+    def _emit(self, sender: str, buf) -> None:
+        slide, body, count = buf
+        if not count:
+            return
+        frame = _HEADER.pack(FRAME_VERSION, slide & 0xFFFF, count) + bytes(body)
+        socketio.emit("draw_batch", frame, to=self.room, skip_sid=sender)
+
+
+# ---------- Registry + Tick ----------
+_rooms = {}
+_rooms_lock = threading.Lock()
+_ticker_started = False
+
+
+def _tick_loop():
+    interval = 1.0 / TICK_HZ
+    while True:
+        socketio.sleep(interval)
+        for b in list(_rooms.values()):
+            try:
+                b.flush()
+            except Exception:  # ein kaputter Raum darf den Tick nicht stoppen
+                pass
+
+
+def get(session_id: str, room: str) -> RoomBatcher:
+    global _ticker_started
+    b = _rooms.get(session_id)
+    if b is not None:
+        return b
+    with _rooms_lock:
+        b = _rooms.get(session_id)
+        if b is None:
+            b = _rooms[session_id] = RoomBatcher(room)
+        if not _ticker_started:
+            _ticker_started = True
+            socketio.start_background_task(_tick_loop)
+    return b
+
+
+def barrier(session_id: str, fn=None):
+    """Flush des Raums (falls vorhanden), dann ``fn``."""
+    b = _rooms.get(session_id)
+    if b is None:
+        return fn() if fn else None
+    return b.barrier(fn)
+
+
+def drop(session_id: str) -> None:
+    with _rooms_lock:
+        b = _rooms.pop(session_id, None)
+    if b is not None:
+        b.flush()
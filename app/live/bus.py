@@ -0,0 +1,296 @@
+"""
+Nachrichtenbus für Live-Räume über mehrere Worker-Prozesse.
+
+``LIVE_BUS`` (Config/.env) wählt das Backend:
+    ""                        – ein Prozess, kein Bus (Standard, DEV)
+    "inprocess"               – Bus im Prozess (gleiches Verhalten wie mit mehreren
+                                Workern, aber ohne IPC; für Tests)
+    "ipc:///pfad/efe.sock"    – lokale Worker auf einer Maschine über einen
+                                Unix-Socket. Hub ist, wer die ``flock``-Sperre auf
+                                ``<pfad>.lock`` hält (nur er darf den Socket
+                                löschen/binden), die anderen verbinden sich; stirbt
+                                der Hub, gibt das OS die Sperre frei und einer der
+                                übrigen übernimmt. Der Socket ist nur für den
+                                Dienstnutzer (0600); die Verbindung authentifiziert
+                                ``LIVE_BUS_KEY`` (sonst ``SECRET_KEY``) – mit dem
+                                Standard-Schlüssel "dev" startet der Bus nicht, denn
+                                die Pakete sind pickle.
+    "redis://host:6379/0"     – mehrere Maschinen (benötigt das Paket ``redis``)
+
+Über den Bus laufen zwei Kanäle:
+  * ``efe-socketio``: Socket.IO-Emits (``BusManager``), damit ``_room(session_id)``
+    Clients auf allen Workern erreicht.
+  * ``efe-live``: Zustandsänderungen (Slide, Lösungen, Ende, Deck-Version,
+    Strich-Log), damit jeder Worker seine prozesslokalen Caches nachführt.
+
+Sticky Routing: Nur ``/socket.io/`` muss sticky sein (Long-Polling-Requests
+einer Verbindung müssen beim selben Worker landen), z. B. nginx::
+
+    upstream efe_live { ip_hash; server 127.0.0.1:8081; server 127.0.0.1:8082; }
+    location /socket.io/ {
+        proxy_pass http://efe_live;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+    }
+
+Alle übrigen HTTP-Routen lesen aus der DB bzw. aus Caches, die über den Bus
+invalidiert werden, und können normal (round robin) verteilt werden.
+"""
+import abc
+import fcntl
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+
+import socketio as sio
+
+SOCKETIO_CHANNEL = "efe-socketio"
+LIVE_CHANNEL = "efe-live"
+
+ORIGIN = uuid.uuid4().hex  # Kennung dieses Prozesses
+
+_bus = None
+_app = None
+_handlers = {}
+
+
+# ---------- Backends ----------
+class MessageBus(abc.ABC):
+    """Minimaler Pub/Sub: ``publish`` erreicht alle Abonnenten aller Prozesse (auch den eigenen)."""
+
+    def __init__(self):
+        self._subs = {}
+        self._subs_lock = threading.Lock()
+
+    def subscribe(self, channel: str, callback) -> None:
+        with self._subs_lock:
+            self._subs.setdefault(channel, []).append(callback)
+
+    @abc.abstractmethod
+    def publish(self, channel: str, message) -> None:
+        """An alle Abonnenten von ``channel`` in allen Prozessen zustellen."""
+
+    def start(self) -> None:
+        pass
+
+    def _deliver(self, channel: str, message) -> None:
+        for cb in list(self._subs.get(channel, ())):
+            try:
+                cb(message)
+            except Exception:
+                if _app is not None:
+                    _app.logger.exception("Live-Bus: Handler für %s fehlgeschlagen", channel)
+
+
+class InProcessBus(MessageBus):
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+
+
+class LocalIPCBus(MessageBus):
+    """Hub/Client über einen Unix-Socket (multiprocessing.connection, authentifiziert)."""
+
+    RETRY = 0.5
+
+    def __init__(self, address: str, authkey: bytes):
+        super().__init__()
+        self.address = address
+        self.authkey = authkey
+        self._peers = []            # nur im Hub
+        self._peers_lock = threading.Lock()
+        self._conn = None           # nur im Client
+        self._send_lock = threading.Lock()
+        self._lock_fd = None        # offene Sperrdatei; Sperre gehalten = Hub
+
+    def start(self):
+        threading.Thread(target=self._run, name="live-bus-ipc", daemon=True).start()
+
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+        self._forward((channel, message), exclude=None)
+
+    def _forward(self, packet, exclude):
+        if self._conn is not None:
+            try:
+                with self._send_lock:
+                    self._conn.send(packet)
+            except (OSError, EOFError):
+                pass
+            return
+        with self._peers_lock:
+            peers = [p for p in self._peers if p is not exclude]
+        for p in peers:
+            try:
+                p.send(packet)
+            except (OSError, EOFError):
+                self._drop_peer(p)
+
+    def _drop_peer(self, conn):
+        with self._peers_lock:
+            if conn in self._peers:
+                self._peers.remove(conn)
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def _try_become_hub(self) -> bool:
+        """Hub-Wahl: wer die Sperre bekommt, ist Hub, bis der Prozess endet (das OS gibt sie dann frei)."""
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.address + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _run(self):
+        from multiprocessing.connection import Client, Listener
+        while True:
+            if self._try_become_hub():
+                # nur der Sperrinhaber räumt einen verwaisten Socket weg und bindet neu
+                try:
+                    os.unlink(self.address)
+                except FileNotFoundError:
+                    pass
+                listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+                os.chmod(self.address, 0o600)
+                self._serve_hub(listener)  # kehrt nicht zurück
+            try:
+                conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except OSError:
+                # Hub bindet gerade bzw. ist weg → warten, dann Sperre erneut versuchen
+                time.sleep(self.RETRY)
+                continue
+            self._conn = conn
+            try:
+                while True:
+                    channel, message = conn.recv()
+                    self._deliver(channel, message)
+            except (OSError, EOFError):
+                pass
+            finally:
+                self._conn = None
+                try:
+                    conn.close()
+                except OSError:
+                    pass
+            time.sleep(self.RETRY)
+
+    def _serve_hub(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue
+            with self._peers_lock:
+                self._peers.append(conn)
+            threading.Thread(target=self._read_peer, args=(conn,), daemon=True).start()
+
+    def _read_peer(self, conn):
+        try:
+            while True:
+                packet = conn.recv()
+                self._deliver(*packet)
+                self._forward(packet, exclude=conn)
+        except (OSError, EOFError):
+            pass
+        self._drop_peer(conn)
+
+
+class RedisBus(MessageBus):
+    def __init__(self, url: str):
+        super().__init__()
+        import redis  # optional, nur für Mehr-Maschinen-Betrieb
+        self._redis = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, pickle.dumps(message))
+
+    def start(self):
+        threading.Thread(target=self._run, name="live-bus-redis", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                ps = self._redis.pubsub(ignore_subscribe_messages=True)
+                ps.subscribe(*self._subs.keys())
+                for item in ps.listen():
+                    channel = item["channel"].decode() if isinstance(item["channel"], bytes) else item["channel"]
+                    self._deliver(channel, pickle.loads(item["data"]))
+            except Exception:
+                time.sleep(1)
+
+
+# ---------- Socket.IO-Anbindung ----------
+class BusManager(sio.PubSubManager):
+    """Socket.IO Client-Manager, der Emits über den ``MessageBus`` verteilt."""
+    name = "efe-bus"
+
+    def __init__(self, bus: MessageBus, channel=SOCKETIO_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus
+        self._inbox = queue.Queue()
+        bus.subscribe(channel, self._inbox.put)
+
+    def _publish(self, data):
+        self.bus.publish(self.channel, data)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+# ---------- Zustands-Synchronisation ----------
+def handler(op: str):
+    """Registriert eine Funktion für Zustandsänderungen anderer Worker."""
+    def deco(fn):
+        _handlers[op] = fn
+        return fn
+    return deco
+
+
+def publish(op: str, **data) -> None:
+    """Zustandsänderung an die anderen Worker melden (ohne Bus: no-op)."""
+    if _bus is not None:
+        _bus.publish(LIVE_CHANNEL, {"op": op, "origin": ORIGIN, "data": data})
+
+
+def _on_live(message) -> None:
+    if message.get("origin") == ORIGIN:
+        return
+    fn = _handlers.get(message.get("op"))
+    if fn is None:
+        return
+    with _app.app_context():
+        fn(**message.get("data", {}))
+
+
+def make_bus(url: str, secret: str) -> MessageBus:
+    if url == "inprocess":
+        return InProcessBus()
+    if url.startswith("ipc://"):
+        if not secret or secret == "dev":
+            raise RuntimeError("LIVE_BUS über ipc:// braucht einen eigenen Schlüssel (LIVE_BUS_KEY oder SECRET_KEY ≠ 'dev')")
+        return LocalIPCBus(url[len("ipc://"):], authkey=secret.encode())
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBus(url)
+    raise ValueError(f"Unbekanntes LIVE_BUS-Backend: {url}")
+
+
+def socketio_options(app) -> dict:
+    """Bus laut Config starten; liefert die Zusatzoptionen für ``socketio.init_app``."""
+    global _bus, _app
+    url = (app.config.get("LIVE_BUS") or "").strip()
+    if not url:
+        return {}
+    _app = app
+    _bus = make_bus(url, app.config.get("LIVE_BUS_KEY") or app.config.get("SECRET_KEY"))
+    _bus.subscribe(LIVE_CHANNEL, _on_live)
+    manager = BusManager(_bus)
+    _bus.start()
+    return {"client_manager": manager}
@@ -0,0 +1,121 @@
+"""
+Vorgerenderte Foliensätze für Live-Sessions.
+
+Ein Deck ist die sortierte Liste der Kurs-Knoten samt fertig gerendertem HTML
+(bei Übungen je eine Variante mit und ohne Lösung). Es wird einmal pro Kurs
+gebaut und über eine Inhalts-Version geschlüsselt: Speichern eines Abschnitts
+oder einer Übung rendert nur diesen einen Slide neu, strukturelle Änderungen
+(neuer Knoten, Reihenfolge, Titel) verwerfen das Deck. Slide-Wechsel und joins
+sind damit reine Index-Zugriffe.
+"""
+import threading
+from dataclasses import dataclass
+
+from . import bus
+from ..courses import render
+from ..extensions import db
+from ..models import ContentNode, Exercise
+
+@dataclass
+class Slide:
+    node_id: str
+    type: str
+    title: str
+    html: str                  # Lösung verborgen
+    html_revealed: str = None  # nur Übungen
+
+
+def render_slide(node: ContentNode, ex: Exercise | None = None) -> Slide:
+    """Slide aus den beim Speichern gerenderten Fragmenten (Übung: beide Varianten)."""
+    if node.type == "exercise":
+        return Slide(node.id, node.type, node.title,
+                     render.exercise_html(node.id, ex, False), render.exercise_html(node.id, ex, True))
+    return Slide(node.id, node.type, node.title, render.section_html(node))
+
+
+class Deck:
+    def __init__(self, course_id: str, version: int, slides: list):
+        self.course_id = course_id
+        self.version = version
+        self.slides = slides
+        self.index_of = {s.node_id: i for i, s in enumerate(slides)}
+
+    def __len__(self):
+        return len(self.slides)
+
+    def meta(self) -> list:
+        """Für die Seitenliste im Lehrer-View."""
+        return [{"id": s.node_id, "type": s.type, "title": s.title} for s in self.slides]
+
+    def html(self, idx: int, revealed_ids=()) -> str:
+        if not 0 <= idx < len(self.slides):
+            return ""
+        s = self.slides[idx]
+        if s.html_revealed is not None and s.node_id in revealed_ids:
+            return s.html_revealed
+        return s.html
+
+
+# ---------- Cache ----------
+_lock = threading.RLock()
+_versions = {}  # course_id -> Inhalts-Version
+_decks = {}     # course_id -> Deck
+
+
+def version(course_id: str) -> int:
+    return _versions.get(course_id, 0)
+
+
+def _build(course_id: str) -> Deck:
+    nodes = ContentNode.query.filter_by(subject_year_id=course_id)\
+        .order_by(ContentNode.order_index.asc(), ContentNode.title.asc()).all()
+    ex_node_ids = [n.id for n in nodes if n.type == "exercise"]
+    exercises = {}
+    if ex_node_ids:
+        for ex in Exercise.query.filter(Exercise.content_node_id.in_(ex_node_ids)).all():
+            exercises.setdefault(ex.content_node_id, ex)
+    return Deck(course_id, version(course_id), [render_slide(n, exercises.get(n.id)) for n in nodes])
+
+
+def get(course_id: str) -> Deck:
+    d = _decks.get(course_id)
+    if d is not None and d.version == version(course_id):
+        return d
+    with _lock:
+        d = _decks.get(course_id)
+        if d is None or d.version != version(course_id):
+            d = _decks[course_id] = _build(course_id)
+        return d
+
+
+def node_saved(course_id: str, node_id: str) -> None:
+    """Inhalt eines Knotens geändert → nur diesen Slide neu rendern."""
+    bus.publish("deck", course_id=course_id)
+    with _lock:
+        _versions[course_id] = version(course_id) + 1
+        d = _decks.get(course_id)
+        if d is None:
+            return
+        i = d.index_of.get(node_id)
+        node = db.session.get(ContentNode, node_id) if i is not None else None
+        if node is None:
+            _decks.pop(course_id, None)
+            return
+        ex = Exercise.query.filter_by(content_node_id=node_id).first() if node.type == "exercise" else None
+        slides = list(d.slides)
+        slides[i] = render_slide(node, ex)
+        _decks[course_id] = Deck(course_id, version(course_id), slides)
+
+
+def structure_changed(course_id: str) -> None:
+    """Knoten hinzugefügt/umsortiert/umbenannt → Deck beim nächsten Zugriff neu bauen."""
+    bus.publish("deck", course_id=course_id)
+    _drop(course_id)
+
+
+@bus.handler("deck")
+def _drop(course_id: str) -> None:
+    # andere Worker kennen den geänderten Knoten nicht → beim nächsten Zugriff neu bauen
+    with _lock:
+        _versions[course_id] = version(course_id) + 1
+        _decks.pop(course_id, None)
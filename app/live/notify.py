@@ -0,0 +1,22 @@
+"""
+Benachrichtigungen pro Nutzer über den bestehenden Socket.IO-Server.
+
+Jede authentifizierte Verbindung tritt beim ``connect`` dem Raum
+``user:<id>`` bei. Startet oder endet eine Live-Session, geht ein einziges
+``live_status``-Emit an die Räume aller Mitglieder der Klasse – die
+Kursseiten müssen nicht mehr pollen.
+"""
+from ..extensions import db, socketio
+from ..models import Enrollment
+
+
+def user_room(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def live_changed(course_id: str, class_id: str, session_id: str | None) -> None:
+    """``live_status`` an alle Mitglieder der Klasse (aktiv = ``session_id`` gesetzt)."""
+    ids = [uid for (uid,) in db.session.query(Enrollment.user_id).filter_by(class_id=class_id)]
+    if ids:
+        socketio.emit("live_status", {"course_id": course_id, "active": session_id is not None,
+                                      "session_id": session_id}, to=[user_room(u) for u in ids])
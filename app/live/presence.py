@@ -0,0 +1,159 @@
+"""
+Anwesenheit in Live-Räumen.
+
+Pro Session: ``request.sid`` → (user_id, Rolle, Name). Ein Nutzer mit mehreren
+Tabs zählt einmal; er gilt als gegangen, wenn seine letzte Verbindung weg ist
+(``leave_live`` oder ``disconnect``). Änderungen werden nicht einzeln
+gesendet, sondern höchstens einmal pro Sekunde als Diff
+``presence {joined: [...], left: [...], count}`` an den Raum – bei 30
+gleichzeitigen Joins ein Paket statt 30 Broadcasts an je 30 Clients.
+
+``count(session_id)`` ist für HTTP-Routen gedacht (O(1), kein SQL). Mit
+``LIVE_BUS`` kennt jeder Worker alle Verbindungen; den Diff sendet nur der
+Worker, auf dem die Änderung passiert ist.
+"""
+import threading
+
+from . import bus
+from ..extensions import socketio
+
+FLUSH_INTERVAL = 1.0  # s
+
+
+class Room:
+    def __init__(self, room: str):
+        self.room = room
+        self.sids = {}      # sid -> (user_id, role, name)
+        self.users = {}     # user_id -> Anzahl Verbindungen
+        self.joined = {}    # user_id -> {"user_id", "role", "name"} seit letztem Flush
+        self.left = set()
+
+    def add(self, sid: str, user_id: str, role: str, name: str, local: bool) -> None:
+        if sid in self.sids:
+            return
+        self.sids[sid] = (user_id, role, name)
+        self.users[user_id] = self.users.get(user_id, 0) + 1
+        if self.users[user_id] == 1 and local:
+            if user_id in self.left:
+                self.left.discard(user_id)  # kurz weg und wieder da → kein Diff
+            else:
+                self.joined[user_id] = {"user_id": user_id, "role": role, "name": name}
+
+    def remove(self, sid: str, local: bool) -> None:
+        entry = self.sids.pop(sid, None)
+        if entry is None:
+            return
+        user_id = entry[0]
+        self.users[user_id] -= 1
+        if self.users[user_id] > 0:
+            return
+        del self.users[user_id]
+        if local:
+            if self.joined.pop(user_id, None) is None:
+                self.left.add(user_id)
+
+    def count(self, role: str | None = None) -> int:
+        if role is None:
+            return len(self.users)
+        return len({u for u, r, _ in self.sids.values() if r == role})
+
+    def take_diff(self) -> dict | None:
+        if not self.joined and not self.left:
+            return None
+        diff = {"joined": list(self.joined.values()), "left": sorted(self.left), "count": len(self.users)}
+        self.joined, self.left = {}, set()
+        return diff
+
+
+_lock = threading.Lock()
+_rooms = {}       # session_id -> Room
+_by_sid = {}      # sid -> session_id
+_flusher_started = False
+
+
+def _flush_loop():
+    while True:
+        socketio.sleep(FLUSH_INTERVAL)
+        with _lock:
+            diffs = [(r.room, r.take_diff()) for r in _rooms.values()]
+        for room, diff in diffs:
+            if diff:
+                socketio.emit("presence", diff, to=room)
+
+
+def _ensure_flusher():
+    global _flusher_started
+    if not _flusher_started:
+        _flusher_started = True
+        socketio.start_background_task(_flush_loop)
+
+
+def _add(session_id, room, sid, user_id, role, name, local):
+    with _lock:
+        old = _by_sid.get(sid)
+        if old and old != session_id and old in _rooms:
+            _rooms[old].remove(sid, local)
+        r = _rooms.get(session_id)
+        if r is None:
+            r = _rooms[session_id] = Room(room)
+        r.add(sid, user_id, role, name, local)
+        _by_sid[sid] = session_id
+
+
+def _remove(sid, local):
+    with _lock:
+        session_id = _by_sid.pop(sid, None)
+        r = _rooms.get(session_id)
+        if r is not None:
+            r.remove(sid, local)
+
+
+def join(session_id: str, room: str, sid: str, user_id: str, role: str, name: str = "") -> None:
+    with _lock:
+        _ensure_flusher()
+    _add(session_id, room, sid, user_id, role, name, True)
+    bus.publish("presence_join", session_id=session_id, room=room, sid=sid, user_id=user_id, role=role, name=name)
+
+
+def leave(sid: str) -> None:
+    """Verbindung aus ihrem Raum entfernen (leave_live/disconnect); unbekannte sid: no-op."""
+    if sid not in _by_sid:
+        return
+    _remove(sid, True)
+    bus.publish("presence_leave", sid=sid)
+
+
+def snapshot(session_id: str) -> list:
+    """Aktuelle Teilnehmer (je Nutzer einmal) – z. B. für einen neu beigetretenen Host."""
+    with _lock:
+        r = _rooms.get(session_id)
+        if r is None:
+            return []
+        seen = {}
+        for user_id, role, name in r.sids.values():
+            seen.setdefault(user_id, {"user_id": user_id, "role": role, "name": name})
+        return list(seen.values())
+
+
+def count(session_id: str, role: str | None = None) -> int:
+    r = _rooms.get(session_id)
+    return r.count(role) if r is not None else 0
+
+
+def drop(session_id: str) -> None:
+    with _lock:
+        r = _rooms.pop(session_id, None)
+        if r is not None:
+            for sid in r.sids:
+                _by_sid.pop(sid, None)
+
+
+# ---------- Andere Worker ----------
+@bus.handler("presence_join")
+def _remote_join(session_id, room, sid, user_id, role, name):
+    _add(session_id, room, sid, user_id, role, name, False)
+
+
+@bus.handler("presence_leave")
+def _remote_leave(sid):
+    _remove(sid, False)
@@ -0,0 +1,213 @@
+"""
+Live-Abfragen: Schüler beantworten während der Session eine MC-Aufgabe.
+
+Pro Session ist höchstens eine Frage offen. Antworten landen nur im Speicher
+(letzte Antwort je Schüler, Zähler je Option); die Lehrkraft bekommt
+höchstens alle ``PUSH_INTERVAL`` Sekunden ein Histogramm. Erst beim Schließen
+werden alle Antworten in einem Rutsch als ``Submission`` geschrieben – ein
+INSERT für neue, ein UPDATE für vorhandene Abgaben, ein Commit.
+
+Mit ``LIVE_BUS`` gehen Öffnen/Antworten/Schließen an alle Worker, damit jeder
+die volle Zählung hat; das Histogramm sendet nur der Worker, auf dem die
+Frage geöffnet wurde.
+"""
+import threading
+from datetime import datetime as dt
+
+from sqlalchemy import insert, update
+
+from . import bus
+from ..courses import progress
+from ..extensions import db, socketio
+from ..models import ContentNode, Exercise, ExerciseItem, Submission, gen_id
+
+PUSH_INTERVAL = 0.5  # s → höchstens 2 Histogramme pro Sekunde
+
+
+class Quiz:
+    def __init__(self, session_id: str, node_id: str, item_id: str, options: list, correct: list,
+                 points: int, prompt_html: str = "", host_room: str | None = None):
+        self.session_id = session_id
+        self.node_id = node_id
+        self.item_id = item_id
+        self.options = options            # [{"id": "A", "text": …}]
+        self.correct = sorted(correct)
+        self.points = points
+        self.prompt_html = prompt_html
+        self.host_room = host_room        # nur auf dem Worker gesetzt, der die Frage geöffnet hat
+        self.lock = threading.Lock()
+        self.counts = {o["id"]: 0 for o in options}
+        self.answers = {}                 # student_id -> [choices]
+        self.dirty = False
+        self.open = True
+
+    def public(self) -> dict:
+        """Frage für die Schüler – ohne Lösung."""
+        return {"node_id": self.node_id, "item_id": self.item_id,
+                "prompt_html": self.prompt_html, "options": self.options}
+
+    def answer(self, student_id: str, choices) -> list | None:
+        choices = sorted({str(c).upper() for c in choices or []} & self.counts.keys())
+        with self.lock:
+            if not self.open:
+                return None
+            prev = self.answers.get(student_id)
+            if prev == choices:
+                return choices
+            for c in prev or ():
+                self.counts[c] -= 1
+            for c in choices:
+                self.counts[c] += 1
+            self.answers[student_id] = choices
+            self.dirty = True
+        return choices
+
+    def histogram(self) -> dict:
+        with self.lock:
+            return {"node_id": self.node_id, "item_id": self.item_id,
+                    "counts": dict(self.counts), "answered": len(self.answers)}
+
+    def take_dirty(self) -> bool:
+        with self.lock:
+            dirty, self.dirty = self.dirty, False
+        return dirty
+
+
+_quizzes = {}  # session_id -> Quiz
+_lock = threading.Lock()
+
+
+def current(session_id: str) -> Quiz | None:
+    return _quizzes.get(session_id)
+
+
+def _load_item(course_id: str, node_id: str, item_id: str | None = None):
+    """MC-Aufgabe der Übung ``node_id`` – nur aus dem Kurs der Session."""
+    q = (ExerciseItem.query.join(Exercise, Exercise.id == ExerciseItem.exercise_id)
+         .join(ContentNode, ContentNode.id == Exercise.content_node_id)
+         .filter(Exercise.content_node_id == node_id, ContentNode.subject_year_id == course_id,
+                 ExerciseItem.type == "mc"))
+    if item_id:
+        q = q.filter(ExerciseItem.id == item_id)
+    return q.order_by(ExerciseItem.order_index.asc(), ExerciseItem.id.asc()).first()
+
+
+def _push_loop(q: Quiz) -> None:
+    while q.open:
+        socketio.sleep(PUSH_INTERVAL)
+        if q.take_dirty():
+            socketio.emit("quiz_histogram", q.histogram(), to=q.host_room)
+
+
+def open_question(session_id: str, course_id: str, node_id: str, item_id: str | None,
+                  host_room: str) -> Quiz | None:
+    """MC-Aufgabe der Übung öffnen (eine offene Frage je Session; eine vorherige wird geschlossen)."""
+    it = _load_item(course_id, node_id, item_id)
+    if it is None:
+        return None
+    options = [{"id": str(o.get("id", "")).upper(), "text": o.get("text", "")}
+               for o in (it.options or []) if isinstance(o, dict) and o.get("id")]
+    if not options:
+        return None
+    close(session_id)
+    q = Quiz(session_id, node_id, it.id, options, [str(c).upper() for c in it.correct or []],
+             int(it.points or 0), it.prompt_html or "", host_room)
+    with _lock:
+        _quizzes[session_id] = q
+    bus.publish("quiz_open", session_id=session_id, node_id=node_id, item_id=it.id, options=options,
+                correct=q.correct, points=q.points, prompt_html=q.prompt_html)
+    socketio.start_background_task(_push_loop, q)
+    return q
+
+
+def answer(session_id: str, item_id: str, student_id: str, choices) -> list | None:
+    q = _quizzes.get(session_id)
+    if q is None or q.item_id != item_id:
+        return None
+    choices = q.answer(student_id, choices)
+    if choices is not None:
+        bus.publish("quiz_answer", session_id=session_id, student_id=student_id, choices=choices)
+    return choices
+
+
+def close(session_id: str) -> dict | None:
+    """Frage schließen, Antworten speichern; liefert das End-Histogramm (oder None)."""
+    with _lock:
+        q = _quizzes.pop(session_id, None)
+    if q is None:
+        return None
+    with q.lock:
+        q.open = False
+    bus.publish("quiz_close", session_id=session_id)
+    result = q.histogram()
+    result["saved"] = _flush(q)
+    return result
+
+
+def drop(session_id: str) -> None:
+    with _lock:
+        q = _quizzes.pop(session_id, None)
+    if q is not None:
+        q.open = False
+
+
+# ---------- Speichern ----------
+def _score(q: Quiz, choices) -> int:
+    return q.points if choices is not None and sorted(choices) == q.correct else 0
+
+
+def _flush(q: Quiz) -> int:
+    """Alle Antworten als Submission (assignment_id = Übungs-Knoten, wie in exercise_view)."""
+    if not q.answers:
+        return 0
+    now = dt.utcnow()
+    existing = {
+        row.student_id: row for row in db.session.query(
+            Submission.id, Submission.student_id, Submission.answer_json,
+            Submission.score, Submission.attempts_count,
+        ).filter(Submission.assignment_id == q.node_id, Submission.student_id.in_(list(q.answers)))
+    }
+    new_rows, upd_rows = [], []
+    for student_id, choices in q.answers.items():
+        entry = {"type": "mc", "choices": choices, "live": True}
+        row = existing.get(student_id)
+        if row is None:
+            new_rows.append({"id": gen_id(), "assignment_id": q.node_id, "student_id": student_id,
+                             "answer_json": {q.item_id: entry}, "score": _score(q, choices),
+                             "status": "submitted", "attempts_count": 1,
+                             "first_seen_at": now, "submitted_at": now})
+            continue
+        answers = dict(row.answer_json or {})
+        prev = (answers.get(q.item_id) or {}).get("choices")
+        answers[q.item_id] = entry
+        upd_rows.append({"id": row.id, "answer_json": answers, "status": "submitted",
+                         "score": (row.score or 0) - _score(q, prev) + _score(q, choices),
+                         "attempts_count": (row.attempts_count or 0) + 1, "submitted_at": now})
+    if new_rows:
+        db.session.execute(insert(Submission), new_rows)
+    if upd_rows:
+        db.session.execute(update(Submission), upd_rows)
+    node = db.session.get(ContentNode, q.node_id)
+    if node is not None:  # Übung inzwischen gelöscht: Abgaben speichern, kein Fortschritt
+        progress.mark_completed(node.subject_year_id, q.node_id, q.answers, now)
+    db.session.commit()
+    return len(new_rows) + len(upd_rows)
+
+
+# ---------- Andere Worker ----------
+@bus.handler("quiz_open")
+def _remote_open(session_id, node_id, item_id, options, correct, points, prompt_html):
+    with _lock:
+        _quizzes[session_id] = Quiz(session_id, node_id, item_id, options, correct, points, prompt_html)
+
+
+@bus.handler("quiz_answer")
+def _remote_answer(session_id, student_id, choices):
+    q = _quizzes.get(session_id)
+    if q is not None:
+        q.answer(student_id, choices)
+
+
+@bus.handler("quiz_close")
+def _remote_close(session_id):
+    drop(session_id)
@@ -1,69 +1,60 @@
 from flask import request
 from flask_login import current_user
-from . import bp
-from ..extensions import socketio, db
-from ..models import LiveSession, SubjectYear, Enrollment, ContentNode, Exercise
+from . import bp, batcher, bus, deck, notify, presence, quiz, state, strokes
+from ..extensions import socketio
+from ..utils import authz
 from flask_socketio import join_room, leave_room, emit
-from datetime import datetime as dt
 
 def _room(session_id: str) -> str:
     return f"live:{session_id}"
 
-def _can_access_course(user_id: str, course_id: str) -> bool:
-    course = db.session.get(SubjectYear, course_id)
-    if not course:
-        return False
-    if current_user.role == "admin":
-        return True
-    return Enrollment.query.filter_by(class_id=course.class_id, user_id=user_id).first() is not None
-
-def _slide_html_for_node(node: ContentNode, revealed_ids: list) -> str:
-    """Erzeuge HTML für Abschnitt/Übung. Lösung nur, wenn ge-revealed."""
-    if node.type == "exercise":
-        ex = Exercise.query.filter_by(content_node_id=node.id).first()
-        if not ex:
-            return "<div class='alert alert-warning'>Diese Übung hat noch keinen Inhalt.</div>"
-        prompt = (ex.prompt_html or ex.prompt_md or "").strip()
-        solution = (ex.solution_html or "").strip()
-        show_solution = node.id in (revealed_ids or [])
-        # Klasse "d-none" nur setzen, wenn Lösung versteckt bleiben soll
-        solution_class = "" if show_solution else "d-none"
-        return (
-            f"<div class='ex-wrapper' data-node-id='{node.id}'>"
-            f"  <div class='ex-prompt'>{prompt}</div>"
-            f"  <div class='ex-solution {solution_class}'>"
-            f"    <hr><div class='alert alert-success'><strong>Lösung:</strong></div>"
-            f"    {solution}"
-            f"  </div>"
-            f"</div>"
-        )
-    # Abschnitt
-    return (node.body_html or node.body_md or "")
-
-def _current_slide_payload(sess: LiveSession):
-    nodes = ContentNode.query.filter_by(subject_year_id=sess.course_id)\
-        .order_by(ContentNode.order_index.asc(), ContentNode.title.asc()).all()
+def _host_room(session_id: str) -> str:
+    return f"live:{session_id}:host"
+
+def _current_slide_payload(sess):
     idx = int(sess.current_slide or 0)
-    html = ""
-    if 0 <= idx < len(nodes):
-        html = _slide_html_for_node(nodes[idx], sess.revealed_ids or [])
-    return {"index": idx, "html": html}
+    return {"index": idx, "html": deck.get(sess.course_id).html(idx, sess.revealed_ids)}
+
+@socketio.on("connect")
+def on_connect(auth=None):
+    """Persönlicher Raum für Benachrichtigungen (z. B. Live-Session gestartet/beendet)."""
+    if current_user.is_authenticated:
+        join_room(notify.user_room(current_user.id))
 
 @socketio.on("join_live")
 def on_join_live(data):
     session_id = (data or {}).get("session_id")
-    role = (data or {}).get("role", "student")
     if not session_id:
         return
-    sess = db.session.get(LiveSession, session_id)
-    if not sess or not sess.active:
-        return
-    if not _can_access_course(current_user.id, sess.course_id):
+    st = state.get(session_id)
+    if not st:
         return
+    # Berechtigung einmal pro Verbindung prüfen und am request.sid merken
+    c = state.conn(request.sid, session_id)
+    if c is None:
+        if not authz.is_member(st.class_id):
+            return
+        c = state.authorize(request.sid, st, current_user.id, current_user.role)
     join_room(_room(session_id))
-    # aktuellen Zustand nur an den neuen Client
-    emit("slide_change", _current_slide_payload(sess), room=request.sid)
-    emit("user_joined", {"user_id": current_user.id, "role": role}, to=_room(session_id))
+    if c.is_host:
+        join_room(_host_room(session_id))
+    # aktuellen Zustand nur an den neuen Client – Slide plus bisherige Striche in einem Paket
+    payload = _current_slide_payload(st)
+    emit("slide_change", payload, room=request.sid)
+    replay = strokes.replay(session_id, payload["index"])
+    if replay:
+        emit("draw_replay", replay, room=request.sid)
+    q = quiz.current(session_id)
+    if q is not None:
+        emit("quiz_open", q.public(), room=request.sid)
+        if c.is_host:
+            emit("quiz_histogram", q.histogram(), room=request.sid)
+    # Anwesenheit: gesammelt als ``presence``-Diff (max. 1/s) statt Broadcast pro Join
+    presence.join(session_id, _room(session_id), request.sid, c.user_id,
+                  "teacher" if c.is_host else "student", current_user.username)
+    if c.is_host:
+        emit("presence", {"reset": True, "joined": presence.snapshot(session_id), "left": [],
+                          "count": presence.count(session_id)}, room=request.sid)
 
 @socketio.on("leave_live")
 def on_leave_live(data):
@@ -71,55 +62,53 @@ def on_leave_live(data):
     if not session_id:
         return
     leave_room(_room(session_id))
-    emit("user_left", {"user_id": current_user.id}, to=_room(session_id))
+    state.forget_sid(request.sid)
+    presence.leave(request.sid)
+
+@socketio.on("disconnect")
+def on_disconnect():
+    state.forget_sid(request.sid)
+    presence.leave(request.sid)
 
 @socketio.on("slide_change")
 def on_slide_change(data):
     session_id = data.get("session_id")
     idx = int(data.get("index", 0))
-    sess = db.session.get(LiveSession, session_id)
-    if not sess or not sess.active:
-        return
-    if current_user.id != sess.host_user_id and current_user.role != "admin":
+    st = state.host_state(request.sid, session_id)
+    if not st:
         return
-    sess.current_slide = idx
-    db.session.commit()
+    state.set_slide(st, idx)
 
-    payload = _current_slide_payload(sess)
-    # an alle anderen broadcasten …
-    emit("slide_change", payload, to=_room(session_id), include_self=False)
+    payload = _current_slide_payload(st)
+    replay = strokes.replay(session_id, idx)
+
+    def _broadcast():
+        # an alle anderen – erst nachdem gepufferte Striche raus sind; Striche des Ziel-Slides hinterher
+        emit("slide_change", payload, to=_room(session_id), include_self=False)
+        if replay:
+            emit("draw_replay", replay, to=_room(session_id), include_self=False)
+    batcher.barrier(session_id, _broadcast)
     # … und dem Sender die Antwort für den Emit-Callback zurückgeben
     return payload
 
 @socketio.on("draw")
 def on_draw(data):
+    """Segmente nur puffern; der Batcher sendet sie gebündelt als ``draw_batch``."""
     session_id = data.get("session_id")
-    payload = {
-        "slide": int(data.get("slide", 0)),
-        "x0": float(data.get("x0", 0)),
-        "y0": float(data.get("y0", 0)),
-        "x1": float(data.get("x1", 0)),
-        "y1": float(data.get("y1", 0)),
-        "w": float(data.get("w", 2)),
-        "c": data.get("c", None),
-    }
-    sess = db.session.get(LiveSession, session_id)
-    if not sess or not sess.active:
-        return
-    if current_user.id != sess.host_user_id and current_user.role != "admin":
+    if not state.host_state(request.sid, session_id):
         return
-    emit("draw", payload, to=_room(session_id), include_self=False)
+    slide, segs = batcher.segments_from_event(data)
+    strokes.append(session_id, slide, segs, batcher.viewport_from_event(data))
+    batcher.get(session_id, _room(session_id)).add(request.sid, slide, segs)
 
 @socketio.on("clear")
 def on_clear(data):
     session_id = data.get("session_id")
     slide = int(data.get("slide", 0))
-    sess = db.session.get(LiveSession, session_id)
-    if not sess or not sess.active:
+    if not state.host_state(request.sid, session_id):
         return
-    if current_user.id != sess.host_user_id and current_user.role != "admin":
-        return
-    emit("clear", {"slide": slide}, to=_room(session_id), include_self=False)
+    strokes.clear(session_id, slide)
+    batcher.barrier(session_id, lambda: emit("clear", {"slide": slide}, to=_room(session_id), include_self=False))
 
 @socketio.on("reveal_solution")
 def on_reveal_solution(data):
@@ -127,29 +116,66 @@ def on_reveal_solution(data):
     session_id = data.get("session_id")
     node_id = data.get("node_id")
     reveal = bool(data.get("reveal", True))
-    sess = db.session.get(LiveSession, session_id)
-    if not sess or not sess.active:
-        return
-    if current_user.id != sess.host_user_id and current_user.role != "admin":
+    st = state.host_state(request.sid, session_id)
+    if not st or not node_id:
         return
-    ids = set(sess.revealed_ids or [])
-    if reveal:
-        ids.add(node_id)
-    else:
-        ids.discard(node_id)
-    sess.revealed_ids = list(ids)
-    db.session.commit()
+    state.set_revealed(st, node_id, reveal)
     emit("solution_reveal", {"node_id": node_id, "reveal": reveal}, to=_room(session_id), include_self=True)
 
+# ---------- Live-Abfrage ----------
+@socketio.on("quiz_open")
+def on_quiz_open(data):
+    """Lehrer öffnet die MC-Aufgabe einer Übung (``item_id`` optional: sonst die erste)."""
+    session_id = data.get("session_id")
+    st = state.host_state(request.sid, session_id)
+    if not st or not data.get("node_id"):
+        return {"ok": False}
+    q = quiz.open_question(session_id, st.course_id, data["node_id"], data.get("item_id"), _host_room(session_id))
+    if q is None:
+        return {"ok": False, "error": "Keine Multiple-Choice-Aufgabe"}
+    emit("quiz_open", q.public(), to=_room(session_id), include_self=False)
+    return {"ok": True, **q.public(), **q.histogram()}
+
+@socketio.on("live_answer")
+def on_live_answer(data):
+    """Antwort eines Schülers – nur im Speicher zählen, kein SQL."""
+    session_id = data.get("session_id")
+    c = state.conn(request.sid, session_id)
+    if c is None:
+        return {"ok": False}
+    choices = quiz.answer(session_id, data.get("item_id"), c.user_id, data.get("choices") or [])
+    return {"ok": choices is not None, "choices": choices}
+
+@socketio.on("quiz_close")
+def on_quiz_close(data):
+    session_id = data.get("session_id")
+    if not state.host_state(request.sid, session_id):
+        return {"ok": False}
+    result = quiz.close(session_id)
+    if result is None:
+        return {"ok": False}
+    emit("quiz_closed", {"item_id": result["item_id"]}, to=_room(session_id), include_self=False)
+    return {"ok": True, **result}
+
 @socketio.on("end_session")
 def on_end_session(data):
     session_id = data.get("session_id")
-    sess = db.session.get(LiveSession, session_id)
-    if not sess or not sess.active:
+    st = state.host_state(request.sid, session_id)
+    if not st:
         return
-    if current_user.id != sess.host_user_id and current_user.role != "admin":
-        return
-    sess.active = False
-    sess.ended_at = dt.utcnow()
-    db.session.commit()
+    quiz.close(session_id)
+    presence.drop(session_id)
+    batcher.drop(session_id)
+    strokes.drop(session_id)
+    state.end(session_id)
     emit("ended", {}, to=_room(session_id))
+    notify.live_changed(st.course_id, st.class_id, None)
+
+@bus.handler("session_end")
+def _remote_end(session_id):
+    """Session wurde auf einem anderen Worker beendet."""
+    quiz.drop(session_id)
+    presence.drop(session_id)
+    batcher.drop(session_id)
+    strokes.drop(session_id)
+    state.invalidate(session_id)
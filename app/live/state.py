@@ -0,0 +1,180 @@
+"""
+Prozesslokales Register der aktiven Live-Sessions.
+
+Hält pro Session active/host/course/slide/revealed und pro Socket-Verbindung
+(``request.sid``) die beim join geprüfte Berechtigung. Die Socket-Handler lesen
+nur hieraus; in die DB geschrieben wird ausschließlich bei echten
+Zustandsänderungen (Slide, Lösung, Ende). Mit ``LIVE_BUS`` werden die
+Änderungen an die anderen Worker gemeldet, die ihre Kopie nachführen.
+"""
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime as dt
+
+from . import bus
+from ..extensions import db
+from ..models import LiveSession, SubjectYear
+
+
+@dataclass
+class LiveState:
+    id: str
+    course_id: str
+    class_id: str
+    host_user_id: str
+    current_slide: int = 0
+    revealed_ids: set = field(default_factory=set)
+
+
+@dataclass
+class Conn:
+    user_id: str
+    session_id: str
+    is_host: bool
+
+
+_lock = threading.RLock()
+_sessions = {}  # session_id -> LiveState
+_conns = {}     # request.sid -> Conn
+_courses = {}   # course_id -> session_id der aktiven Session oder None (auch „keine“ wird gemerkt)
+
+
+def _from_row(sess: LiveSession) -> LiveState | None:
+    course = db.session.get(SubjectYear, sess.course_id)
+    if not course:
+        return None
+    return LiveState(id=sess.id, course_id=sess.course_id, class_id=course.class_id,
+                     host_user_id=sess.host_user_id, current_slide=int(sess.current_slide or 0),
+                     revealed_ids=set(sess.revealed_ids or []))
+
+
+def register(sess: LiveSession) -> LiveState | None:
+    """Session (frisch angelegt oder aus der DB) ins Register übernehmen."""
+    if not sess or not sess.active:
+        return None
+    st = _from_row(sess)
+    if st:
+        with _lock:
+            st = _sessions.setdefault(sess.id, st)
+            _courses[st.course_id] = st.id
+    return st
+
+
+def started(sess: LiveSession) -> LiveState | None:
+    """Neu angelegte Session übernehmen; andere Worker vergessen ihr „keine aktive Session“."""
+    st = register(sess)
+    bus.publish("session_start", course_id=sess.course_id)
+    return st
+
+
+def get(session_id: str) -> LiveState | None:
+    """Aktive Session; beim ersten Zugriff einmalig aus der DB geladen."""
+    st = _sessions.get(session_id)
+    if st is not None or not session_id:
+        return st
+    return register(db.session.get(LiveSession, session_id))
+
+
+def for_course(course_id: str) -> LiveState | None:
+    """Aktive Session eines Kurses; die DB wird pro Kurs und Prozess nur einmal gefragt."""
+    if course_id in _courses:
+        session_id = _courses[course_id]
+        st = _sessions.get(session_id) if session_id else None
+        if st is not None or session_id is None:
+            return st
+    sess = LiveSession.query.filter_by(course_id=course_id, active=True).first()
+    st = register(sess) if sess else None
+    if st is None:
+        with _lock:
+            _courses[course_id] = None
+    return st
+
+
+def authorize(sid: str, st: LiveState, user_id: str, role: str) -> Conn:
+    c = Conn(user_id=user_id, session_id=st.id, is_host=(user_id == st.host_user_id or role == "admin"))
+    with _lock:
+        _conns[sid] = c
+    return c
+
+
+def conn(sid: str, session_id: str) -> Conn | None:
+    c = _conns.get(sid)
+    if c is None or c.session_id != session_id or session_id not in _sessions:
+        return None
+    return c
+
+
+def host_state(sid: str, session_id: str) -> LiveState | None:
+    """Session-Zustand, wenn die Verbindung Host dieser (aktiven) Session ist – ohne SQL."""
+    c = _conns.get(sid)
+    if c is None or not c.is_host or c.session_id != session_id:
+        return None
+    return _sessions.get(session_id)
+
+
+def forget_sid(sid: str) -> None:
+    with _lock:
+        _conns.pop(sid, None)
+
+
+# ---------- Write-through ----------
+def _write(session_id: str, **values) -> None:
+    LiveSession.query.filter_by(id=session_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+
+def set_slide(st: LiveState, idx: int) -> None:
+    if st.current_slide == idx:
+        return
+    st.current_slide = idx
+    _write(st.id, current_slide=idx)
+    _publish(st)
+
+
+def set_revealed(st: LiveState, node_id: str, reveal: bool) -> None:
+    with _lock:
+        if (node_id in st.revealed_ids) == reveal:
+            return
+        if reveal:
+            st.revealed_ids.add(node_id)
+        else:
+            st.revealed_ids.discard(node_id)
+        ids = sorted(st.revealed_ids)
+    _write(st.id, revealed_ids=ids)
+    _publish(st)
+
+
+def end(session_id: str) -> None:
+    """Session beenden (DB) und aus dem Register werfen."""
+    _write(session_id, active=False, ended_at=dt.utcnow())
+    invalidate(session_id)
+    bus.publish("session_end", session_id=session_id)
+
+
+def invalidate(session_id: str) -> None:
+    with _lock:
+        st = _sessions.pop(session_id, None)
+        if st is not None and _courses.get(st.course_id) == session_id:
+            _courses[st.course_id] = None
+        for sid in [s for s, c in _conns.items() if c.session_id == session_id]:
+            del _conns[sid]
+
+
+# ---------- Andere Worker ----------
+def _publish(st: LiveState) -> None:
+    bus.publish("state", session_id=st.id, current_slide=st.current_slide, revealed_ids=sorted(st.revealed_ids))
+
+
+@bus.handler("state")
+def _remote_state(session_id, current_slide, revealed_ids):
+    st = _sessions.get(session_id)
+    if st is not None:
+        with _lock:
+            st.current_slide = current_slide
+            st.revealed_ids = set(revealed_ids)
+
+
+@bus.handler("session_start")
+def _remote_start(course_id):
+    with _lock:
+        _courses.pop(course_id, None)
@@ -0,0 +1,189 @@
+"""
+Serverseitiges Strich-Log pro Live-Session und Slide.
+
+Segmente werden kompakt in ``array('f')`` (x0, y0, x1, y1, w je Segment) plus
+einem RGB-``bytearray`` abgelegt – keine Listen von Dicts. ``clear`` leert den
+Slide, wächst ein Slide stark an, werden zusammenhängende, nahezu kollineare
+Segmente gleicher Farbe/Breite zusammengefasst. Der Speicher pro Session ist
+gedeckelt (``LIVE_STROKE_LOG_MAX_KB``); bei Überschreitung fliegen zuerst die
+am längsten nicht mehr benutzten Slides raus.
+
+Späte Joiner bekommen den Slide als ein ``draw_replay``-Paket: aneinander-
+gehängte draw_batch-Frames (siehe batcher).
+"""
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+from flask import current_app
+
+from . import batcher, bus
+
+FLOATS = 5                     # x0, y0, x1, y1, w
+SEG_BYTES = FLOATS * 4 + 3     # + RGB
+COMPACT_AFTER = 2048           # Segmente seit letzter Verdichtung
+COLLINEAR_TOL = 0.02           # ~1° (Sinus des Winkels)
+DEFAULT_MAX_KB = 4096
+
+
+class SlideLog:
+    __slots__ = ("coords", "colors", "since_compact", "viewport")
+
+    def __init__(self):
+        self.coords = array("f")
+        self.colors = bytearray()
+        self.since_compact = 0
+        self.viewport = None  # (breite, höhe) der Zeichenfläche beim Lehrer in CSS-Pixeln
+
+    def __len__(self):
+        return len(self.colors) // 3
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.coords) * self.coords.itemsize + len(self.colors)
+
+    def append(self, segments) -> None:
+        for x0, y0, x1, y1, w, rgb in segments:
+            try:
+                self.coords.extend((float(x0), float(y0), float(x1), float(y1), float(w)))
+            except (TypeError, ValueError):
+                continue
+            self.colors += rgb
+            self.since_compact += 1
+
+    def segments(self):
+        c, col = self.coords, self.colors
+        for i in range(len(self)):
+            o = i * FLOATS
+            yield c[o], c[o + 1], c[o + 2], c[o + 3], c[o + 4], bytes(col[i * 3:i * 3 + 3])
+
+    def drop_front(self, n: int) -> None:
+        del self.coords[:n * FLOATS]
+        del self.colors[:n * 3]
+
+    def compact(self) -> None:
+        """Zusammenhängende, kollineare Segmente gleicher Farbe/Breite verschmelzen."""
+        out_c, out_col = array("f"), bytearray()
+        cur = None
+        for x0, y0, x1, y1, w, rgb in self.segments():
+            if cur is not None and cur[4] == w and cur[5] == rgb and cur[2] == x0 and cur[3] == y0:
+                ax, ay = cur[2] - cur[0], cur[3] - cur[1]
+                bx, by = x1 - x0, y1 - y0
+                la, lb = math.hypot(ax, ay), math.hypot(bx, by)
+                if la == 0 or lb == 0 or (abs(ax * by - ay * bx) <= COLLINEAR_TOL * la * lb and ax * bx + ay * by > 0):
+                    cur[2], cur[3] = x1, y1
+                    continue
+            if cur is not None:
+                out_c.extend(cur[:5]); out_col += cur[5]
+            cur = [x0, y0, x1, y1, w, rgb]
+        if cur is not None:
+            out_c.extend(cur[:5]); out_col += cur[5]
+        self.coords, self.colors, self.since_compact = out_c, out_col, 0
+
+
+class SessionLog:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.slides = OrderedDict()  # slide -> SlideLog, zuletzt benutzt am Ende
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in self.slides.values())
+
+    def append(self, slide: int, segments, viewport=None) -> None:
+        with self.lock:
+            log = self.slides.get(slide)
+            if log is None:
+                log = self.slides[slide] = SlideLog()
+            self.slides.move_to_end(slide)
+            if viewport:
+                log.viewport = viewport
+            log.append(segments)
+            if log.since_compact >= COMPACT_AFTER:
+                log.compact()
+            self._enforce_cap(slide)
+
+    def clear(self, slide: int) -> None:
+        with self.lock:
+            self.slides.pop(slide, None)
+
+    def _enforce_cap(self, current: int) -> None:
+        total = self.nbytes
+        # erst alte Slides verwerfen …
+        while total > self.max_bytes and len(self.slides) > 1:
+            old, log = next(iter(self.slides.items()))
+            if old == current:
+                break
+            del self.slides[old]
+            total -= log.nbytes
+        # … dann notfalls die ältesten Striche des aktuellen Slides
+        log = self.slides.get(current)
+        if log is not None and total > self.max_bytes:
+            log.drop_front((total - self.max_bytes) // SEG_BYTES + 1)
+
+    def snapshot(self) -> dict:
+        """Kopie aller Slides: {slide: (viewport, [segmente])} – z. B. für den PDF-Export."""
+        with self.lock:
+            return {k: (log.viewport, list(log.segments())) for k, log in self.slides.items()}
+
+    def replay_frames(self, slide: int) -> bytes:
+        with self.lock:
+            log = self.slides.get(slide)
+            segs = list(log.segments()) if log else []
+        return b"".join(batcher.pack_frames(slide, segs))
+
+
+# ---------- Registry ----------
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def _max_bytes() -> int:
+    return int(current_app.config.get("LIVE_STROKE_LOG_MAX_KB", DEFAULT_MAX_KB)) * 1024
+
+
+def get(session_id: str) -> SessionLog:
+    log = _logs.get(session_id)
+    if log is None:
+        with _logs_lock:
+            log = _logs.get(session_id)
+            if log is None:
+                log = _logs[session_id] = SessionLog(_max_bytes())
+    return log
+
+
+def append(session_id: str, slide: int, segments, viewport=None) -> None:
+    get(session_id).append(slide, segments, viewport)
+    bus.publish("strokes", session_id=session_id, slide=slide, segments=segments, viewport=viewport)
+
+
+def clear(session_id: str, slide: int) -> None:
+    get(session_id).clear(slide)
+    bus.publish("strokes_clear", session_id=session_id, slide=slide)
+
+
+@bus.handler("strokes")
+def _remote_append(session_id, slide, segments, viewport=None):
+    get(session_id).append(slide, segments, viewport)
+
+
+@bus.handler("strokes_clear")
+def _remote_clear(session_id, slide):
+    get(session_id).clear(slide)
+
+
+def snapshot(session_id: str) -> dict:
+    log = _logs.get(session_id)
+    return log.snapshot() if log else {}
+
+
+def replay(session_id: str, slide: int) -> bytes:
+    log = _logs.get(session_id)
+    return log.replay_frames(slide) if log else b""
+
+
+def drop(session_id: str) -> None:
+    with _logs_lock:
+        _logs.pop(session_id, None)
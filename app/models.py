@@ -52,6 +52,10 @@ class ContentNode(db.Model):
     title = db.Column(db.String(255), nullable=False)
     body_md = db.Column(db.Text)
     body_html = db.Column(db.Text)                      # WYSIWYG (inkl. Bilder/Videos)
+    # beim Speichern vorgerendert (app/courses/render.py); veraltet, wenn render_version != RENDER_VERSION
+    render_html = db.Column(db.Text)
+    render_pdf_html = db.Column(db.Text)                # Bilder als lokale Pfade (WeasyPrint)
+    render_version = db.Column(db.Integer)
     media = db.Column(JSONType)
     order_index = db.Column(db.Integer, default=0)
 
@@ -86,11 +90,38 @@ class Exercise(db.Model):
     difficulty = db.Column(db.Integer)
     tags = db.Column(JSONType)
     is_live_only = db.Column(db.Boolean, default=False)  # Live: statt Punkten nur bestanden/nicht bestanden
+    points_total = db.Column(db.Integer, nullable=True)   # Summe der Item-Punkte (text/mc); None = noch nicht berechnet
+    version = db.Column(db.Integer, default=0)            # +1 bei jeder Item-Änderung (Cache-Schlüssel des Graders)
+    render_html = db.Column(db.Text)           # Folie/Ansicht, Lösung verborgen (app/courses/render.py)
+    render_revealed_html = db.Column(db.Text)  # dieselbe mit Lösung
+    render_version = db.Column(db.Integer)
 
-    def total_points(self) -> int:
+    def compute_points_total(self) -> int:
         from .models import ExerciseItem  # lazy import
-        items = ExerciseItem.query.filter_by(exercise_id=self.id).all()
-        return sum((it.points or 0) for it in items if it.type in ("text", "mc"))
+        return int(db.session.query(db.func.coalesce(db.func.sum(ExerciseItem.points), 0))
+                   .filter(ExerciseItem.exercise_id == self.id, ExerciseItem.type.in_(("text", "mc")))
+                   .scalar() or 0)
+
+    def refresh_points_total(self) -> int:
+        self.points_total = self.compute_points_total()
+        return self.points_total
+
+    def items_changed(self) -> None:
+        """Nach jeder Item-Änderung aufrufen (vor dem Commit): Punktsumme + Version.
+
+        Version als SQL-Ausdruck hochzählen – zwei gleichzeitige Änderungen
+        ergeben +2 statt beide denselben Wert (sonst träfe der Grader-Cache
+        einen veralteten Schlüssel); danach den neuen Wert zurücklesen.
+        """
+        self.refresh_points_total()
+        self.version = db.func.coalesce(Exercise.version, 0) + 1
+        db.session.flush()
+        db.session.refresh(self, ["version"])
+
+    def total_points(self) -> int:
+        if self.points_total is None:  # Altbestand: einmal nachrechnen
+            return self.refresh_points_total()
+        return self.points_total
 
 # --- ExerciseItem ---
 class ExerciseItem(db.Model):
@@ -145,6 +176,20 @@ class Submission(db.Model):
     first_seen_at = db.Column(db.DateTime, default=datetime.utcnow)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# --- Fortschritt (denormalisiert: eine Zeile je Schüler und erledigter Übung) ---
+class ExerciseProgress(db.Model):
+    __tablename__ = "exercise_progress"
+    id = db.Column(db.String, primary_key=True, default=gen_id)
+    course_id = db.Column(db.String, db.ForeignKey("subject_years.id"), nullable=False)
+    student_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=False)
+    node_id = db.Column(db.String, db.ForeignKey("content_nodes.id"), nullable=False)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint("student_id", "node_id", name="uq_progress_student_node"),
+        db.Index("ix_progress_course_node", "course_id", "node_id"),        # Abschluss-Zähler je Übung
+        db.Index("ix_progress_student_course", "student_id", "course_id"),  # „Erledigt“-Set
+    )
+
 # --- Sterne & Belohnungen ---
 class StarTransaction(db.Model):
     __tablename__ = "star_transactions"
@@ -156,6 +201,13 @@ class StarTransaction(db.Model):
     created_by = db.Column(db.String, db.ForeignKey("users.id"), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class StarBalance(db.Model):
+    """Laufender Saldo je Nutzer; wird in derselben Transaktion wie jede Ledger-Zeile geändert (app/utils/stars.py)."""
+    __tablename__ = "star_balances"
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), primary_key=True)
+    balance = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class RewardCatalog(db.Model):
     __tablename__ = "reward_catalog"
     id = db.Column(db.String, primary_key=True, default=gen_id)
@@ -202,6 +254,28 @@ class AIProfile(db.Model):
     retention_days = db.Column(db.Integer, default=90)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
 
+# --- Editor-Bilder (inhaltsadressiert, app/courses/assets.py) ---
+class AssetBlob(db.Model):
+    __tablename__ = "asset_blobs"
+    sha256 = db.Column(db.String(64), primary_key=True)
+    ext = db.Column(db.String(8), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)  # = Anzahl AssetRef-Zeilen
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    variants = db.Column(JSONType, nullable=True)  # erzeugte Breiten (app/courses/images.py); None = ausstehend
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AssetRef(db.Model):
+    __tablename__ = "asset_refs"
+    id = db.Column(db.String, primary_key=True, default=gen_id)
+    sha256 = db.Column(db.String(64), db.ForeignKey("asset_blobs.sha256"), nullable=False)
+    node_id = db.Column(db.String, db.ForeignKey("content_nodes.id"), nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint("node_id", "sha256", name="uq_asset_ref_node_blob"),
+        db.Index("ix_asset_ref_blob", "sha256"),
+    )
+
 # --- Dokumente (Uploads) mit Sortierung ---
 class Document(db.Model):
     __tablename__ = "documents"
@@ -215,3 +289,32 @@ class Document(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     released = db.Column(db.Boolean, default=True)  # Dateien standardmäßig sichtbar
     order_index = db.Column(db.Integer, default=0)            # NEU: für gemischte Liste
+    size = db.Column(db.BigInteger, nullable=True)            # Bytes (Kurs-Kontingent); Altbestand: None
+    sha256 = db.Column(db.String(64), nullable=True)
+
+# --- Hintergrund-Jobs (Status für alle Worker, app/utils/jobs.py) ---
+class JobRecord(db.Model):
+    __tablename__ = "background_jobs"
+    id = db.Column(db.String, primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    owner_id = db.Column(db.String, nullable=True, index=True)
+    status = db.Column(db.String, nullable=False, default="queued")  # queued|running|done|failed
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(JSONType, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# --- Laufende Uploads in Teilen (app/courses/uploads.py) ---
+class UploadSession(db.Model):
+    __tablename__ = "upload_sessions"
+    id = db.Column(db.String, primary_key=True, default=gen_id)
+    subject_year_id = db.Column(db.String, db.ForeignKey("subject_years.id"), nullable=False, index=True)
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=False)
+    filename = db.Column(db.String, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)                  # angekündigte Gesamtgröße (reserviert Kontingent)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)     # bisher geschriebene Bytes
+    sha256 = db.Column(db.String(64), nullable=True)                 # vom Client erwartet (optional)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,17 +1,26 @@
 # app/rewards/routes.py
-from flask import Blueprint, request, redirect, url_for, flash
+from datetime import datetime
+from flask import Blueprint, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from ..extensions import db
-from ..models import RewardCatalog, UserRewardUnlock, StarTransaction
+from ..models import RewardCatalog, UserRewardUnlock
+from ..utils import stars
 
 bp = Blueprint("rewards", __name__)  # <— HIER den Blueprint definieren
 
 @bp.route("/catalog", methods=["POST"])   # Lehrer: Reward anlegen/ändern
 @login_required
 def upsert_catalog():
+    if current_user.role not in ("teacher", "admin"): abort(403)
     key = request.form.get("key")
     title = request.form.get("title")
-    cost = int(request.form.get("cost", 0))
+    try:
+        cost = int(request.form.get("cost", 0))
+    except ValueError:
+        cost = 0
+    if not key or not title or cost < 1:
+        flash("Schlüssel, Titel und Preis (mind. 1 Stern) angeben.", "warning")
+        return redirect(url_for("teachers.dashboard"))
     r = RewardCatalog.query.filter_by(key=key).first()
     if not r:
         r = RewardCatalog(key=key, title=title, cost_stars=cost)
@@ -27,8 +36,31 @@ def upsert_catalog():
 @login_required
 def unlock():
     reward_id = request.form.get("reward_id")
-    balance = db.session.query(db.func.coalesce(db.func.sum(StarTransaction.amount), 0))\
-                        .filter_by(user_id=current_user.id).scalar()
     reward = db.session.get(RewardCatalog, reward_id)  # SQLAlchemy 2.0 Kompatibilität
     if not reward:
         flash("Reward nicht gefunden", "warning")
+        return redirect(url_for("students.dashboard"))
+    now = datetime.utcnow()
+    if (reward.active_from and now < reward.active_from) or (reward.active_to and now > reward.active_to):
+        flash("Reward ist derzeit nicht verfügbar", "warning")
+        return redirect(url_for("students.dashboard"))
+    if reward.cost_stars is None or reward.cost_stars < 1:
+        flash("Reward ist derzeit nicht verfügbar", "warning")
+        return redirect(url_for("students.dashboard"))
+    # Saldo-Prüfung und Abbuchung in einem bedingten UPDATE – kein Doppelkauf
+    if stars.spend(current_user.id, reward.cost_stars) is None:
+        db.session.rollback()
+        flash("Nicht genug Sterne", "warning")
+        return redirect(url_for("students.dashboard"))
+    # Limit erst nach dem UPDATE zählen: die Saldo-Zeile ist jetzt bis zum Commit gesperrt,
+    # ein paralleles Freischalten desselben Schülers wartet und sieht danach unsere Zeile
+    if reward.max_per_student is not None:
+        count = UserRewardUnlock.query.filter_by(user_id=current_user.id, reward_id=reward.id).count()
+        if count >= reward.max_per_student:
+            db.session.rollback()
+            flash("Reward bereits so oft freigeschaltet wie erlaubt", "warning")
+            return redirect(url_for("students.dashboard"))
+    db.session.add(UserRewardUnlock(user_id=current_user.id, reward_id=reward.id, spent_stars=reward.cost_stars))
+    db.session.commit()
+    flash(f"{reward.title} freigeschaltet.", "success")
+    return redirect(url_for("students.dashboard"))
@@ -0,0 +1,70 @@
+/* Live-Modus: gemeinsame Helfer für Lehrer- und Schüleransicht */
+(function(){
+  const QUANT = 4;
+  const HEADER = 5;   // u8 version | u16 slide | u16 anzahl
+  const SEGMENT = 12; // 4x i16 | u8 breite | 3 Byte RGB
+
+  function hex2(n){ return n.toString(16).padStart(2, '0'); }
+
+  // Binärframe (draw_batch) → {slide, segs:[{x0,y0,x1,y1,w,c}]}
+  function decodeDrawBatch(buf){
+    if (buf instanceof Uint8Array) buf = buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.byteLength);
+    if (!(buf instanceof ArrayBuffer) || buf.byteLength < HEADER) return null;
+    const dv = new DataView(buf);
+    if (dv.getUint8(0) !== 1) return null;
+    const slide = dv.getUint16(1, true);
+    const n = Math.min(dv.getUint16(3, true), Math.floor((buf.byteLength - HEADER) / SEGMENT));
+    const segs = new Array(n);
+    for (let i = 0, o = HEADER; i < n; i++, o += SEGMENT){
+      segs[i] = {
+        x0: dv.getInt16(o, true) / QUANT,
+        y0: dv.getInt16(o + 2, true) / QUANT,
+        x1: dv.getInt16(o + 4, true) / QUANT,
+        y1: dv.getInt16(o + 6, true) / QUANT,
+        w:  dv.getUint8(o + 8) / QUANT,
+        c:  '#' + hex2(dv.getUint8(o + 9)) + hex2(dv.getUint8(o + 10)) + hex2(dv.getUint8(o + 11)),
+      };
+    }
+    return {slide, segs};
+  }
+
+  // draw_replay: mehrere aneinandergehängte Frames → [{slide, segs}]
+  function decodeDrawFrames(buf){
+    if (buf instanceof Uint8Array) buf = buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.byteLength);
+    const out = [];
+    let o = 0;
+    while (buf instanceof ArrayBuffer && o + HEADER <= buf.byteLength){
+      const n = new DataView(buf, o).getUint16(3, true);
+      const end = o + HEADER + n * SEGMENT;
+      const f = decodeDrawBatch(buf.slice(o, end));
+      if (!f) break;
+      out.push(f);
+      o = end;
+    }
+    return out;
+  }
+
+  // Ausgehende Segmente sammeln und höchstens alle `interval` ms als ein draw-Event senden
+  // viewport(): [breite, höhe] der Zeichenfläche, damit der Server Striche maßstabsgetreu exportieren kann
+  function strokeSender(socket, sessionId, interval, viewport){
+    let cur = null, timer = null;
+    function flush(){
+      if (timer){ clearTimeout(timer); timer = null; }
+      if (!cur || !cur.segs.length){ cur = null; return; }
+      socket.emit('draw', cur);
+      cur = null;
+    }
+    function push(slide, x0, y0, x1, y1, w, c){
+      if (cur && (cur.slide !== slide || cur.w !== w || cur.c !== c)) flush();
+      if (!cur){
+        cur = {session_id: sessionId, slide, w, c, segs: []};
+        if (viewport){ const [vw, vh] = viewport(); cur.vw = vw; cur.vh = vh; }
+      }
+      cur.segs.push(x0, y0, x1, y1);
+      if (!timer) timer = setTimeout(flush, interval || 33);
+    }
+    return {push, flush};
+  }
+
+  window.EFELive = {decodeDrawBatch, decodeDrawFrames, strokeSender};
+})();
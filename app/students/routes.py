@@ -2,14 +2,15 @@ from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import bp
 from ..extensions import db
-from ..models import Class, Enrollment, StarTransaction, UserRewardUnlock, RewardCatalog
+from ..models import Class, Enrollment, UserRewardUnlock, RewardCatalog
+from ..utils import authz, stars
 
 
 @bp.route("/dashboard", methods=["GET","POST"])
 @login_required
 def dashboard():
     # Balance berechnen
-    balance = db.session.query(db.func.coalesce(db.func.sum(StarTransaction.amount), 0)).filter_by(user_id=current_user.id).scalar()
+    balance = stars.balance(current_user.id)
     rewards = RewardCatalog.query.all()
     unlocks = UserRewardUnlock.query.filter_by(user_id=current_user.id).all()
     return render_template("students/dashboard.html", balance=balance, rewards=rewards, unlocks=unlocks)
@@ -28,5 +29,6 @@ def join_class():
     if not exists:
         db.session.add(Enrollment(class_id=klass.id, user_id=current_user.id, role_in_class="student"))
         db.session.commit()
+        authz.invalidate(current_user.id)
         flash(f"Klasse {klass.name} beigetreten", "success")
     return redirect(url_for("students.dashboard"))
\ No newline at end of file
@@ -1,9 +1,11 @@
+import csv
 import secrets
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, abort, jsonify, current_app, Response
 from flask_login import login_required, current_user
 from . import bp
 from ..extensions import db
-from ..models import Class, Enrollment, RewardCatalog, StarTransaction, gen_id
+from ..models import Class, Enrollment, RewardCatalog, gen_id
+from ..utils import authz, jobs, provisioning, stars
 
 
 @bp.route("/dashboard", methods=["GET","POST"])
@@ -34,6 +36,7 @@ def create_class():
     db.session.add(klass)
     db.session.add(Enrollment(class_id=klass.id, user_id=current_user.id, role_in_class="teacher"))
     db.session.commit()
+    authz.invalidate(current_user.id)
     flash("Klasse angelegt.", "success")
     return redirect(url_for("teachers.dashboard"))
 
@@ -46,8 +49,62 @@ def grant_stars():
     if amount == 0:
         flash("Ungültige Anzahl", "warning")
         return redirect(url_for("teachers.dashboard"))
-    tx = StarTransaction(user_id=student_id, amount=amount, reason="bonus", created_by=current_user.id)
-    db.session.add(tx)
+    stars.add(student_id, amount, "bonus", created_by=current_user.id)
     db.session.commit()
     flash("Sterne vergeben.", "success")
-    return redirect(url_for("teachers.dashboard"))
\ No newline at end of file
+    return redirect(url_for("teachers.dashboard"))
+
+# ---------- Schüler-Import (CSV/JSON) ----------
+def _run_import(job, rows, default_class_id, allowed_class_ids, allowed_roles):
+    res = provisioning.import_rows(rows, default_class_id, allowed_class_ids, allowed_roles, progress=job.progress)
+    # Zeilenbericht mit Passwörtern nur im Speicher; gespeichert/gemeldet werden Zahlen und Fehler
+    job.private = res.pop("rows")
+    res["error_rows"] = [{"row": r["row"], "username": r["username"], "error": r["error"]}
+                         for r in job.private if r.get("status") == "error"]
+    return res
+
+
+@bp.route("/students/import", methods=["POST"])
+@login_required
+def import_students():
+    """Datei hochladen → Import läuft als Hintergrund-Job; Antwort sofort mit Job-ID."""
+    if current_user.role not in ("teacher", "admin"): abort(403)
+    f = request.files.get("file")
+    if not f:
+        return jsonify({"ok": False, "error": "Keine Datei"}), 400
+    try:
+        rows = provisioning.parse(f.read(), f.filename or "")
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"ok": False, "error": f"Datei nicht lesbar: {e}"}), 400
+
+    if current_user.role == "admin":
+        allowed_class_ids, allowed_roles = None, provisioning.ROLES
+    else:
+        allowed_class_ids = set(authz.memberships(current_user.id).teaching)
+        allowed_roles = ("student",)
+    default_class_id = request.form.get("class_id") or None
+    if default_class_id and allowed_class_ids is not None and default_class_id not in allowed_class_ids:
+        abort(403)
+
+    job = jobs.submit(current_app._get_current_object(), "student_import", _run_import,
+                      rows, default_class_id, allowed_class_ids, allowed_roles,
+                      owner_id=current_user.id, notify_sid=request.form.get("sid"))
+    return jsonify({"ok": True, "job_id": job.id, "rows": len(rows)}), 202
+
+
+@bp.route("/students/import/<job_id>")
+@login_required
+def import_students_status(job_id):
+    """
+    Status als JSON; mit ``?format=csv`` der Zeilenbericht (inkl. erzeugter
+    Passwörter) als Download – nur vom Worker, der importiert hat, und nur
+    solange der Job dort vorgehalten wird.
+    """
+    job = jobs.get(job_id)
+    if not job or job.kind != "student_import" or job.owner_id != current_user.id: abort(404)
+    if request.args.get("format") == "csv":
+        if job.status != "done": abort(409)
+        if job.private is None: abort(410)
+        return Response(provisioning.report_csv(job.private), mimetype="text/csv",
+                        headers={"Content-Disposition": f"attachment; filename=import_{job.id[:8]}.csv"})
+    return jsonify(job.to_dict())
@@ -0,0 +1,143 @@
+"""
+Zentrale Berechtigungsprüfung für Kurse/Klassen.
+
+Statt in jeder Route ``Enrollment.query.filter_by(...).first()`` (plus oft
+``SubjectYear`` davor) hält ein TTL-Cache je Nutzer die Menge seiner
+Klassen und die Klassen, in denen er Lehrkraft ist, sowie je Kurs die
+Klasse. Eine Seite mit 20 Bildern über ``serve_file`` kostet so keine
+einzige Berechtigungsabfrage mehr.
+
+Wer Einschreibungen anlegt/löscht, ruft ``invalidate(user_id, ...)``; über
+den Live-Bus verwerfen auch die anderen Worker ihren Eintrag.
+
+    @bp.route("/<course_id>/…")
+    @login_required
+    @course_required()              # Mitglied der Klasse (Admin immer)
+    @course_required(teacher=True)  # Lehrkraft der Klasse (Admin immer)
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import abort
+from flask_login import current_user
+
+from ..extensions import db
+from ..live import bus
+from ..models import Class, Enrollment, SubjectYear
+
+TTL = 300.0       # s
+MAX_ENTRIES = 4096
+
+
+class Memberships:
+    __slots__ = ("classes", "teaching")
+
+    def __init__(self, classes: frozenset, teaching: frozenset):
+        self.classes = classes     # alle Klassen des Nutzers
+        self.teaching = teaching   # Klassen als Lehrkraft (Einschreibung oder selbst angelegt)
+
+
+class _TTLCache:
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None or hit[0] <= time.monotonic():
+                return None
+            self._data.move_to_end(key)
+            return hit[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + TTL, value)
+            self._data.move_to_end(key)
+            while len(self._data) > MAX_ENTRIES:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_members = _TTLCache()   # user_id -> Memberships
+_courses = _TTLCache()   # course_id -> class_id
+
+
+def memberships(user_id: str) -> Memberships:
+    m = _members.get(user_id)
+    if m is None:
+        classes, teaching = set(), set()
+        for class_id, role in db.session.query(Enrollment.class_id, Enrollment.role_in_class).filter_by(user_id=user_id):
+            classes.add(class_id)
+            if role == "teacher":
+                teaching.add(class_id)
+        teaching.update(c for (c,) in db.session.query(Class.id).filter_by(created_by=user_id))
+        m = Memberships(frozenset(classes), frozenset(teaching))
+        _members.put(user_id, m)
+    return m
+
+
+def course_class(course_id: str) -> str | None:
+    """Klasse eines Kurses (None = Kurs existiert nicht)."""
+    class_id = _courses.get(course_id)
+    if class_id is None:
+        class_id = db.session.query(SubjectYear.class_id).filter_by(id=course_id).scalar()
+        if class_id is not None:
+            _courses.put(course_id, class_id)
+    return class_id
+
+
+def is_member(class_id: str, user=None) -> bool:
+    user = user or current_user
+    return user.role == "admin" or class_id in memberships(user.id).classes
+
+
+def is_teacher(class_id: str, user=None) -> bool:
+    user = user or current_user
+    if user.role == "admin":
+        return True
+    return user.role == "teacher" and class_id in memberships(user.id).teaching
+
+
+def check_course(course_id: str, teacher: bool = False) -> str:
+    """404 ohne Kurs, 403 ohne Berechtigung; liefert die Klassen-ID."""
+    class_id = course_class(course_id) if course_id else None
+    if class_id is None:
+        abort(404)
+    if not (is_teacher(class_id) if teacher else is_member(class_id)):
+        abort(403)
+    return class_id
+
+
+def course_required(teacher: bool = False):
+    """Decorator für Routen mit ``course_id`` im Pfad."""
+    def deco(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            check_course(kwargs.get("course_id"), teacher)
+            return f(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _drop(user_ids) -> None:
+    for uid in user_ids:
+        _members.pop(uid)
+
+
+def invalidate(*user_ids: str) -> None:
+    """Nach Änderungen an Einschreibungen/Klassen dieser Nutzer (auch auf anderen Workern)."""
+    if not user_ids:
+        return
+    _drop(user_ids)
+    bus.publish("authz_invalidate", user_ids=list(user_ids))
+
+
+@bus.handler("authz_invalidate")
+def _remote_invalidate(user_ids):
+    _drop(user_ids)
@@ -2,8 +2,9 @@ import os
 from flask_migrate import stamp as alembic_stamp, upgrade as alembic_upgrade
 from sqlalchemy import inspect as sa_inspect
 from ..extensions import db
+from . import passwords
+from ..auth import identity
 from ..models import User  # sorgt auch dafür, dass alle Models importiert sind
-from passlib.hash import bcrypt
 
 
 def _schema_tables():
@@ -123,7 +124,7 @@ def ensure_initial_admin(app) -> str | None:
         u = User.query.filter_by(username=username).first()
         if not u:
             u = User(username=username, email=email, role="admin",
-                     password_hash=bcrypt.hash(pwd))
+                     password_hash=passwords.hash(pwd))
             db.session.add(u)
             db.session.commit()
             app.logger.warning("Initialer Admin '%s' angelegt.", username)
@@ -131,5 +132,6 @@ def ensure_initial_admin(app) -> str | None:
             if u.role != "admin":
                 u.role = "admin"
                 db.session.commit()
+                identity.invalidate(u.id)
                 app.logger.warning("Nutzer '%s' auf Rolle admin aktualisiert.", username)
         return u.id if u else None
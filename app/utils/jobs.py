@@ -0,0 +1,201 @@
+"""
+Hintergrund-Jobs (Exporte, Bildvarianten, PDF-Vorrendern …).
+
+Kleiner Thread-Pool im Prozess. ``submit`` liefert sofort einen ``Job``
+zurück; die Funktion läuft im App-Kontext und meldet Fortschritt über
+``job.progress(done, total)``. Ist ``notify_sid`` gesetzt, geht jeder
+Fortschritt/Abschluss als ``job_progress`` über Socket.IO an genau diese
+Verbindung.
+
+Der Status steht zusätzlich in ``JobRecord`` (eigene Verbindung, unabhängig
+von der Transaktion des Jobs; Fortschritt höchstens alle ``SAVE_EVERY_S``),
+damit ``get`` auf jedem Worker funktioniert – Status-Abfragen dürfen also
+round robin verteilt werden. Fertige Zeilen werden nach ``KEEP_FINISHED_S``
+gelöscht. Vertrauliches (z. B. erzeugte Passwörter beim Schüler-Import)
+gehört nicht ins Ergebnis, sondern nach ``job.private`` – das bleibt im
+Speicher des ausführenden Workers und fällt mit dem Job nach derselben Zeit
+weg.
+
+Unter eventlet (``SOCKETIO_ASYNC_MODE = "eventlet"``) läuft der Job als
+Greenlet (höchstens ``JOB_WORKERS`` gleichzeitig); DB, ``JobRecord`` und
+Socket.IO bleiben so auf dem Hub. Nur die reinen CPU-Schritte (reportlab,
+Pillow, WeasyPrint) schickt der Job über ``native`` – wie ``passwords._run``
+per ``eventlet.tpool`` – in einen echten OS-Thread. Was dort läuft, darf
+weder DB noch App-Kontext anfassen: grüne Sperren (Session, Pool) ließen den
+tpool-Thread sonst im eigenen Hub hängen.
+"""
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+
+from ..extensions import db, socketio
+from ..models import JobRecord, gen_id
+
+KEEP_FINISHED_S = 3600  # fertige Jobs so lange abfragbar
+SAVE_EVERY_S = 1.0      # Fortschritt höchstens so oft in die DB
+STALE_S = 1800          # laufender Job ohne Lebenszeichen → Worker weg
+
+_executor = None
+_executor_lock = threading.Lock()
+_green_slots = None     # eventlet: Semaphore (JOB_WORKERS) statt ThreadPool
+_jobs = {}
+
+
+class Job:
+    def __init__(self, kind: str, owner_id: str | None, notify_sid: str | None = None, app=None):
+        self.id = gen_id()
+        self.kind = kind
+        self.owner_id = owner_id
+        self.notify_sid = notify_sid
+        self.status = "queued"        # queued|running|done|failed
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.private = None           # nur im Speicher dieses Prozesses: nie in JobRecord/to_dict
+        self.finished_at = None
+        self._app = app
+        self._saved_at = 0.0
+
+    def to_dict(self) -> dict:
+        return {"job_id": self.id, "kind": self.kind, "status": self.status,
+                "done": self.done, "total": self.total, "result": self.result, "error": self.error}
+
+    def progress(self, done: int, total: int | None = None) -> None:
+        self.done = done
+        if total is not None:
+            self.total = total
+        if total is not None or time.monotonic() - self._saved_at >= SAVE_EVERY_S:
+            self._save()
+        self._notify()
+
+    def _notify(self) -> None:
+        if self.notify_sid:
+            socketio.emit("job_progress", self.to_dict(), to=self.notify_sid)
+
+    def _save(self, final: bool = False) -> None:
+        if self._app is None:
+            return
+        self._saved_at = time.monotonic()
+        values = {"status": self.status, "done": self.done, "total": self.total, "updated_at": dt.utcnow()}
+        if final:
+            values.update(result=self.result, error=self.error)
+        for _ in range(2):
+            try:
+                with _engine(self._app).begin() as conn:
+                    conn.execute(update(JobRecord).where(JobRecord.id == self.id).values(**values))
+                return
+            except Exception as e:  # Status-Spiegel darf den Job nicht abbrechen
+                self._app.logger.warning("Job %s: Status nicht gespeichert: %s", self.id, e)
+                if not final:
+                    return
+                values["result"] = None  # z. B. nicht JSON-fähig – wenigstens den Status festhalten
+
+    @classmethod
+    def _from_record(cls, rec) -> "Job":
+        job = cls(rec.kind, rec.owner_id)
+        job.id, job.status, job.done, job.total = rec.id, rec.status, rec.done, rec.total
+        job.result, job.error = rec.result, rec.error
+        if job.status in ("queued", "running") and rec.updated_at and \
+                rec.updated_at < dt.utcnow() - timedelta(seconds=STALE_S):
+            job.status, job.error = "failed", "Job abgebrochen (Worker beendet)"
+        return job
+
+
+def _engine(app):
+    with app.app_context():
+        return db.engine
+
+
+def _green(app) -> bool:
+    return app.config.get("SOCKETIO_ASYNC_MODE") == "eventlet"
+
+
+def native(fn, *args, **kwargs):
+    """
+    Reine CPU-Arbeit ausführen: unter eventlet in einem OS-Thread (``tpool``),
+    sonst direkt. ``fn`` bekommt alles als Argument – keine DB, kein
+    ``current_app``.
+    """
+    try:
+        green = _green(current_app)
+    except RuntimeError:  # ohne App-Kontext
+        green = False
+    if green:
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def _pool(app) -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(app.config.get("JOB_WORKERS", 2)),
+                                               thread_name_prefix="efe-job")
+    return _executor
+
+
+def _prune(app) -> None:
+    cutoff = time.time() - KEEP_FINISHED_S
+    for jid in [j.id for j in list(_jobs.values()) if j.finished_at and j.finished_at < cutoff]:
+        _jobs.pop(jid, None)
+    with _engine(app).begin() as conn:
+        conn.execute(delete(JobRecord).where(JobRecord.updated_at < dt.utcnow() - timedelta(seconds=KEEP_FINISHED_S),
+                                             JobRecord.status.in_(("done", "failed"))))
+
+
+def submit(app, kind: str, fn, *args, owner_id: str | None = None, notify_sid: str | None = None, **kwargs) -> Job:
+    """``fn(job, *args, **kwargs)`` im Hintergrund ausführen; Rückgabewert landet in ``job.result``."""
+    _prune(app)
+    job = Job(kind, owner_id, notify_sid, app=app)
+    _jobs[job.id] = job
+    with _engine(app).begin() as conn:
+        conn.execute(insert(JobRecord).values(id=job.id, kind=kind, owner_id=owner_id, status="queued",
+                                              done=0, total=0, created_at=dt.utcnow(), updated_at=dt.utcnow()))
+
+    def run():
+        job.status = "running"
+        job._save()
+        with app.app_context():
+            try:
+                job.result = fn(job, *args, **kwargs)
+                job.status = "done"
+            except Exception as e:
+                app.logger.error("Job %s (%s) fehlgeschlagen: %s\n%s", job.id, kind, e, traceback.format_exc())
+                job.status, job.error = "failed", str(e)
+        job._save(final=True)
+        job.finished_at = time.time()
+        job._notify()
+
+    if _green(app):
+        import eventlet
+        from eventlet import semaphore
+
+        global _green_slots
+        if _green_slots is None:
+            _green_slots = semaphore.Semaphore(int(app.config.get("JOB_WORKERS", 2)))
+
+        def green_run():
+            with _green_slots:
+                run()
+
+        eventlet.spawn(green_run)
+    else:
+        _pool(app).submit(run)
+    return job
+
+
+def get(job_id: str) -> Job | None:
+    """Job aus diesem Prozess oder – von einem anderen Worker gestartet – aus der DB."""
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job
+    rec = db.session.execute(select(JobRecord).where(JobRecord.id == job_id)).scalar_one_or_none()
+    return Job._from_record(rec) if rec is not None else None
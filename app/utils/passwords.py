@@ -0,0 +1,141 @@
+"""
+Passwort-Hashing als kleiner Dienst.
+
+bcrypt kostet pro Aufruf ~0,3 s CPU. Statt im Request-Thread (bzw. unter
+eventlet im Hub – dann steht jeder Socket still) läuft es in einem eigenen,
+begrenzten Pool echter OS-Threads (``PASSWORD_WORKERS``; unter eventlet über
+``eventlet.tpool``). Warten mehr als ``PASSWORD_QUEUE_MAX`` Aufträge, wird
+sofort mit ``Busy`` abgelehnt statt die Worker weiter aufzustauen – die
+Login-Seite antwortet dann mit 503.
+
+Die Kosten kommen aus ``BCRYPT_ROUNDS``; ``verify`` liefert bei abweichender
+Rundenzahl gleich den neuen Hash mit (Rehash beim Login).
+
+``stats()``: Anzahl, Wartende, Ablehnungen, Latenz (Mittel/p95) der letzten
+Aufrufe.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from passlib.context import CryptContext
+
+DEFAULT_ROUNDS = 12
+WINDOW = 500  # Latenzen für stats()
+
+
+class Busy(RuntimeError):
+    """Zu viele Hash-Aufträge in der Warteschlange."""
+
+
+_lock = threading.Lock()
+_executor = None
+_contexts = {}            # rounds -> CryptContext
+_pending = 0
+_green_slots = None    # eventlet: Semaphore statt ThreadPool
+_counts = {"hash": 0, "verify": 0, "rehash": 0, "rejected": 0}
+_latency = deque(maxlen=WINDOW)  # (Wartezeit, Gesamtzeit) in s
+
+
+def context(rounds: int | None = None) -> CryptContext:
+    rounds = int(rounds or _config("BCRYPT_ROUNDS", DEFAULT_ROUNDS))
+    ctx = _contexts.get(rounds)
+    if ctx is None:
+        ctx = _contexts[rounds] = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds,
+                                               bcrypt__ident="2b")
+    return ctx
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:  # außerhalb des App-Kontexts (z. B. Prozess-Pool)
+        return default
+
+
+def _green() -> bool:
+    try:
+        return current_app.config.get("SOCKETIO_ASYNC_MODE") == "eventlet"
+    except RuntimeError:
+        return False
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=int(_config("PASSWORD_WORKERS", 2)),
+                                               thread_name_prefix="efe-pw")
+    return _executor
+
+
+def _run(fn, *args):
+    """``fn`` im Pool ausführen und auf das Ergebnis warten (begrenzte Warteschlange)."""
+    global _pending, _green_slots
+    limit = int(_config("PASSWORD_QUEUE_MAX", 32))
+    with _lock:
+        if _pending >= limit:
+            _counts["rejected"] += 1
+            raise Busy("Passwort-Dienst ausgelastet")
+        _pending += 1
+    queued = time.perf_counter()
+    started = []
+
+    def job():
+        started.append(time.perf_counter())
+        return fn(*args)
+
+    try:
+        if _green():
+            from eventlet import semaphore, tpool
+            if _green_slots is None:
+                _green_slots = semaphore.Semaphore(int(_config("PASSWORD_WORKERS", 2)))
+            with _green_slots:
+                return tpool.execute(job)
+        return _pool().submit(job).result()
+    finally:
+        end = time.perf_counter()
+        with _lock:
+            _pending -= 1
+            _latency.append(((started[0] if started else end) - queued, end - queued))
+
+
+def hash(password: str) -> str:
+    with _lock:
+        _counts["hash"] += 1
+    return _run(context().hash, password)
+
+
+def verify(password: str, password_hash: str | None) -> tuple[bool, str | None]:
+    """
+    (ok, neuer_hash). ``neuer_hash`` ist gesetzt, wenn das Passwort stimmt, der
+    gespeicherte Hash aber nicht mehr ``BCRYPT_ROUNDS`` entspricht – der
+    Aufrufer speichert ihn.
+    """
+    if not password_hash:
+        return False, None
+    with _lock:
+        _counts["verify"] += 1
+    try:
+        ok, new = _run(context().verify_and_update, password, password_hash)
+    except ValueError:  # kein gültiger bcrypt-Hash
+        return False, None
+    if new:
+        with _lock:
+            _counts["rehash"] += 1
+    return ok, new
+
+
+def stats() -> dict:
+    with _lock:
+        lat = sorted(t for _, t in _latency)
+        wait = [w for w, _ in _latency]
+        out = dict(_counts, pending=_pending)
+    if lat:
+        out.update(avg_ms=round(1000 * sum(lat) / len(lat), 1),
+                   p95_ms=round(1000 * lat[int(0.95 * (len(lat) - 1))], 1),
+                   avg_wait_ms=round(1000 * sum(wait) / len(wait), 1))
+    return out
@@ -0,0 +1,201 @@
+"""
+Sammel-Anlage von Schülerkonten (CSV/JSON) inkl. Klassen-Zuordnung.
+
+Spalten/Schlüssel: ``username`` (Pflicht), ``password`` (leer → wird erzeugt
+und im Bericht ausgegeben), ``email``, ``class`` (Beitrittscode oder
+Klassen-ID; sonst die Standard-Klasse), ``role`` (Standard ``student``).
+
+Ablauf: alle Zeilen prüfen, vorhandene Nutzer in wenigen Abfragen
+nachschlagen, nur neue Passwörter hashen – verteilt auf einen Prozess-Pool –
+und Nutzer/Einschreibungen in Batches einfügen. Erneutes Ausführen mit
+derselben Datei ist gefahrlos: vorhandene Nutzer bleiben unverändert
+(``exists``), fehlende Einschreibungen werden ergänzt. Der Zeilenbericht
+enthält erzeugte Passwörter; im Web-Import bleibt er nur im Speicher des
+Workers (``Job.private``).
+
+Der Pool startet per ``spawn``, nicht ``fork``: der Web-Worker hat Threads
+bzw. einen eventlet-Hub, die ein ``fork`` halb mitkopieren würde. Die
+Kindprozesse laden dafür das Start-Skript als ``__mp_main__`` (``manage.py``
+und ``live_gateway.py`` bauen dann keine App).
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from sqlalchemy import insert
+
+from . import authz, passwords
+from ..extensions import db
+from ..models import Class, Enrollment, User, gen_id
+
+BATCH = 500
+ROLES = ("student", "teacher")
+
+
+def parse(data: bytes | str, filename: str = "") -> list:
+    """CSV (mit Kopfzeile) oder JSON-Liste → Liste von Dicts."""
+    text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    if filename.lower().endswith(".json") or text.lstrip().startswith("["):
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("JSON: Liste von Objekten erwartet")
+        return [r if isinstance(r, dict) else {} for r in rows]
+    return [{(k or "").strip().lower(): (v or "").strip() for k, v in r.items()}
+            for r in csv.DictReader(io.StringIO(text), dialect=_dialect(text))]
+
+
+def _dialect(text: str):
+    """Trennzeichen erraten; eine einzige Spalte (nur ``username``) hat keins → Standard-CSV."""
+    header = text.lstrip().split("\n", 1)[0]
+    if not any(d in header for d in ",;\t"):
+        return csv.excel
+    try:
+        return csv.Sniffer().sniff(text[:2048], delimiters=",;\t")
+    except csv.Error:
+        return csv.excel
+
+
+def _hash(password: str, rounds: int) -> str:
+    return passwords.context(rounds).hash(password)
+
+
+def hash_many(plain: list, rounds: int, workers: int | None = None) -> list:
+    """Viele Passwörter auf einmal – Prozess-Pool statt des (für Logins reservierten) Hash-Dienstes."""
+    if not plain:
+        return []
+    workers = workers or min(len(plain), os.cpu_count() or 1)
+    if workers <= 1 or len(plain) < 4:
+        return [_hash(p, rounds) for p in plain]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_hash, plain, [rounds] * len(plain),
+                             chunksize=max(1, len(plain) // (workers * 4))))
+
+
+def _chunks(seq, n=BATCH):
+    seq = list(seq)
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+def import_rows(rows: list, default_class_id: str | None = None, allowed_class_ids=None,
+                allowed_roles=ROLES, progress=None) -> dict:
+    """
+    Legt Nutzer + Einschreibungen an; liefert ``{"created", "existing", "enrolled", "errors", "rows"}``.
+    ``rows`` im Bericht: je Eingabezeile ``{row, username, status, error?, password?}``.
+    """
+    report = [{"row": i + 1, "username": (r.get("username") or "").strip()} for i, r in enumerate(rows)]
+
+    # Klassen auflösen (Code oder ID), eine Abfrage
+    refs = {(r.get("class") or "").strip() for r in rows} - {""}
+    classes = {}
+    if refs:
+        for k in Class.query.filter(db.or_(Class.join_code.in_(refs), Class.id.in_(refs))):
+            classes[k.join_code] = classes[k.id] = k.id
+
+    valid, seen = [], set()
+    for r, rep in zip(rows, report):
+        name = rep["username"]
+        role = (r.get("role") or "student").strip().lower()
+        ref = (r.get("class") or "").strip()
+        class_id = classes.get(ref) if ref else default_class_id
+        err = None
+        if not name:
+            err = "Benutzername fehlt"
+        elif name.lower() in seen:
+            err = "Benutzername doppelt in der Datei"
+        elif role not in allowed_roles:
+            err = f"Rolle '{role}' nicht erlaubt"
+        elif ref and class_id is None:
+            err = f"Klasse '{ref}' nicht gefunden"
+        elif class_id and allowed_class_ids is not None and class_id not in allowed_class_ids:
+            err = "Keine Berechtigung für diese Klasse"
+        if err:
+            rep.update(status="error", error=err)
+            continue
+        seen.add(name.lower())
+        valid.append((r, rep, role, class_id))
+
+    # vorhandene Nutzer (idempotent) und belegte E-Mails
+    existing, roles, taken = {}, {}, set()
+    for chunk in _chunks([rep["username"] for _, rep, _, _ in valid]):
+        for name, uid, role in db.session.query(User.username, User.id, User.role).filter(User.username.in_(chunk)):
+            existing[name], roles[name] = uid, role
+    emails = {(r.get("email") or "").strip().lower() for r, rep, _, _ in valid if rep["username"] not in existing} - {""}
+    for chunk in _chunks(emails):
+        taken.update(e.lower() for (e,) in db.session.query(User.email).filter(db.func.lower(User.email).in_(chunk)))
+
+    new, keep = [], []
+    for r, rep, role, cid in valid:
+        name, email = rep["username"], (r.get("email") or "").strip().lower()
+        if name in existing:
+            if roles[name] != role:
+                rep.update(status="error", error=f"Benutzer existiert bereits mit Rolle '{roles[name]}'")
+                continue
+        elif email and email in taken:
+            rep.update(status="error", error="E-Mail bereits vergeben")
+            continue
+        else:
+            if email:
+                taken.add(email)
+            new.append((r, rep, role, cid))
+        keep.append((r, rep, role, cid))
+    valid = keep
+    plain = []
+    for r, rep, _, _ in new:
+        pw = (r.get("password") or "").strip()
+        if not pw:
+            pw = rep["password"] = secrets.token_urlsafe(6)
+        plain.append(pw)
+    if progress:
+        progress(0, len(new))
+    hashes = hash_many(plain, current_app.config.get("BCRYPT_ROUNDS", passwords.DEFAULT_ROUNDS))
+
+    user_rows = []
+    for (r, rep, role, _), h in zip(new, hashes):
+        uid = gen_id()
+        existing[rep["username"]] = uid
+        user_rows.append({"id": uid, "username": rep["username"], "email": (r.get("email") or None),
+                          "role": role, "password_hash": h})
+        rep["status"] = "created"
+    done = 0
+    for chunk in _chunks(user_rows):
+        db.session.execute(insert(User), chunk)
+        done += len(chunk)
+        if progress:
+            progress(done)
+
+    # Einschreibungen: nur fehlende
+    want = {(cid, existing[rep["username"]], role) for _, rep, role, cid in valid if cid}
+    have = set()
+    for chunk in _chunks({uid for _, uid, _ in want}):
+        have.update(tuple(e) for e in db.session.query(Enrollment.class_id, Enrollment.user_id)
+                    .filter(Enrollment.user_id.in_(chunk)))
+    enroll_rows = [{"id": gen_id(), "class_id": cid, "user_id": uid, "role_in_class": role}
+                   for cid, uid, role in want if (cid, uid) not in have]
+    for chunk in _chunks(enroll_rows):
+        db.session.execute(insert(Enrollment), chunk)
+    db.session.commit()
+    authz.invalidate(*{r["user_id"] for r in enroll_rows})
+
+    for _, rep, _, _ in valid:
+        rep.setdefault("status", "exists")
+    return {
+        "created": len(user_rows),
+        "existing": sum(1 for rep in report if rep.get("status") == "exists"),
+        "enrolled": len(enroll_rows),
+        "errors": sum(1 for rep in report if rep.get("status") == "error"),
+        "rows": report,
+    }
+
+
+def report_csv(rows: list) -> str:
+    out = io.StringIO()
+    w = csv.DictWriter(out, fieldnames=["row", "username", "status", "error", "password"], extrasaction="ignore")
+    w.writeheader()
+    w.writerows(rows)
+    return out.getvalue()
@@ -0,0 +1,94 @@
+"""
+Sterne: Ledger (``StarTransaction``) + laufender Saldo (``StarBalance``).
+
+Jede Buchung ändert den Saldo per atomarem UPDATE (``balance = balance + x``)
+und legt die Ledger-Zeile in derselben Transaktion an; der Commit bleibt beim
+Aufrufer. ``spend`` bucht nur, wenn der Saldo reicht (bedingtes UPDATE – zwei
+gleichzeitige Käufe können nicht beide durchgehen). Lesen ist ein
+Primärschlüssel-Zugriff.
+
+Abgleich mit dem Ledger: ``flask reconcile-stars [--fix]``.
+"""
+from sqlalchemy import func, update
+
+from ..extensions import db
+from ..models import StarBalance, StarTransaction, gen_id
+
+
+def _ensure_row(user_id: str) -> None:
+    """Saldo-Zeile anlegen, falls sie fehlt – Startwert aus dem Ledger (Altbestand)."""
+    if db.session.get(StarBalance, user_id) is not None:
+        return
+    start = db.session.query(func.coalesce(func.sum(StarTransaction.amount), 0)).filter_by(user_id=user_id).scalar()
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        # parallel angelegt? dann gewinnt die andere Zeile
+        db.session.execute(insert(StarBalance).values(user_id=user_id, balance=int(start or 0))
+                           .on_conflict_do_nothing(index_elements=["user_id"]))
+    else:
+        db.session.add(StarBalance(user_id=user_id, balance=int(start or 0)))
+        db.session.flush()
+
+
+def _ledger(user_id, amount, reason, assignment_id, created_by) -> StarTransaction:
+    tx = StarTransaction(id=gen_id(), user_id=user_id, amount=amount, reason=reason,
+                         assignment_id=assignment_id, created_by=created_by)
+    db.session.add(tx)
+    return tx
+
+
+def add(user_id: str, amount: int, reason: str, assignment_id: str | None = None,
+        created_by: str | None = None) -> StarTransaction:
+    """Sterne gutschreiben (oder bei negativem ``amount`` ohne Prüfung abziehen)."""
+    _ensure_row(user_id)
+    db.session.execute(update(StarBalance).where(StarBalance.user_id == user_id)
+                       .values(balance=StarBalance.balance + amount)
+                       .execution_options(synchronize_session=False))
+    return _ledger(user_id, amount, reason, assignment_id, created_by)
+
+
+def spend(user_id: str, amount: int, reason: str = "spend") -> StarTransaction | None:
+    """Nur abbuchen, wenn der Saldo reicht; sonst None (nichts gebucht)."""
+    if amount is None or amount <= 0:
+        raise ValueError("spend: amount muss positiv sein")
+    _ensure_row(user_id)
+    res = db.session.execute(update(StarBalance)
+                             .where(StarBalance.user_id == user_id, StarBalance.balance >= amount)
+                             .values(balance=StarBalance.balance - amount)
+                             .execution_options(synchronize_session=False))
+    if res.rowcount != 1:
+        return None
+    return _ledger(user_id, -amount, reason, None, None)
+
+
+def balance(user_id: str) -> int:
+    row = db.session.get(StarBalance, user_id)
+    if row is None:  # noch nie gebucht (oder Altbestand vor dem Backfill)
+        return int(db.session.query(func.coalesce(func.sum(StarTransaction.amount), 0))
+                   .filter_by(user_id=user_id).scalar() or 0)
+    return row.balance
+
+
+def reconcile(fix: bool = False) -> list:
+    """Salden gegen das Ledger prüfen; liefert [(user_id, saldo, ledger)] der Abweichungen."""
+    ledger = dict(db.session.query(StarTransaction.user_id, func.sum(StarTransaction.amount))
+                  .group_by(StarTransaction.user_id))
+    stored = dict(db.session.query(StarBalance.user_id, StarBalance.balance))
+    diffs = []
+    for uid in ledger.keys() | stored.keys():
+        want, have = int(ledger.get(uid) or 0), stored.get(uid)
+        if have != want:
+            diffs.append((uid, have, want))
+            if fix:
+                if have is None:
+                    db.session.add(StarBalance(user_id=uid, balance=want))
+                else:
+                    db.session.execute(update(StarBalance).where(StarBalance.user_id == uid)
+                                       .values(balance=want).execution_options(synchronize_session=False))
+    if fix:
+        db.session.commit()
+    return diffs
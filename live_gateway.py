@@ -0,0 +1,57 @@
+# live_gateway.py
+"""
+Produktions-Einstieg für Live-Unterricht: Socket.IO unter eventlet statt
+Thread-pro-Verbindung. Eine Verbindung ist hier ein Greenlet (wenige KB), ein
+Prozess trägt so tausende ruhende Sockets.
+
+    SOCKETIO_ASYNC_MODE wird auf "eventlet" gesetzt, manage.py bleibt für DEV
+    (threading + Werkzeug). Mehrere Gateways nebeneinander: LIVE_BUS setzen und
+    je Prozess einen eigenen PORT (siehe app/live/bus.py für Sticky Routing).
+"""
+import eventlet
+eventlet.monkey_patch()  # muss vor allen anderen Imports passieren
+
+import os
+import logging
+
+os.environ.setdefault("SOCKETIO_ASYNC_MODE", "eventlet")
+
+
+def _green_psycopg2():
+    """psycopg2 blockiert sonst den ganzen Hub während einer Query → Wait-Callback für eventlet."""
+    try:
+        import psycopg2
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    from eventlet.hubs import trampoline
+
+    def wait_callback(conn, timeout=-1):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                trampoline(conn.fileno(), read=True)
+            elif state == extensions.POLL_WRITE:
+                trampoline(conn.fileno(), write=True)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(wait_callback)
+
+
+_green_psycopg2()
+
+from app import create_app
+from app.extensions import socketio
+
+if __name__ != "__mp_main__":  # Import-Pool (spawn): keine App, kein Live-Bus im Kindprozess
+    app = create_app()
+
+if __name__ == "__main__":
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8080"))
+    logging.basicConfig(level=logging.INFO)
+    print(f"Live-Gateway ({app.config['SOCKETIO_ASYNC_MODE']}) auf {host}:{port}")
+    socketio.run(app, host=host, port=port, debug=False, use_reloader=False, log_output=False)
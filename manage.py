@@ -78,8 +78,11 @@ def maybe_reset_db(app):
     print("━"*40)
 
 
-app = create_app()
-maybe_reset_db(app)
+# Der Prozess-Pool des Schüler-Imports (spawn) lädt dieses Skript als __mp_main__ –
+# dort weder App noch DB-Reset
+if __name__ != "__mp_main__":
+    app = create_app()
+    maybe_reset_db(app)
 
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")